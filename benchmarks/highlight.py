@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+Time to highlight a worst-case page as the terminal gets wider
+
+Every character of the page matches the pattern, so the cost is
+dominated by the highlighting of the matches and not by reading the
+file.
+"""
+
+import re
+import tempfile
+import timeit
+
+from pthugefileviewer import HugeFileViewerRegexUIControl
+
+HEIGHT = 50
+WIDTHS = [80, 200, 400]
+PATTERNS = [rb"\d", rb"\d+", rb"x"]
+
+
+def control_for(width: int) -> HugeFileViewerRegexUIControl:
+    line = b"0123456789" * (width // 10)
+    with tempfile.TemporaryFile() as fd:
+        fd.write(b"".join(line + b"\n" for _ in range(HEIGHT * 4)))
+        fd.flush()
+        control = HugeFileViewerRegexUIControl(fd)
+        control.height = HEIGHT
+        return control
+
+
+def bench(control: HugeFileViewerRegexUIControl, number: int = 50) -> float:
+    lines = list(control.get_lines())
+    return timeit.timeit(lambda: control.style_lines(lines), number=number) / number
+
+
+def main() -> None:
+    for width in WIDTHS:
+        control = control_for(width)
+        for pattern in PATTERNS:
+            control.use_regex(re.compile(pattern))
+            latency = bench(control)
+            print(f"width {width:4} {pattern.decode():4}: {latency * 1e3:7.3f} ms/page")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Keypress latency of the navigation functions as the terminal grows
+
+Each navigation function should render the viewport once, so the
+latency should only grow with the amount of text shown, not with the
+number of per-line steps taken to reach the target.
+"""
+
+import re
+import tempfile
+import timeit
+from typing import Callable
+
+from pthugefileviewer import HugeFileViewerRegexUIControl, HugeFileViewerUIControl
+
+HEIGHTS = [25, 50, 100, 200]
+LINES = 100000
+
+
+def control_for(
+    cls: Callable[..., HugeFileViewerUIControl], height: int
+) -> HugeFileViewerUIControl:
+    with tempfile.TemporaryFile() as fd:
+        fd.write(b"".join(b"line %d\n" % i for i in range(LINES)))
+        fd.flush()
+        control = cls(fd)
+        control.height = height
+        return control
+
+
+def bench(control: HugeFileViewerUIControl, number: int = 50) -> float:
+    def keypress() -> None:
+        control.go_pagedown()
+        control.go_pageup()
+
+    return timeit.timeit(keypress, number=number) / (2 * number)
+
+
+def bench_scroll(control: HugeFileViewerUIControl, number: int = 1000) -> float:
+    return timeit.timeit(control.go_down, number=number) / number
+
+
+def main() -> None:
+    for name, cls in [
+        ("plain", HugeFileViewerUIControl),
+        ("regex", HugeFileViewerRegexUIControl),
+    ]:
+        for height in HEIGHTS:
+            control = control_for(cls, height)
+            if isinstance(control, HugeFileViewerRegexUIControl):
+                control.use_regex(re.compile(rb"\d+"))
+            latency = bench(control)
+            line = latency / height
+            scroll = bench_scroll(control)
+            print(
+                f"{name:5} height {height:4}: {latency * 1e3:7.3f} ms/key"
+                f" {line * 1e6:6.2f} us/line"
+                f" {scroll * 1e3:7.3f} ms/scroll"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Time to find and to count the matches in a synthetic huge file
+
+The file is scanned by 1, 4 and 16 worker processes; 1 is the plain
+chunked scan in this process. The pattern only matches the last line,
+so both queries scan the whole file. The size of the file in GiB can
+be given as the first argument.
+
+The chunked scan of the literals and literal prefixes in LITERALS,
+which is done with find when they are long enough, is then compared
+with a single regex search over the whole file.
+"""
+
+import mmap
+import re
+import sys
+import tempfile
+import time
+from typing import Callable, Tuple
+
+from pthugefileviewer.parallel import parallel_count, parallel_search
+from pthugefileviewer.search import chunked_finditer, chunked_search
+
+WORKERS = [1, 4, 16]
+PATTERN = re.compile(rb"^line \d+ last$", re.M)
+BLOCK = b"".join(b"line %d of the synthetic log\n" % i for i in range(20000))
+# Short literals and prefixes are left to the regex engine, and common
+# prefixes to regex.search after a few candidates:
+LITERALS = [
+    re.compile(rb"of the synthetic log 0 last"),
+    re.compile(rb"of the synthetic log \d+ last"),
+    re.compile(rb"line 0 last"),
+    re.compile(rb"line \d+ last"),
+]
+
+
+def timed(fn: Callable[[], object]) -> float:
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def bench(path: str, workers: int) -> Tuple[float, float]:
+    if workers > 1:
+        search = timed(lambda: parallel_search(path, PATTERN, max_workers=workers))
+        count = timed(lambda: parallel_count(path, PATTERN, workers))
+        return search, count
+    with open(path, "rb") as fd:
+        mm = mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        search = timed(lambda: chunked_search(mm, PATTERN))
+        count = timed(lambda: sum(1 for _ in chunked_finditer(mm, PATTERN)))
+        return search, count
+    finally:
+        mm.close()
+
+
+def bench_literal(path: str, pattern: "re.Pattern[bytes]") -> Tuple[float, float]:
+    with open(path, "rb") as fd:
+        mm = mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        chunked = timed(lambda: chunked_search(mm, pattern))
+        plain = timed(lambda: pattern.search(mm))
+        return chunked, plain
+    finally:
+        mm.close()
+
+
+def main() -> None:
+    size = int(float(sys.argv[1] if len(sys.argv) > 1 else 2) * (1 << 30))
+    with tempfile.NamedTemporaryFile() as fd:
+        while fd.tell() < size:
+            fd.write(BLOCK)
+        fd.write(b"line 0 last\n")
+        fd.flush()
+        mib = fd.tell() / (1 << 20)
+        for workers in WORKERS:
+            search, count = bench(fd.name, workers)
+            print(
+                f"{workers:2} workers: search {search:7.3f} s"
+                f" ({mib / search:7.1f} MiB/s), count {count:7.3f} s"
+            )
+        for pattern in LITERALS:
+            chunked, plain = bench_literal(fd.name, pattern)
+            print(
+                f"{pattern.pattern.decode():32}: chunked {chunked:7.3f} s,"
+                f" regex.search {plain:7.3f} s"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+Navigation, rendering and search timings on synthetic huge files
+
+A file is generated for each size and line profile, and each one is
+benchmarked in a new process, so that the peak RSS reported is the
+one of that file alone. The results can be saved as JSON and compared
+with a previous run: the comparison fails when a timing or the peak
+RSS grows more than the tolerance, which makes it usable as a
+regression gate.
+
+Example, with a baseline from the main branch:
+
+    python benchmarks/suite.py --sizes 1M 100M --save main.json
+    python benchmarks/suite.py --sizes 1M 100M --compare main.json
+"""
+
+import argparse
+import concurrent.futures
+import json
+import os
+import re
+import resource
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List
+
+from pthugefileviewer import HugeFileViewerRegexUIControl, HugeFileViewerUIControl
+
+HEIGHT = 50
+WIDTH = 200
+MARKER = b"MARKER the line that search_down looks for\n"
+PATTERN = rb"\d+"
+
+# Line lengths of each profile, cycled through:
+PROFILES = {
+    "short": [8, 16, 24, 12],
+    "log": [80, 120, 160, 200, 100],
+    "long": [4096, 20000, 600],
+    "huge": [1 << 20],
+}
+
+UNITS = {"K": 1 << 10, "M": 1 << 20, "G": 1 << 30}
+
+
+def parse_size(size: str) -> int:
+    unit = UNITS.get(size[-1:].upper())
+    return int(float(size[:-1]) * unit) if unit else int(size)
+
+
+def make_block(lengths: List[int]) -> bytes:
+    """Return about 1 MiB of lines with the given lengths"""
+    lines = []
+    total = 0
+    i = 0
+    while total < (1 << 20):
+        length = lengths[i % len(lengths)]
+        prefix = b"%d " % i
+        line = (prefix + b"0123456789abcdef " * (length // 17 + 1))[: length - 1]
+        lines.append(line + b"\n")
+        total += length
+        i += 1
+    return b"".join(lines)
+
+
+def write_file(path: str, size: int, profile: str) -> None:
+    """Write size bytes of the profile's lines, with MARKER in the middle"""
+    block = make_block(PROFILES[profile])
+    with open(path, "wb") as fd:
+        while fd.tell() < size // 2:
+            fd.write(block[: size // 2 - fd.tell()])
+        fd.write(b"\n" + MARKER)
+        while fd.tell() < size:
+            fd.write(block[: size - fd.tell()])
+
+
+def timed(fn: Callable[[], object], number: int) -> float:
+    """Return the average time of number calls of fn, in seconds"""
+    start = time.perf_counter()
+    for _ in range(number):
+        fn()
+    return (time.perf_counter() - start) / number
+
+
+def control_for(path: str, regex: bool = False) -> HugeFileViewerUIControl:
+    cls = HugeFileViewerRegexUIControl if regex else HugeFileViewerUIControl
+    with open(path, "rb") as fd:
+        control = cls(fd)
+    control.width = WIDTH
+    control.height = HEIGHT
+    return control
+
+
+def bench_file(path: str) -> Dict[str, float]:
+    """Time the control operations on the file at path
+
+    Runs in a worker process; the timings are in seconds per call.
+    """
+    results: Dict[str, float] = {}
+    control = control_for(path)
+    results["go_down"] = timed(control.go_down, 200)
+    results["go_pagedown"] = timed(control.go_pagedown, 50)
+
+    def go_bottom() -> None:
+        control.go_top()
+        control.go_bottom()
+
+    results["go_bottom"] = timed(go_bottom, 5)
+    control.go_top()
+    results["get_lines_style"] = timed(control.get_lines_style, 50)
+    regex_control = control_for(path, regex=True)
+    assert isinstance(regex_control, HugeFileViewerRegexUIControl)
+    regex_control.use_regex(re.compile(PATTERN))
+    results["get_lines_style_regex"] = timed(regex_control.get_lines_style, 50)
+    regex_control.use_regex(re.compile(re.escape(MARKER)))
+
+    def search_down() -> None:
+        regex_control.go_top()
+        regex_control.search_down()
+
+    results["search_down"] = timed(search_down, 3)
+    # Linux reports ru_maxrss in KiB:
+    results["peak_rss_mib"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return results
+
+
+def compare(
+    results: Dict[str, Dict[str, float]],
+    baseline: Dict[str, Dict[str, float]],
+    tolerance: float,
+) -> List[str]:
+    """Return the regressions of results relative to baseline"""
+    regressions = []
+    for case, metrics in results.items():
+        for metric, value in metrics.items():
+            old = baseline.get(case, {}).get(metric)
+            if old is not None and value > old * (1 + tolerance):
+                regressions.append(
+                    f"{case} {metric}: {old:.6g} -> {value:.6g}"
+                    f" (+{100 * (value / old - 1):.0f}%)"
+                )
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "--sizes",
+        nargs="+",
+        default=["1M", "100M"],
+        help="File sizes, with an optional K, M or G suffix (default: 1M 100M)",
+    )
+    parser.add_argument(
+        "--profiles",
+        nargs="+",
+        default=list(PROFILES),
+        choices=list(PROFILES),
+        help="Line length profiles (default: all)",
+    )
+    parser.add_argument("--dir", default=None, help="Directory for the generated files")
+    parser.add_argument("--save", default=None, help="Save the results as JSON")
+    parser.add_argument(
+        "--compare", default=None, help="Fail on regressions from these results"
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.25,
+        help="Relative growth allowed by --compare (default: 0.25)",
+    )
+    args = parser.parse_args()
+    results: Dict[str, Dict[str, float]] = {}
+    with tempfile.TemporaryDirectory(dir=args.dir) as tmpdir:
+        for size in args.sizes:
+            for profile in args.profiles:
+                case = f"{size}-{profile}"
+                path = os.path.join(tmpdir, case)
+                write_file(path, parse_size(size), profile)
+                with concurrent.futures.ProcessPoolExecutor(1) as executor:
+                    metrics = executor.submit(bench_file, path).result()
+                os.unlink(path)
+                results[case] = metrics
+                print(
+                    f"{case:12}"
+                    + "".join(
+                        f" {name} {value * 1e3:.3f} ms"
+                        for name, value in metrics.items()
+                        if name != "peak_rss_mib"
+                    )
+                    + f" peak_rss {metrics['peak_rss_mib']:.1f} MiB"
+                )
+    if args.save is not None:
+        with open(args.save, "w") as fd:
+            json.dump(results, fd, indent=2)
+    if args.compare is not None:
+        with open(args.compare) as fd:
+            regressions = compare(results, json.load(fd), args.tolerance)
+        for regression in regressions:
+            print(f"regression: {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,15 @@ from .hugefilevieweruicontrol import (
     HugeFileViewerRegexUIControl,
     HugeFileViewerUIControl,
 )
+from .follow import FileFollower
+from .lineindex import LineIndex
+from .margins import LineNumberMargin, OffsetMargin
+from .matchedlines import MatchedLines
+from .matchindex import MatchIndex
+from .multifile import FileTabs
+from .scrollbar import ScrollbarControl
+from .spool import StreamSpool
+from .timestamps import TimestampFormat
 
 
 def version() -> str:
@@ -16,4 +25,14 @@ __all__ = [
     "version",
     "HugeFileViewerUIControl",
     "HugeFileViewerRegexUIControl",
+    "FileFollower",
+    "LineIndex",
+    "LineNumberMargin",
+    "OffsetMargin",
+    "MatchedLines",
+    "MatchIndex",
+    "FileTabs",
+    "ScrollbarControl",
+    "StreamSpool",
+    "TimestampFormat",
 ]
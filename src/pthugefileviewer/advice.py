@@ -0,0 +1,82 @@
+"""Kernel paging advice (madvise) for the mapped files
+
+The advice is only given to mmap objects, on platforms that have it;
+for other buffers, and when the kernel refuses it, nothing is done.
+"""
+
+import mmap
+from typing import Optional, Tuple
+
+# Bytes read ahead around the viewport when it moves:
+VIEW_READAHEAD = 256 * 1024
+
+
+def madvise(
+    buf: object, advice: str, start: int = 0, length: Optional[int] = None
+) -> bool:
+    """Give the advice MADV_<advice> for buf[start:start + length]
+
+    Without length, the advice goes up to the end. start is moved down
+    to a page boundary. Returns whether the advice was given.
+    """
+    if not isinstance(buf, mmap.mmap):
+        return False
+    flag = getattr(mmap, f"MADV_{advice}", None)
+    size = len(buf)
+    start = max(0, start)
+    if flag is None or start >= size or (length is not None and length <= 0):
+        return False
+    end = size if length is None else min(size, start + length)
+    aligned = start - start % mmap.PAGESIZE
+    try:
+        buf.madvise(flag, aligned, end - aligned)
+    except (OSError, ValueError):
+        return False
+    return True
+
+
+class ScanAdvice:
+    """Advice for a scan of buf, one window at a time
+
+    The window being scanned is advised as sequential, the next one is
+    read ahead with WILLNEED, and the ones already scanned are dropped
+    from the mapping with DONTNEED and set back to random access. The
+    dropped pages stay in the page cache, but unmapped, so they are the
+    first to be reclaimed instead of the pages used by other programs.
+    Backward scans read ahead and drop in the other direction.
+    """
+
+    def __init__(self, buf: object, backward: bool = False):
+        self.buf = buf
+        self.backward = backward
+        self._window: Optional[Tuple[int, int]] = None
+        self.enabled = isinstance(buf, mmap.mmap)
+
+    def window(self, start: int, end: int) -> None:
+        """Advise before scanning buf[start:end]"""
+        if not self.enabled:
+            return
+        length = end - start
+        madvise(self.buf, "SEQUENTIAL", start, length)
+        if self.backward:
+            ahead = max(0, start - length)
+            madvise(self.buf, "WILLNEED", ahead, start - ahead)
+        else:
+            madvise(self.buf, "WILLNEED", end, length)
+        if self._window is not None:
+            prev_start, prev_end = self._window
+            if self.backward:
+                prev_start = max(prev_start, end)
+            else:
+                prev_end = min(prev_end, start)
+            if prev_start < prev_end:
+                madvise(self.buf, "DONTNEED", prev_start, prev_end - prev_start)
+                madvise(self.buf, "RANDOM", prev_start, prev_end - prev_start)
+        self._window = (start, end)
+
+    def done(self) -> None:
+        """Set the last window back to random access, keeping its pages"""
+        if self.enabled and self._window is not None:
+            start, end = self._window
+            madvise(self.buf, "RANDOM", start, end - start)
+        self._window = None
@@ -0,0 +1,246 @@
+"""Random access byte sources for the huge file viewer control"""
+
+import abc
+import io
+import mmap
+import os
+import threading
+import weakref
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+BLOCK_SIZE = 1024 * 1024
+CACHE_BLOCKS = 16
+
+# Mapped at a time by WindowedMap, SEGMENTS * SEGMENT_SIZE at most:
+SEGMENT_SIZE = 16 * 1024 * 1024
+SEGMENTS = 8
+
+
+class ByteSource(abc.ABC):
+    """Read-only random access to bytes that cannot be mmap'ed directly
+
+    Subclasses implement read_range. This class keeps an LRU cache of
+    aligned blocks and provides the part of the bytes/mmap interface
+    that the control uses: len, slicing, find and rfind. Only the cached
+    blocks are kept in memory.
+
+    Subclasses that read a file get their own descriptor from dup_fd.
+    It is closed by close, or when the source is collected: a remapped
+    control doesn't close the source it replaced, a search may still be
+    using it.
+    """
+
+    _fd_finalizer: "Optional[weakref.finalize[[int], ByteSource]]" = None
+
+    def __init__(
+        self,
+        size: int,
+        block_size: int = BLOCK_SIZE,
+        cache_blocks: int = CACHE_BLOCKS,
+    ):
+        self._size = size
+        self.block_size = block_size
+        self.cache_blocks = cache_blocks
+        self._blocks: "OrderedDict[int, bytes]" = OrderedDict()
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return self._size
+
+    @abc.abstractmethod
+    def read_range(self, start: int, end: int) -> bytes:
+        """Read the bytes from start to end, which are within the source"""
+
+    def dup_fd(self, fd: io.BufferedReader) -> int:
+        """Return a new descriptor for fd, owned by this source"""
+        dup = os.dup(fd.fileno())
+        self._fd_finalizer = weakref.finalize(self, os.close, dup)
+        return dup
+
+    def close_fd(self) -> None:
+        """Close the descriptor returned by dup_fd, if not closed yet"""
+        if self._fd_finalizer is not None:
+            self._fd_finalizer()
+
+    def close(self) -> None:
+        with self._lock:
+            self._blocks.clear()
+
+    def block(self, index: int) -> bytes:
+        with self._lock:
+            data = self._blocks.get(index)
+            if data is not None:
+                self._blocks.move_to_end(index)
+                return data
+            start = index * self.block_size
+            data = self.read_range(start, min(start + self.block_size, self._size))
+            self._blocks[index] = data
+            while len(self._blocks) > self.cache_blocks:
+                self._blocks.popitem(last=False)
+            return data
+
+    def __getitem__(self, key: slice) -> bytes:
+        start, stop, _ = key.indices(self._size)
+        if start >= stop:
+            return b""
+        first = start // self.block_size
+        last = (stop - 1) // self.block_size
+        base = first * self.block_size
+        if first == last:
+            return self.block(first)[start - base : stop - base]
+        parts = [self.block(first)[start - base :]]
+        for index in range(first + 1, last):
+            parts.append(self.block(index))
+        parts.append(self.block(last)[: stop - last * self.block_size])
+        return b"".join(parts)
+
+    def _range(self, start: int, end: Optional[int]) -> Tuple[int, int]:
+        start, end, _ = slice(start, end).indices(self._size)
+        return start, end
+
+    def find(self, sub: bytes, start: int = 0, end: Optional[int] = None) -> int:
+        start, end = self._range(start, end)
+        if len(sub) != 1:
+            return self._find_window(sub, start, end)
+        pos = start
+        while pos < end:
+            index = pos // self.block_size
+            base = index * self.block_size
+            data = self.block(index)
+            i = data.find(sub, pos - base, min(end - base, len(data)))
+            if i != -1:
+                return base + i
+            pos = base + len(data)
+        return -1
+
+    def rfind(self, sub: bytes, start: int = 0, end: Optional[int] = None) -> int:
+        start, end = self._range(start, end)
+        if len(sub) != 1:
+            return self._rfind_window(sub, start, end)
+        pos = end
+        while pos > start:
+            index = (pos - 1) // self.block_size
+            base = index * self.block_size
+            i = self.block(index).rfind(sub, max(start - base, 0), pos - base)
+            if i != -1:
+                return base + i
+            pos = base
+        return -1
+
+    def _find_window(self, sub: bytes, start: int, end: int) -> int:
+        pos = start
+        while pos < end:
+            window_end = min(pos + self.block_size + len(sub) - 1, end)
+            i = self[pos:window_end].find(sub)
+            if i != -1:
+                return pos + i
+            pos += self.block_size
+        return -1
+
+    def _rfind_window(self, sub: bytes, start: int, end: int) -> int:
+        pos = end
+        while pos > start:
+            window_start = max(pos - self.block_size - len(sub) + 1, start)
+            i = self[window_start:pos].rfind(sub)
+            if i != -1:
+                return window_start + i
+            pos -= self.block_size
+        return -1
+
+
+class PreadSource(ByteSource):
+    """ByteSource that reads the file with pread, for files that can't be mapped"""
+
+    def __init__(self, fd: io.BufferedReader, size: int):
+        self._fd = self.dup_fd(fd)
+        ByteSource.__init__(self, size)
+
+    def read_range(self, start: int, end: int) -> bytes:
+        parts: List[bytes] = []
+        while start < end:
+            data = os.pread(self._fd, end - start, start)
+            if not data:
+                # Truncated since it was opened.
+                break
+            parts.append(data)
+            start += len(data)
+        return b"".join(parts)
+
+    def close(self) -> None:
+        ByteSource.close(self)
+        with self._lock:
+            if self._fd != -1:
+                self.close_fd()
+                self._fd = -1
+
+
+class WindowedMap(ByteSource):
+    """ByteSource that maps only a few segments of the file at a time
+
+    For files that can't be mapped whole, because of a small address
+    space or ulimit -v. The segments of segment_size bytes are mapped
+    when read and the least recently used is unmapped when there are
+    more than segments. segment_size must be a multiple of
+    mmap.ALLOCATIONGRANULARITY.
+    """
+
+    def __init__(
+        self,
+        fd: io.BufferedReader,
+        size: int,
+        segment_size: int = SEGMENT_SIZE,
+        segments: int = SEGMENTS,
+    ):
+        assert segment_size % mmap.ALLOCATIONGRANULARITY == 0
+        self._fd = self.dup_fd(fd)
+        self.segment_size = segment_size
+        self.segments = segments
+        self._segments: "OrderedDict[int, mmap.mmap]" = OrderedDict()
+        ByteSource.__init__(self, size)
+        try:
+            # Fail now, and not while viewing, if nothing can be mapped:
+            self.segment(0)
+        except OSError:
+            self.close()
+            raise
+
+    @property
+    def mapped(self) -> int:
+        """Number of segments mapped"""
+        return len(self._segments)
+
+    def segment(self, index: int) -> mmap.mmap:
+        with self._lock:
+            mm = self._segments.get(index)
+            if mm is not None:
+                self._segments.move_to_end(index)
+                return mm
+            offset = index * self.segment_size
+            length = min(self.segment_size, self._size - offset)
+            mm = mmap.mmap(self._fd, length, access=mmap.ACCESS_READ, offset=offset)
+            self._segments[index] = mm
+            while len(self._segments) > self.segments:
+                self._segments.popitem(last=False)[1].close()
+            return mm
+
+    def read_range(self, start: int, end: int) -> bytes:
+        parts: List[bytes] = []
+        while start < end:
+            index = start // self.segment_size
+            base = index * self.segment_size
+            mm = self.segment(index)
+            part_end = min(end, base + len(mm))
+            parts.append(mm[start - base : part_end - base])
+            start = part_end
+        return b"".join(parts)
+
+    def close(self) -> None:
+        ByteSource.close(self)
+        with self._lock:
+            for mm in self._segments.values():
+                mm.close()
+            self._segments.clear()
+            if self._fd != -1:
+                self.close_fd()
+                self._fd = -1
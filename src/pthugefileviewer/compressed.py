@@ -0,0 +1,653 @@
+"""Random access to gzip, xz and zstd compressed files"""
+
+import abc
+import io
+import logging
+import lzma
+import os
+import struct
+import threading
+import zlib
+from array import array
+from bisect import bisect_right
+from typing import Any, Callable, List, Optional, Tuple, Type
+
+from .bytesource import ByteSource
+
+CHECKPOINT_SPACING = 16 * 1024 * 1024
+# Output between the calls to on_update of a background scan:
+UPDATE_SPACING = 16 * 1024 * 1024
+# Each gzip checkpoint keeps a 32 KiB window, about 40 KB in all:
+MAX_CHECKPOINTS = 1024
+READ_CHUNK = 64 * 1024
+OUTPUT_CHUNK = 256 * 1024
+CURSORS = 4
+
+GZIP_MAGIC = b"\x1f\x8b"
+XZ_MAGIC = b"\xfd7zXZ\x00"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+logger = logging.getLogger(__name__)
+
+_INDEX_MAGIC = b"HFVCIDX1"
+_INDEX_HEADER = struct.Struct("<8sQQQ")
+
+
+class Cursor(abc.ABC):
+    """Sequential decompressor positioned at uncompressed offset upos
+
+    read returns the next piece of output, or b"" at the end of the
+    frame. Only cursors that have not started yet are required to
+    support copy; the gzip cursor supports it at any point.
+    """
+
+    upos: int
+    frame: int = 0
+
+    @abc.abstractmethod
+    def read(self) -> bytes:
+        """Return the next piece of output, or b"" at the end of the frame"""
+
+    @abc.abstractmethod
+    def copy(self) -> "Cursor":
+        """Return a cursor at the same position, decompressing on its own"""
+
+
+class CompressedSource(ByteSource):
+    """ByteSource that decompresses on demand from checkpoints
+
+    frames holds an unstarted cursor for each independently compressed
+    frame, in order. checkpoints holds (upos, cursor) pairs sorted by
+    upos, the uncompressed offset: the frame starts, plus the ones gzip
+    adds as it decompresses; their offsets are kept in an array too, to
+    be bisected. A few cursors are kept after each read, so that reading
+    forward does not restart from a checkpoint.
+
+    Subclasses add the frames of their format in __init__, with
+    add_frame. Formats without a size in their headers find it with
+    find_size, which can scan the file in a thread, as LineIndex.build
+    does. Until the size is known the source grows as the scan goes,
+    and complete is False; on_update is called from the thread as it
+    grows and when it is done.
+    """
+
+    # Name of the format, for the log:
+    name = "compressed"
+    # Raised by the cursors when the data is invalid:
+    errors: Tuple[Type[Exception], ...] = (OSError,)
+    # Whether the scan adds checkpoints, and so is redone in the
+    # background when the size is loaded from the index file:
+    checkpointed = False
+
+    def __init__(self, fd: io.BufferedReader, size: int = 0):
+        self._fd = self.dup_fd(fd)
+        self.frames: List[Cursor] = []
+        self.checkpoints: List[Tuple[int, Cursor]] = []
+        self._keys = array("Q")
+        self._cursors: List[Cursor] = []
+        self.complete = True
+        self.on_update: Optional[Callable[[], None]] = None
+        self._index_path: Optional[str] = None
+        self._stat = os.fstat(self._fd)
+        self._cancel = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        ByteSource.__init__(self, size)
+
+    def add_frame(self, cursor: Cursor) -> None:
+        cursor.frame = len(self.frames)
+        self.frames.append(cursor)
+        self.checkpoints.append((cursor.upos, cursor))
+        self._keys.append(cursor.upos)
+
+    def close(self) -> None:
+        self.stop()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        ByteSource.close(self)
+        self._cursors = []
+        self.frames = []
+        self.checkpoints = []
+        self._keys = array("Q")
+        if self._fd != -1:
+            self.close_fd()
+            self._fd = -1
+
+    def add_checkpoint(self, cursor: Cursor) -> None:
+        keys = self._keys
+        if not keys or cursor.upos > keys[-1]:
+            # Scans go forward, so this is the usual case:
+            self.checkpoints.append((cursor.upos, cursor.copy()))
+            keys.append(cursor.upos)
+            return
+        i = bisect_right(keys, cursor.upos)
+        if i > 0 and keys[i - 1] == cursor.upos:
+            return
+        self.checkpoints.insert(i, (cursor.upos, cursor.copy()))
+        keys.insert(i, cursor.upos)
+
+    def on_read(self, cursor: Cursor) -> None:
+        """Called after every read, for subclasses that add checkpoints"""
+
+    def _cursor(self, start: int) -> Optional[Cursor]:
+        best: Optional[Cursor] = None
+        i = bisect_right(self._keys, start) - 1
+        if i >= 0:
+            best = self.checkpoints[i][1].copy()
+        for cursor in self._cursors:
+            if cursor.upos <= start and (best is None or cursor.upos > best.upos):
+                best = cursor
+        if best is not None and best in self._cursors:
+            self._cursors.remove(best)
+        return best
+
+    def _next_frame(self, cursor: Cursor) -> Optional[Cursor]:
+        if cursor.frame + 1 >= len(self.frames):
+            return None
+        return self.frames[cursor.frame + 1].copy()
+
+    def read_range(self, start: int, end: int) -> bytes:
+        cursor = self._cursor(start)
+        parts = []
+        while cursor is not None and cursor.upos < end:
+            chunk_start = cursor.upos
+            chunk = cursor.read()
+            if not chunk:
+                cursor = self._next_frame(cursor)
+                continue
+            self.on_read(cursor)
+            if cursor.upos > start:
+                parts.append(chunk[max(start - chunk_start, 0) : end - chunk_start])
+        if cursor is not None:
+            self._cursors.insert(0, cursor)
+            del self._cursors[CURSORS:]
+        return b"".join(parts)
+
+    def find_size(self, index_path: Optional[str], background: bool) -> None:
+        """Load the size from the index file at index_path, or scan for it
+
+        The scan saves the index file when it is done. With background,
+        it runs in a thread and this returns at once. When the index
+        file is loaded the size is known, and the checkpoints of a
+        checkpointed format are recreated by the thread: until it gets
+        there, reading far into a single frame decompresses it from the
+        start. Without background, the scan is done here, and only when
+        there is no index file.
+        """
+        self._index_path = index_path
+        index = None if index_path is None else load_index(index_path, self._stat)
+        if index is not None:
+            self._size = index[0]
+            self.load_frame_starts(index[1])
+            if not background or not self.checkpointed:
+                return
+        else:
+            self.complete = False
+        if not background:
+            self.build()
+            return
+        cursor = None
+        if index is None:
+            # The start is decompressed now, so that an invalid file
+            # fails here, and so that there is something to show:
+            cursor = self.scan_cursor()
+            if cursor.read():
+                self.on_read(cursor)
+                self._size = cursor.upos
+        self._thread = threading.Thread(target=self._build, args=(cursor,), daemon=True)
+        self._thread.start()
+
+    def scan_cursor(self) -> Cursor:
+        """Return a cursor that scans the file from the start"""
+        return self.frames[0].copy()
+
+    def load_frame_starts(self, starts: List[Tuple[int, int]]) -> None:
+        """Add the checkpoints saved by frame_starts in the index file"""
+
+    def build(self, cursor: Optional[Cursor] = None) -> None:
+        """Scan the file, adding the checkpoints and finding the size
+
+        cursor is where a scan that was started continues.
+        """
+        if cursor is None:
+            cursor = self.scan_cursor()
+        updated = 0
+        while True:
+            if self._cancel.is_set():
+                return
+            if not cursor.read():
+                break
+            with self._lock:
+                self.on_read(cursor)
+                if not self.complete:
+                    # The last block was cut at the old size:
+                    self._blocks.pop(self._size // self.block_size, None)
+                    self._size = cursor.upos
+            if self.on_update is not None and cursor.upos - updated >= UPDATE_SPACING:
+                updated = cursor.upos
+                self.on_update()
+        if not self.complete:
+            self.complete = True
+            if self._index_path is not None:
+                try:
+                    self.save_index(self._index_path, self._stat)
+                except OSError:
+                    pass
+        if self.on_update is not None:
+            self.on_update()
+
+    def _build(self, cursor: Optional[Cursor]) -> None:
+        try:
+            self.build(cursor)
+        except self.errors as e:
+            # The data decompressed so far is shown.
+            logger.warning("cannot decompress all of the %s file: %s", self.name, e)
+            self.complete = True
+            if self.on_update is not None:
+                self.on_update()
+
+    def stop(self) -> None:
+        """Stop the background scan, keeping the checkpoints it added"""
+        self._cancel.set()
+
+    def join(self, timeout: Optional[float] = None) -> None:
+        """Wait for the background scan to finish"""
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def frame_starts(self) -> List[Tuple[int, int]]:
+        """Return the (coffset, upos) of checkpoints that can be saved"""
+        return []
+
+    def save_index(self, path: str, stat: os.stat_result) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        offsets = array("Q")
+        for coffset, upos in self.frame_starts():
+            offsets.extend((coffset, upos))
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as fd:
+            header = (_INDEX_MAGIC, stat.st_size, stat.st_mtime_ns, len(self))
+            fd.write(_INDEX_HEADER.pack(*header))
+            offsets.tofile(fd)
+        os.replace(tmp, path)
+
+
+def load_index(
+    path: str, stat: os.stat_result
+) -> Optional[Tuple[int, List[Tuple[int, int]]]]:
+    """Return the size and frame starts saved at path, if still valid"""
+    try:
+        with open(path, "rb") as fd:
+            header = fd.read(_INDEX_HEADER.size)
+            offsets = array("Q")
+            offsets.frombytes(fd.read())
+    except (OSError, ValueError):
+        return None
+    if len(header) != _INDEX_HEADER.size:
+        return None
+    magic, csize, mtime_ns, size = _INDEX_HEADER.unpack(header)
+    if (magic, csize, mtime_ns) != (_INDEX_MAGIC, stat.st_size, stat.st_mtime_ns):
+        return None
+    pairs = list(zip(offsets[::2], offsets[1::2]))
+    return size, pairs
+
+
+# gzip:
+
+
+class GzipCursor(Cursor):
+    """Inflates gzip members one after the other; can be copied anywhere
+
+    If members is given, the (coffset, upos) of each new member is
+    appended to it.
+    """
+
+    def __init__(
+        self,
+        fd: int,
+        cpos: int,
+        upos: int,
+        d: Any = None,
+        members: Optional[List[Tuple[int, int]]] = None,
+    ):
+        self.fd = fd
+        self.cpos = cpos
+        self.upos = upos
+        self.member_start = d is None
+        self.d = d if d is not None else zlib.decompressobj(31)
+        self.members = members
+
+    def copy(self) -> "GzipCursor":
+        cursor = GzipCursor(self.fd, self.cpos, self.upos, self.d.copy())
+        cursor.member_start = self.member_start
+        cursor.frame = self.frame
+        return cursor
+
+    def read(self) -> bytes:
+        member = (self.cpos, self.upos)
+        while True:
+            if self.d.eof:
+                # The next member starts where the unused data starts:
+                self.cpos -= len(self.d.unused_data)
+                self.d = zlib.decompressobj(31)
+                self.member_start = True
+                member = (self.cpos, self.upos)
+            data = self.d.unconsumed_tail
+            if not data:
+                data = os.pread(self.fd, READ_CHUNK, self.cpos)
+                self.cpos += len(data)
+                if not data:
+                    return b""
+            try:
+                out: bytes = self.d.decompress(data, OUTPUT_CHUNK)
+            except zlib.error:
+                if self.member_start and self.upos > 0:
+                    # Trailing garbage after the last member.
+                    return b""
+                raise
+            if out:
+                if self.member_start and self.members is not None and self.upos:
+                    self.members.append(member)
+                self.member_start = False
+                self.upos += len(out)
+                return out
+
+
+class GzipSource(CompressedSource):
+    """Random access to gzip files through inflate checkpoints
+
+    The file is scanned once and a copy of the decompressor state is
+    kept every spacing bytes of output, so reading any offset only
+    inflates from the previous checkpoint. At most max_checkpoints are
+    kept: when there are more, the spacing is doubled and every other
+    checkpoint is dropped, so that the memory they take is bounded on
+    huge files. zlib cannot serialize those states, so only the
+    uncompressed size and the member starts are saved in the index
+    file. With background, the scan runs in a thread, see find_size.
+    """
+
+    name = "gzip"
+    errors = (OSError, zlib.error)
+    checkpointed = True
+
+    def __init__(
+        self,
+        fd: io.BufferedReader,
+        index_path: Optional[str] = None,
+        spacing: int = CHECKPOINT_SPACING,
+        background: bool = False,
+        max_checkpoints: int = MAX_CHECKPOINTS,
+    ):
+        CompressedSource.__init__(self, fd)
+        self.spacing = spacing
+        self.max_checkpoints = max_checkpoints
+        self._members: List[Tuple[int, int]] = [(0, 0)]
+        self.add_frame(GzipCursor(self._fd, 0, 0))
+        self.find_size(index_path, background)
+
+    def scan_cursor(self) -> "GzipCursor":
+        members = None if self.complete else self._members
+        return GzipCursor(self._fd, 0, 0, members=members)
+
+    def load_frame_starts(self, starts: List[Tuple[int, int]]) -> None:
+        self._members = starts
+        for coffset, upos in starts[1:]:
+            self.add_checkpoint(GzipCursor(self._fd, coffset, upos))
+
+    def on_read(self, cursor: Cursor) -> None:
+        keys = self._keys
+        i = bisect_right(keys, cursor.upos) - 1
+        if cursor.upos - keys[i] >= self.spacing:
+            self.add_checkpoint(cursor)
+            while len(self.checkpoints) > self.max_checkpoints:
+                self.thin()
+
+    def thin(self) -> None:
+        """Double the spacing, dropping the checkpoints that are too close
+
+        The first checkpoint, at the start of the file, is always kept.
+        """
+        self.spacing *= 2
+        checkpoints = self.checkpoints[:1]
+        for upos, cursor in self.checkpoints[1:]:
+            if upos - checkpoints[-1][0] >= self.spacing:
+                checkpoints.append((upos, cursor))
+        self.checkpoints = checkpoints
+        self._keys = array("Q", (upos for upos, _ in checkpoints))
+
+    def frame_starts(self) -> List[Tuple[int, int]]:
+        return self._members
+
+
+# xz:
+
+
+def _varint(data: bytes, pos: int) -> Tuple[int, int]:
+    value = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return value, pos
+        shift += 7
+
+
+def xz_blocks(fd: int, size: int) -> List[Tuple[int, int, int, int, int]]:
+    """Parse the xz indexes of all streams in the file
+
+    Returns (stream_start, block_start, block_size, upos, usize) for each
+    block, in file order.
+    """
+    streams = []
+    end = size
+    while end > 0:
+        # Skip the stream padding:
+        while end >= 4 and os.pread(fd, 4, end - 4) == b"\x00" * 4:
+            end -= 4
+        if end == 0:
+            break
+        footer = os.pread(fd, 12, end - 12)
+        if len(footer) != 12 or footer[10:12] != b"YZ":
+            raise ValueError("invalid xz footer")
+        index_size = (struct.unpack("<I", footer[4:8])[0] + 1) * 4
+        index_start = end - 12 - index_size
+        index = os.pread(fd, index_size, index_start)
+        if index[0] != 0:
+            raise ValueError("invalid xz index")
+        count, pos = _varint(index, 1)
+        records = []
+        for _ in range(count):
+            unpadded, pos = _varint(index, pos)
+            usize, pos = _varint(index, pos)
+            records.append(((unpadded + 3) & ~3, usize))
+        stream_start = index_start - sum(bsize for bsize, _ in records) - 12
+        if stream_start < 0:
+            raise ValueError("invalid xz index")
+        blocks = []
+        block_start = stream_start + 12
+        for bsize, usize in records:
+            blocks.append((stream_start, block_start, bsize, usize))
+            block_start += bsize
+        streams.append(blocks)
+        end = stream_start
+    result = []
+    upos = 0
+    for blocks in reversed(streams):
+        for stream_start, block_start, bsize, usize in blocks:
+            result.append((stream_start, block_start, bsize, upos, usize))
+            upos += usize
+    return result
+
+
+class XzCursor(Cursor):
+    """Decompresses a single xz block, fed after its stream header"""
+
+    def __init__(self, fd: int, stream_start: int, start: int, size: int, upos: int):
+        self.fd = fd
+        self.args = (stream_start, start, size, upos)
+        self.cpos = start
+        self.cend = start + size
+        self.upos = upos
+        self.d: Optional[lzma.LZMADecompressor] = None
+
+    def copy(self) -> "XzCursor":
+        cursor = XzCursor(self.fd, *self.args)
+        cursor.frame = self.frame
+        return cursor
+
+    def read(self) -> bytes:
+        if self.d is None:
+            self.d = lzma.LZMADecompressor(lzma.FORMAT_XZ)
+            self.d.decompress(os.pread(self.fd, 12, self.args[0]))
+        while not self.d.eof:
+            data = b""
+            if self.d.needs_input:
+                size = min(READ_CHUNK, self.cend - self.cpos)
+                data = os.pread(self.fd, size, self.cpos) if size > 0 else b""
+                if not data:
+                    return b""
+                self.cpos += len(data)
+            out: bytes = self.d.decompress(data, OUTPUT_CHUNK)
+            if out:
+                self.upos += len(out)
+                return out
+        return b""
+
+
+class XzSource(CompressedSource):
+    """Random access to xz files through their block index
+
+    Files written with several blocks (xz -T or --block-size) can be
+    read starting at any block; a single-block file is decompressed from
+    the start when reading backwards.
+    """
+
+    def __init__(self, fd: io.BufferedReader):
+        CompressedSource.__init__(self, fd)
+        blocks = xz_blocks(self._fd, os.fstat(self._fd).st_size)
+        for stream_start, start, bsize, upos, usize in blocks:
+            self.add_frame(XzCursor(self._fd, stream_start, start, bsize, upos))
+            self._size = upos + usize
+
+
+# zstd:
+
+
+def zstd_seek_table(fd: int, size: int) -> Optional[List[Tuple[int, int, int, int]]]:
+    """Parse the seek table of a seekable zstd file
+
+    Returns (cpos, csize, upos, usize) for each frame, or None if the file
+    has no seek table.
+    """
+    if size < 9:
+        return None
+    footer = os.pread(fd, 9, size - 9)
+    count, descriptor, magic = struct.unpack("<IBI", footer)
+    if magic != 0x8F92EAB1:
+        return None
+    entry_size = 12 if descriptor & 0x80 else 8
+    table_size = count * entry_size
+    table = os.pread(fd, table_size, size - 9 - table_size)
+    frames = []
+    cpos = upos = 0
+    for i in range(count):
+        csize, usize = struct.unpack_from("<II", table, i * entry_size)
+        frames.append((cpos, csize, upos, usize))
+        cpos += csize
+        upos += usize
+    return frames
+
+
+class ZstdCursor(Cursor):
+    """Decompresses the zstd frames from cpos to cpos + csize
+
+    zstd is the zstandard module, imported by ZstdSource.
+    """
+
+    def __init__(self, zstd: Any, fd: int, cpos: int, csize: int, upos: int):
+        self.zstd = zstd
+        self.fd = fd
+        self.args = (cpos, csize, upos)
+        self.cpos = cpos
+        self.cend = cpos + csize
+        self.upos = upos
+        self.d: Any = None
+
+    def copy(self) -> "ZstdCursor":
+        cursor = ZstdCursor(self.zstd, self.fd, *self.args)
+        cursor.frame = self.frame
+        return cursor
+
+    def read(self) -> bytes:
+        if self.d is None:
+            decompressor = self.zstd.ZstdDecompressor()
+            self.d = decompressor.decompressobj(read_across_frames=True)
+        while self.cpos < self.cend:
+            size = min(READ_CHUNK, self.cend - self.cpos)
+            data = os.pread(self.fd, size, self.cpos)
+            if not data:
+                break
+            self.cpos += len(data)
+            out: bytes = self.d.decompress(data)
+            if out:
+                self.upos += len(out)
+                return out
+        return b""
+
+
+class ZstdSource(CompressedSource):
+    """Random access to zstd files; needs the zstandard package
+
+    Seekable zstd files have a seek table and can be read starting at
+    any frame. Other zstd files are scanned once to find their size,
+    which is saved in the index file; with background, the scan runs in
+    a thread, see find_size. They are decompressed from the start when
+    reading backwards. Raises ImportError when zstandard is not
+    installed.
+    """
+
+    name = "zstd"
+
+    def __init__(
+        self,
+        fd: io.BufferedReader,
+        index_path: Optional[str] = None,
+        background: bool = False,
+    ):
+        # Imported here, so that the caller can catch its absence:
+        import zstandard
+
+        CompressedSource.__init__(self, fd)
+        self.errors = (OSError, zstandard.ZstdError)
+        frames = zstd_seek_table(self._fd, self._stat.st_size)
+        if frames is not None:
+            for cpos, csize, upos, usize in frames:
+                self.add_frame(ZstdCursor(zstandard, self._fd, cpos, csize, upos))
+                self._size = upos + usize
+            return
+        self.add_frame(ZstdCursor(zstandard, self._fd, 0, self._stat.st_size, 0))
+        try:
+            self.find_size(index_path, background)
+        except zstandard.ZstdError as e:
+            self.close()
+            raise ValueError(f"invalid zstd data: {e}") from e
+
+
+def open_compressed(
+    fd: io.BufferedReader, index_path: Optional[str] = None, background: bool = False
+) -> Optional[CompressedSource]:
+    """Return a source for fd if it is compressed in a known format
+
+    background is passed to GzipSource and ZstdSource.
+    """
+    magic = os.pread(fd.fileno(), 6, 0)
+    if magic.startswith(GZIP_MAGIC):
+        return GzipSource(fd, index_path, background=background)
+    if magic.startswith(XZ_MAGIC):
+        return XzSource(fd)
+    if magic.startswith(ZSTD_MAGIC) or (
+        len(magic) >= 4 and magic[0] & 0xF0 == 0x50 and magic[1:4] == b"\x2a\x4d\x18"
+    ):
+        return ZstdSource(fd, index_path, background=background)
+    return None
@@ -0,0 +1,156 @@
+"""Decoding of the rows shown, with character boundaries per encoding"""
+
+import codecs
+from typing import Callable, List
+
+from .lineindex import FileBuffer
+
+# Decodes the part [start, end) of the line [line_start, line_end) of a
+# page; see Decoder.page:
+Fragment = Callable[[int, int, int, int], str]
+
+_BOMS = [
+    (codecs.BOM_UTF8, "utf-8"),
+    (codecs.BOM_UTF16_LE, "utf-16-le"),
+    (codecs.BOM_UTF16_BE, "utf-16-be"),
+]
+
+
+def detect_encoding(buf: FileBuffer, default: str = "utf-8") -> str:
+    """Return the encoding given by the byte order mark of buf, or default"""
+    head = buf[:3]
+    for bom, encoding in _BOMS:
+        if head.startswith(bom):
+            return encoding
+    return default
+
+
+class Decoder:
+    """Decodes the rows of a file in an encoding
+
+    Invalid bytes are replaced instead of raising. Pages of pure ASCII
+    in ASCII compatible encodings, the common case for logs, are
+    decoded once and sliced. The parts of a line split by highlights
+    are moved to character boundaries: UTF-8 continuation bytes go
+    with the character they continue, and UTF-16 is cut at code units,
+    keeping surrogate pairs together. UTF-16 files are split in lines
+    at the 0x0A byte of their newlines, so a character with that byte
+    also splits a line; in UTF-16-LE the byte after it starts the next
+    line, or is part of the last line at the end of the file.
+    """
+
+    def __init__(self, encoding: str = "utf-8"):
+        self.encoding = codecs.lookup(encoding).name
+        if self.encoding == "utf-16":
+            # Slices are decoded without the byte order mark:
+            self.encoding = "utf-16-le"
+        newline = "\n".encode(self.encoding)
+        self.ascii_compatible = newline == b"\n"
+        # Bytes of the newline after its 0x0A byte:
+        self.newline_tail = len(newline) - newline.index(b"\n") - 1
+        self.utf16 = self.encoding in ("utf-16-le", "utf-16-be")
+        self.utf8 = self.encoding == "utf-8"
+        # Index of the high byte in a UTF-16 code unit:
+        self._high = 0 if self.encoding == "utf-16-be" else 1
+
+    def char_start(self, buf: FileBuffer, offset: int) -> int:
+        """Return offset moved forward to the start of a character
+
+        UTF-16 code units start at even offsets, with the byte order
+        mark or the first character at the start of the file.
+        """
+        if self.utf8:
+            for _ in range(3):
+                byte = buf[offset : offset + 1]
+                if not byte or not 0x80 <= byte[0] < 0xC0:
+                    break
+                offset += 1
+        elif self.utf16:
+            offset += offset % 2
+            if self._low_surrogate(buf, offset):
+                offset += 2
+        return offset
+
+    def _low_surrogate(self, data: FileBuffer, pos: int) -> bool:
+        high = data[pos + self._high : pos + self._high + 1]
+        return bool(high) and 0xDC <= high[0] <= 0xDF
+
+    def encode_pattern(self, pattern: str) -> bytes:
+        """Return a regular expression as bytes to match in this encoding
+
+        Only ASCII compatible encodings keep the syntax of the
+        expression; a ValueError is raised for the others, and for
+        characters that the encoding can't represent.
+        """
+        if not self.ascii_compatible:
+            raise ValueError(
+                f"regular expressions can't match {self.encoding},"
+                " which is not ASCII compatible"
+            )
+        try:
+            return pattern.encode(self.encoding)
+        except UnicodeEncodeError as e:
+            raise ValueError(
+                f"{pattern[e.start:e.end]!r} is not in {self.encoding}"
+            ) from None
+
+    def rstrip(self, data: bytes) -> bytes:
+        """Strip the trailing whitespace of a row, when it is bytewise"""
+        return data.rstrip() if self.ascii_compatible else data
+
+    def decode(self, line: bytes) -> str:
+        if self.utf16:
+            line = line[: len(line) & ~1]
+            text = line.decode(self.encoding, errors="replace")
+            return text.lstrip("\ufeff").rstrip()
+        return line.decode(self.encoding, errors="replace")
+
+    def decode_lines(self, lines: List[bytes]) -> List[str]:
+        """Decode consecutive rows, in one go if they are ASCII"""
+        if lines and self.ascii_compatible:
+            contents = b"\n".join(lines)
+            if contents.isascii():
+                texts = contents.decode("ascii").split("\n")
+                if len(texts) == len(lines):
+                    return texts
+        return [self.decode(line) for line in lines]
+
+    def align(self, data: bytes, line_start: int, line_end: int, pos: int) -> int:
+        """Return pos moved forward to the start of a character of the line"""
+        if self.utf8:
+            for _ in range(3):
+                if pos >= line_end or not 0x80 <= data[pos] < 0xC0:
+                    break
+                pos += 1
+        elif self.utf16:
+            pos += (pos - line_start) % 2
+            if pos < line_end and self._low_surrogate(data, pos):
+                pos += 2
+        return min(pos, line_end)
+
+    def page(self, contents: bytes) -> Fragment:
+        """Return a function that decodes the parts of the lines of contents
+
+        The function takes line_start, line_end, start and end offsets
+        in contents, and returns the text of the characters that start
+        in [start, end) of the line: a character cut at either edge goes
+        to the part where it starts.
+        """
+        if self.ascii_compatible and contents.isascii():
+            text = contents.decode("ascii")
+            return lambda line_start, line_end, start, end: text[start:end]
+
+        def fragment(line_start: int, line_end: int, start: int, end: int) -> str:
+            if self.utf16:
+                line_end -= (line_end - line_start) % 2
+            start = self.align(contents, line_start, line_end, start)
+            end = self.align(contents, line_start, line_end, end)
+            text = contents[start:end].decode(self.encoding, errors="replace")
+            if self.utf16:
+                if start == line_start:
+                    text = text.lstrip("\ufeff")
+                if end == line_end:
+                    text = text.rstrip()
+            return text
+
+        return fragment
@@ -0,0 +1,163 @@
+"""Export a byte range, or the lines that match a regex, to a file"""
+
+import errno
+import os
+import re
+import threading
+from typing import BinaryIO, Callable, Optional
+
+from .lineindex import FileBuffer
+from .search import CHUNK_SIZE, MAX_MATCH_SPAN, SearchCancelled, chunked_finditer
+
+# Bytes copied per system call, between progress and cancel checks:
+COPY_CHUNK = 64 * 1024 * 1024
+WRITE_BUFFER = 1024 * 1024
+
+# Errors that mean the kernel can't copy between these two files:
+_UNSUPPORTED = {errno.EXDEV, errno.EINVAL, errno.ENOSYS, errno.EOPNOTSUPP}
+
+
+def _copy_file_range(src: int, dst: int, offset: int, count: int) -> int:
+    return os.copy_file_range(src, dst, count, offset)
+
+
+def _sendfile(src: int, dst: int, offset: int, count: int) -> int:
+    return os.sendfile(dst, src, offset, count)
+
+
+def _pread_write(src: int, dst: int, offset: int, count: int) -> int:
+    data = memoryview(os.pread(src, min(count, WRITE_BUFFER), offset))
+    written = 0
+    while written < len(data):
+        written += os.write(dst, data[written:])
+    return written
+
+
+def copy_range(
+    src: int,
+    dst: int,
+    start: int,
+    end: int,
+    progress: Optional[Callable[[int], None]] = None,
+    cancel: Optional[threading.Event] = None,
+    chunk: int = COPY_CHUNK,
+) -> int:
+    """Append the bytes [start, end) of the file src to the file dst
+
+    The data is copied by the kernel with copy_file_range, or with
+    sendfile where that is not available or not supported between the
+    two files, so it never goes through user space; pread and write are
+    the last resort. Returns the bytes copied, fewer than asked if src
+    is shorter. progress and cancel work as in chunked_search.
+    """
+    copies = [_pread_write]
+    if hasattr(os, "sendfile"):
+        copies.insert(0, _sendfile)
+    if hasattr(os, "copy_file_range"):
+        copies.insert(0, _copy_file_range)
+    offset = start
+    while offset < end:
+        if cancel is not None and cancel.is_set():
+            raise SearchCancelled()
+        try:
+            copied = copies[0](src, dst, offset, min(chunk, end - offset))
+        except OSError as e:
+            if e.errno not in _UNSUPPORTED or len(copies) == 1:
+                raise
+            copies.pop(0)
+            continue
+        if copied == 0:
+            break
+        offset += copied
+        if progress is not None:
+            progress(offset)
+    return offset - start
+
+
+def write_range(
+    buf: FileBuffer,
+    dst: BinaryIO,
+    start: int,
+    end: int,
+    progress: Optional[Callable[[int], None]] = None,
+    cancel: Optional[threading.Event] = None,
+    chunk: int = CHUNK_SIZE,
+) -> int:
+    """Write buf[start:end] to dst, for buffers that are not a plain file"""
+    end = min(end, len(buf))
+    offset = start
+    while offset < end:
+        if cancel is not None and cancel.is_set():
+            raise SearchCancelled()
+        data = buf[offset : min(offset + chunk, end)]
+        dst.write(data)
+        offset += len(data)
+        if progress is not None:
+            progress(offset)
+    return max(0, end - start)
+
+
+def write_matching_lines(
+    buf: FileBuffer,
+    regex: "re.Pattern[bytes]",
+    dst: BinaryIO,
+    progress: Optional[Callable[[int], None]] = None,
+    cancel: Optional[threading.Event] = None,
+    chunk_size: int = CHUNK_SIZE,
+    max_span: int = MAX_MATCH_SPAN,
+) -> int:
+    """Write the lines of buf where a match of regex starts to dst, like grep
+
+    The matches are found by chunked_finditer, and each line is written
+    once, ending with a newline. Returns the number of lines written.
+    """
+    size = len(buf)
+    lines = 0
+    written_end = 0
+    for start, _ in chunked_finditer(
+        buf,
+        regex,
+        chunk_size=chunk_size,
+        max_span=max_span,
+        progress=progress,
+        cancel=cancel,
+    ):
+        if start < written_end:
+            continue
+        newline = buf.rfind(b"\n", written_end, start)
+        line_start = written_end if newline == -1 else newline + 1
+        newline = buf.find(b"\n", start)
+        line_end = size if newline == -1 else newline + 1
+        dst.write(buf[line_start:line_end])
+        if newline == -1:
+            dst.write(b"\n")
+        written_end = line_end
+        lines += 1
+    return lines
+
+
+def unused_path(path: str) -> str:
+    """Return path, or path.N with the first N that doesn't exist"""
+    candidate = path
+    n = 0
+    while os.path.exists(candidate):
+        n += 1
+        candidate = f"{path}.{n}"
+    return candidate
+
+
+def export_to(out: str, write: Callable[[BinaryIO], int]) -> int:
+    """Create the file out and write it with write, returning its result
+
+    The file is removed if write fails or is cancelled, so that a
+    partial export is not taken for a complete one.
+    """
+    try:
+        with open(out, "wb", buffering=WRITE_BUFFER) as dst:
+            return write(dst)
+    except BaseException:
+        try:
+            os.unlink(out)
+        except OSError:
+            pass
+        raise
@@ -0,0 +1,123 @@
+"""Follow growing files, like tail -F"""
+
+import asyncio
+import ctypes
+import ctypes.util
+import os
+import select
+import threading
+import time
+from typing import Callable, Optional
+
+from .hugefilevieweruicontrol import HugeFileViewerUIControl
+
+POLL_INTERVAL = 1.0
+DEBOUNCE = 0.1
+
+_IN_NONBLOCK = 0o4000
+_IN_CLOEXEC = 0o2000000
+# IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO |
+# IN_CREATE | IN_DELETE:
+_IN_MASK = 0x2 | 0x4 | 0x8 | 0x40 | 0x80 | 0x100 | 0x200
+
+
+def inotify_watch(path: str) -> Optional[int]:
+    """Return an inotify fd watching the directory of path, if possible
+
+    The directory is watched instead of the file, so that the file
+    being rotated or recreated also wakes us up.
+    """
+    libname = ctypes.util.find_library("c")
+    try:
+        libc = ctypes.CDLL(libname, use_errno=True)
+        init = libc.inotify_init1
+        add_watch = libc.inotify_add_watch
+    except (OSError, AttributeError):
+        return None
+    fd: int = init(_IN_NONBLOCK | _IN_CLOEXEC)
+    if fd < 0:
+        return None
+    directory = os.path.dirname(os.path.abspath(path))
+    if add_watch(fd, os.fsencode(directory), ctypes.c_uint32(_IN_MASK)) < 0:
+        os.close(fd)
+        return None
+    return fd
+
+
+class FileFollower:
+    """Remaps a control when its file grows, shrinks or is replaced
+
+    A worker thread waits for inotify events, polling stat every
+    interval seconds when inotify is not available or does not deliver
+    events (NFS, for instance). The file is checked and remapped in the
+    event loop's thread, where the control is used.
+    """
+
+    def __init__(
+        self,
+        control: HugeFileViewerUIControl,
+        path: str,
+        on_change: Optional[Callable[[], None]] = None,
+        interval: float = POLL_INTERVAL,
+    ):
+        self.control = control
+        self.path = path
+        self.on_change = on_change
+        self.interval = interval
+        self._stop = threading.Event()
+        self._stat = os.stat(path)
+
+    def check(self) -> bool:
+        """Remap the control if the file changed; return if it did"""
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            # Rotated away and not recreated yet.
+            return False
+        old = self._stat
+        if (stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns) == (
+            old.st_dev,
+            old.st_ino,
+            old.st_size,
+            old.st_mtime_ns,
+        ):
+            return False
+        self._stat = stat
+        with open(self.path, "rb") as fd:
+            self.control.remap(fd)
+        if self.on_change is not None:
+            self.on_change()
+        return True
+
+    def start(self, loop: Optional[asyncio.AbstractEventLoop] = None) -> None:
+        loop = loop or asyncio.get_event_loop()
+        threading.Thread(target=self._run, args=(loop,), daemon=True).start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _run(self, loop: asyncio.AbstractEventLoop) -> None:
+        inotify = inotify_watch(self.path)
+        try:
+            while not self._stop.is_set():
+                if inotify is None:
+                    self._stop.wait(self.interval)
+                else:
+                    readable, _, _ = select.select([inotify], [], [], self.interval)
+                    if readable:
+                        try:
+                            while os.read(inotify, 4096):
+                                pass
+                        except BlockingIOError:
+                            pass
+                if self._stop.is_set():
+                    break
+                try:
+                    loop.call_soon_threadsafe(self.check)
+                except RuntimeError:
+                    # The event loop is closed.
+                    break
+                time.sleep(DEBOUNCE)
+        finally:
+            if inotify is not None:
+                os.close(inotify)
@@ -0,0 +1,46 @@
+"""Rows of a hex dump, with a hex and an ASCII column"""
+
+from typing import Sequence, Tuple
+
+from prompt_toolkit.formatted_text import StyleAndTextTuples
+
+# Bytes per row of the dump:
+HEX_WIDTH = 16
+
+# Printable ASCII is shown as is in the ASCII column, other bytes as dots:
+_PRINTABLE = bytes(b if 0x20 <= b < 0x7F else ord(".") for b in range(256))
+
+
+def hex_row(
+    data: bytes, width: int = HEX_WIDTH, spans: Sequence[Tuple[int, int, str]] = ()
+) -> StyleAndTextTuples:
+    """Return the hex and ASCII columns of a row of width bytes
+
+    spans are the sorted start, end and style of the bytes of data to
+    highlight, in both columns. A short row, at the end of the file, is
+    padded so that its ASCII column is aligned with the others.
+    """
+    hexes = data.hex(" ")
+    text = data.translate(_PRINTABLE).decode("ascii")
+    hex_column: StyleAndTextTuples = []
+    text_column: StyleAndTextTuples = []
+    # Byte i is at 3 * i in hexes, followed by a space; the space is
+    # not highlighted, so that adjacent highlights stay apart:
+    hex_pos = pos = 0
+    for start, end, style in spans:
+        start = max(start, pos)
+        end = min(end, len(data))
+        if start >= end:
+            continue
+        if start > pos:
+            hex_column.append(("", hexes[hex_pos : 3 * start]))
+            text_column.append(("", text[pos:start]))
+        hex_column.append((style, hexes[3 * start : 3 * end - 1]))
+        text_column.append((style, text[start:end]))
+        hex_pos = 3 * end - 1
+        pos = end
+    padding = " " * (3 * (width - len(data)) + 2)
+    hex_column.append(("", hexes[hex_pos:] + padding))
+    if pos < len(data):
+        text_column.append(("", text[pos:]))
+    return hex_column + text_column
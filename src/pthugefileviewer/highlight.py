@@ -0,0 +1,90 @@
+"""Several regexes, each with its own style, matched in one pass"""
+
+import functools
+import heapq
+import re
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+StyledRegex = Tuple["re.Pattern[bytes]", str]
+
+_FLAGS = [
+    (re.IGNORECASE, "i"),
+    (re.MULTILINE, "m"),
+    (re.DOTALL, "s"),
+    (re.VERBOSE, "x"),
+]
+# Backreferences and conditionals; may also match escaped backslashes,
+# which only makes combine give up on the regex:
+_GROUPREF = re.compile(rb"\\[1-9]|\(\?P=|\(\?\(")
+
+
+@functools.lru_cache(maxsize=16)
+def combine(regexes: Tuple["re.Pattern[bytes]", ...]) -> Optional["re.Pattern[bytes]"]:
+    """Return a regex that matches any of regexes, in a group per regex
+
+    The group of regexes[i] is named _i; the flags of each regex are
+    kept in its group. Returns None when they can't be combined, as
+    when one of them refers to its groups, which are renumbered.
+    """
+    alternatives = []
+    for i, regex in enumerate(regexes):
+        if _GROUPREF.search(regex.pattern):
+            return None
+        flags = "".join(c for flag, c in _FLAGS if regex.flags & flag)
+        pattern = regex.pattern
+        if flags:
+            pattern = b"(?%s:%s)" % (flags.encode(), pattern)
+        alternatives.append(b"(?P<_%d>%s)" % (i, pattern))
+    try:
+        return re.compile(b"|".join(alternatives))
+    except re.error:
+        return None
+
+
+class Highlighter:
+    """Finds the matches of several regexes, each with its own style
+
+    The regexes are combined in a single alternation, so that the text
+    is scanned once instead of once per regex. Where matches overlap,
+    the one that starts first wins, and the earlier regex on ties. Falls
+    back to one scan per regex, merged, when they can't be combined;
+    empty matches are dropped then.
+    """
+
+    def __init__(self, patterns: Sequence[StyledRegex]):
+        self.patterns = list(patterns)
+        self.regexes = tuple(regex for regex, _ in self.patterns)
+        self.styles = [style for _, style in self.patterns]
+        self.combined = combine(self.regexes) if len(self.regexes) > 1 else None
+
+    def spans(self, text: bytes, pos: int = 0) -> Iterator[Tuple[int, int, str]]:
+        """Yield the start, end and style of the matches in text[pos:]"""
+        if len(self.regexes) == 1:
+            style = self.styles[0]
+            for m in self.regexes[0].finditer(text, pos):
+                yield m.start(), m.end(), style
+            return
+        if self.combined is not None:
+            for m in self.combined.finditer(text, pos):
+                assert m.lastgroup is not None
+                yield m.start(), m.end(), self.styles[int(m.lastgroup[1:])]
+            return
+        yield from self._merged(text, pos)
+
+    def _merged(self, text: bytes, pos: int) -> Iterator[Tuple[int, int, str]]:
+        iterators: List[Iterator[Tuple[int, int, int]]] = [
+            _starts(regex, i, text, pos) for i, regex in enumerate(self.regexes)
+        ]
+        last_end = pos
+        for start, i, end in heapq.merge(*iterators):
+            if start < last_end or start == end:
+                continue
+            yield start, end, self.styles[i]
+            last_end = end
+
+
+def _starts(
+    regex: "re.Pattern[bytes]", i: int, text: bytes, pos: int
+) -> Iterator[Tuple[int, int, int]]:
+    for m in regex.finditer(text, pos):
+        yield m.start(), i, m.end()
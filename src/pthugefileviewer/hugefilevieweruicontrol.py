@@ -1,11 +1,30 @@
 """Control for the huge file widget"""
 
+import errno
 import io
+import logging
+import lzma
 import mmap
+import os
 import re
-from contextlib import contextmanager
-from enum import Enum
-from typing import TYPE_CHECKING, Generator, Iterator, List, Optional  # noqa: I101
+import stat
+import sys
+import threading
+import zlib
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+from typing import (  # noqa: I101
+    TYPE_CHECKING,
+    Callable,
+    ContextManager,
+    Generator,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
 
 from prompt_toolkit.formatted_text import StyleAndTextTuples
 from prompt_toolkit.key_binding import KeyBindings
@@ -14,12 +33,93 @@ from prompt_toolkit.key_binding.key_processor import KeyPressEvent
 from prompt_toolkit.layout.controls import UIContent, UIControl
 from prompt_toolkit.mouse_events import MouseEvent, MouseEventType
 
+from .advice import VIEW_READAHEAD, madvise
+from .bytesource import PreadSource, WindowedMap
+from .compressed import CompressedSource, open_compressed
+from .decode import Decoder, detect_encoding
+from .export import copy_range, export_to, write_matching_lines, write_range
+from .hexdump import HEX_WIDTH, hex_row
+from .highlight import Highlighter, StyledRegex
+from .lineindex import FileBuffer, LineIndex, cache_path
+from .matchedlines import MAX_SCAN, MatchedLines
+from .matchindex import MatchIndex
+from .parallel import RANGE_SIZE, parallel_search
+from .search import (
+    CHUNK_SIZE,
+    MAX_MATCH_SPAN,
+    chunked_search,
+    chunked_search_backward,
+)
+from .stats import Stats
+from .timestamps import DEFAULT_FORMATS, Timestamps, TimestampFormat
+from .viewcache import LineCache
+
 if TYPE_CHECKING:
     from prompt_toolkit.key_binding.key_bindings import NotImplementedOrNone
 
 E = KeyPressEvent
 
+logger = logging.getLogger(__name__)
+
 MAX_LINES = 1000
+MAX_LINE_MATCHES = 256
+PREV_NEWLINE_WINDOW = 1024 * 1024
+# Counted at most by go_line past the part that the line index covers:
+GO_LINE_SCAN = 64 * 1024 * 1024
+MAX_LINE_WIDTH = 4096
+# Larger files are mapped in segments; 32-bit builds can't map them whole:
+FULL_MAP_LIMIT = 512 * 1024 * 1024 if sys.maxsize < 1 << 32 else sys.maxsize
+
+
+def map_file(fd: io.BufferedReader, background: bool = False) -> FileBuffer:
+    """Map fd read-only
+
+    Compressed files are decompressed on demand instead; their index is
+    kept in the cache directory when fd has a file name. With
+    background, gzip and zstd files are scanned in a thread, see
+    CompressedSource.find_size.
+
+    Files that can't be mapped whole, because they are larger than
+    FULL_MAP_LIMIT or the address space is exhausted, are mapped a few
+    segments at a time by WindowedMap, or read with pread if they can't
+    be mapped at all. Regular files without a size, like the ones in
+    /proc, are read into memory. Pipes, sockets and character devices
+    could be endless, and raise OSError instead: they can be copied to
+    a file with StreamSpool.
+    """
+    name = getattr(fd, "name", None)
+    st = os.fstat(fd.fileno())
+    if stat.S_ISBLK(st.st_mode):
+        size = os.lseek(fd.fileno(), 0, os.SEEK_END)
+    elif stat.S_ISREG(st.st_mode):
+        size = st.st_size
+    else:
+        raise OSError(errno.ESPIPE, "Not a file that can be mapped", name)
+    if size == 0:
+        return fd.read()
+    index_path = cache_path(name, "index") if isinstance(name, str) else None
+    try:
+        source = open_compressed(fd, index_path, background)
+    except (ImportError, ValueError, EOFError, zlib.error, lzma.LZMAError) as e:
+        logger.warning("showing %s as is, cannot decompress it: %s", name, e)
+        source = None
+    if source is not None:
+        return source
+    try:
+        if size > FULL_MAP_LIMIT:
+            raise OverflowError("larger than FULL_MAP_LIMIT")
+        mm = mmap.mmap(fd.fileno(), size, access=mmap.ACCESS_READ)
+    except (OSError, OverflowError) as e:
+        logger.info("mapping %s in segments, cannot map it whole: %s", name, e)
+        try:
+            return WindowedMap(fd, size)
+        except OSError as e:
+            logger.info("reading %s with pread, cannot map it: %s", name, e)
+            return PreadSource(fd, size)
+    # The viewer jumps around; the scans and the viewport read ahead
+    # explicitly instead, see advice.py.
+    madvise(mm, "RANDOM")
+    return mm
 
 
 class HugeFileViewerUIControl(UIControl):
@@ -27,32 +127,178 @@ class HugeFileViewerUIControl(UIControl):
 
     def __init__(self, fd: io.BufferedReader):
         self._fd = fd
-        self._mm = mmap.mmap(self._fd.fileno(), 0, access=mmap.ACCESS_READ)
-        self._size = self._mm.size()
+        self.path = self._path(fd)
+        self._mm = map_file(self._fd, background=True)
+        self._size = len(self._mm)
+        # Called from another thread while the buffer grows, see check_size:
+        self.on_buffer_update: Optional[Callable[[], None]] = None
+        self._watch_buffer()
+        self._stat = os.fstat(self._fd.fileno())
+        # The encoding given by set_encoding, or None to detect it:
+        self._encoding: Optional[str] = None
+        self.decoder = Decoder(detect_encoding(self._mm))
+        self.line_index: Optional[LineIndex] = None
+        self._line_index_thread: Optional[threading.Thread] = None
+        self._line_index_on_update: Optional[Callable[[], None]] = None
+        self._line_index_cancel = threading.Event()
+        self._offset = 0
         self._offset_max = 0
+        # Start of the range exported by export_range, see marked_range:
+        self.mark: Optional[int] = None
         self._lines: List[StyleAndTextTuples] = []
+        self.line_cache = LineCache()
+        self._percent_prefix = ""
         self._height = 0
+        self._width = 0
+        self._column = 0
+        self._wrap = False
+        self._hexdump = False
+        self.hex_width = HEX_WIDTH
+        self._rows: List[int] = []
+        self.max_line_width = MAX_LINE_WIDTH
+        self.timestamp_formats: Sequence[TimestampFormat] = DEFAULT_FORMATS
+        self.stats: Optional[Stats] = None
         self.update_lines()
 
+    @staticmethod
+    def _path(fd: io.BufferedReader) -> Optional[str]:
+        """Return the name of the file, if fd has one"""
+        name = getattr(fd, "name", None)
+        return name if isinstance(name, str) else None
+
+    def enable_stats(self) -> Stats:
+        """Start timing the hot paths and counting the bytes read
+
+        The timings are update_lines, style_lines, search in the regex
+        control, and read, the slicing of the rows from the file, which
+        includes the page faults of the map. The line cache hits and
+        misses are reported too.
+        """
+        if self.stats is None:
+            self.stats = Stats()
+            self.stats.watch("line_cache_hits", lambda: self.line_cache.hits)
+            self.stats.watch("line_cache_misses", lambda: self.line_cache.misses)
+        return self.stats
+
+    def _timer(self, name: str) -> ContextManager[None]:
+        if self.stats is None:
+            return nullcontext()
+        return self.stats.timer(name)
+
     def close(self) -> None:
-        self._mm.close()
+        if not isinstance(self._mm, bytes):
+            self._mm.close()
+
+    def remap(self, fd: io.BufferedReader) -> None:
+        """Map fd in place of the current file
+
+        Used when the file grows, is truncated or is replaced by a new
+        one. If the viewport was at the bottom it stays at the bottom;
+        otherwise it stays at the same offset, realigned to a line, or
+        goes to the top if the file was replaced.
+        """
+        stat = os.fstat(fd.fileno())
+        same = (stat.st_dev, stat.st_ino) == (self._stat.st_dev, self._stat.st_ino)
+        grew = same and stat.st_size >= self._size
+        if isinstance(self._mm, CompressedSource):
+            self._mm.stop()
+        # The old map is not closed, a background search may still be
+        # using it; it is unmapped, and the descriptor of a ByteSource
+        # closed, when the last reference goes away.
+        self.path = self._path(fd)
+        self._stat = stat
+        self._switch_buffer(map_file(fd, background=True), same, grew)
+        self._watch_buffer()
+
+    def check_size(self) -> bool:
+        """Pick up the growth of a buffer that is being decompressed
+
+        Called when the control is rendered; on_buffer_update is called
+        from the decompressing thread, so that it can be scheduled. The
+        viewport stays where it is. Returns whether the size changed.
+        """
+        if len(self._mm) == self._size:
+            return False
+        self._switch_buffer(self._mm, True, True, keep_bottom=False)
+        return True
+
+    def _watch_buffer(self) -> None:
+        if isinstance(self._mm, CompressedSource) and not self._mm.complete:
+            self._mm.on_update = self._buffer_updated
+
+    def _buffer_updated(self) -> None:
+        if self.on_buffer_update is not None:
+            self.on_buffer_update()
+
+    def _switch_buffer(
+        self, buf: FileBuffer, same: bool, grew: bool, keep_bottom: bool = True
+    ) -> None:
+        at_bottom = self._height > 0 and self.offset >= self._offset_max
+        at_bottom = at_bottom and keep_bottom
+        self._mm = buf
+        self._size = len(self._mm)
+        if not same:
+            self.mark = None
+            if self._encoding is None:
+                self.decoder = Decoder(detect_encoding(self._mm))
+        self.line_cache.clear()
+        if self.line_index is not None:
+            thread = self._line_index_thread
+            if grew:
+                self.line_index.grow(self._mm)
+            else:
+                self.stop_line_index()
+                self.line_index = LineIndex(self._mm)
+            if not grew or thread is None or not thread.is_alive():
+                self._line_index_thread = self._build_line_index(
+                    self.line_index, on_update=self._line_index_on_update
+                )
+        self._update_offset_max()
+        if at_bottom:
+            self.go_bottom()
+        elif same:
+            self.go_line_offset(min(self._offset, self._size))
+        else:
+            self.go_top()
+
+    @property
+    def encoding(self) -> str:
+        """The encoding of the file, detected from its byte order mark
+
+        UTF-8 is assumed when there is none. Setting it to None goes
+        back to the detected one.
+        """
+        return self.decoder.encoding
+
+    @encoding.setter
+    def encoding(self, encoding: Optional[str]) -> None:
+        self._encoding = encoding
+        self.decoder = Decoder(encoding or detect_encoding(self._mm))
+        self._layout_changed()
 
     @property
     def offset(self) -> int:
-        return self._mm.tell()
+        return self._offset
 
     @offset.setter
     def offset(self, offset: int) -> None:
         if offset < 0:
             offset = 0
-        if offset >= self._offset_max:
-            self._offset = self._offset_max
+        if self._height and offset > self._offset_max:
+            offset = self._offset_max
         assert (
-            offset == 0 or self.get_char(offset - 1) == b"\n"
+            self._wrap
+            or self._hexdump
+            or offset in (0, self._size)
+            or self.get_char(offset - 1) == b"\n"
         ), f"offset {offset} char {self.get_char(offset - 1)!r}"
-        self._mm.seek(offset)
+        self._offset = offset
         self.update_lines()
 
+    @property
+    def size(self) -> int:
+        return self._size
+
     @property
     def height(self) -> int:
         return self._height
@@ -61,54 +307,349 @@ class HugeFileViewerUIControl(UIControl):
     def height(self, height: int) -> None:
         if height == self._height:
             return
-        with self.tmp_offset():
-            # Update self._offset_max:
-            offset = self._size - 1
-            for i in range(height):
-                # Look at the last 2-3 pages:
-                offset = self.find_prev_newline(offset)
-                if offset == -1:
-                    self._offset_max = 0
-                    break
-                self._offset_max = offset + 1
         self._height = height
+        self._update_offset_max()
+        if self._offset > self._offset_max:
+            self._offset = self._offset_max
         self.update_lines()
 
+    @property
+    def width(self) -> int:
+        return self._width
+
+    @width.setter
+    def width(self, width: int) -> None:
+        if width == self._width:
+            return
+        self._width = width
+        self._layout_changed()
+
+    @property
+    def column(self) -> int:
+        """Number of bytes hidden at the left of each line"""
+        return self._column
+
+    @column.setter
+    def column(self, column: int) -> None:
+        column = max(0, column)
+        if column == self._column:
+            return
+        self._column = column
+        self.line_cache.clear()
+        self.update_lines()
+
+    @property
+    def wrap(self) -> bool:
+        """Whether long lines are split into rows of width bytes"""
+        return self._wrap
+
+    @wrap.setter
+    def wrap(self, wrap: bool) -> None:
+        if wrap == self._wrap:
+            return
+        self._wrap = wrap
+        self._column = 0
+        self._layout_changed()
+
+    @property
+    def hexdump(self) -> bool:
+        """Whether the file is shown as a hex dump, hex_width bytes per row
+
+        The rows of the dump are found with arithmetic alone, without
+        looking for newlines, and show the bytes in hex and in ASCII;
+        the offset of each row is shown by the OffsetMargin.
+        """
+        return self._hexdump
+
+    @hexdump.setter
+    def hexdump(self, hexdump: bool) -> None:
+        if hexdump == self._hexdump:
+            return
+        self._hexdump = hexdump
+        self._column = 0
+        self._layout_changed()
+
+    @property
+    def row_width(self) -> int:
+        """Maximum number of bytes shown in a row"""
+        if self._width <= 0:
+            return self.max_line_width
+        return min(self._width, self.max_line_width)
+
+    @property
+    def filtered(self) -> bool:
+        """Whether some of the lines are hidden, see the regex control"""
+        return False
+
+    def _layout_changed(self) -> None:
+        self.line_cache.clear()
+        self._update_offset_max()
+        self._offset = min(self.row_start(self._offset), self._offset_max)
+        self.update_lines()
+
+    def _update_offset_max(self) -> None:
+        self._offset_max = self.offset_up(self._height, self._size)
+
+    @property
+    def visible_lines(self) -> int:
+        return len(self._lines)
+
+    @property
+    def visible_rows(self) -> List[int]:
+        """Offsets where the visible rows start"""
+        return self._rows
+
     @contextmanager
     def tmp_offset(self) -> Generator[None, None, None]:
-        offset = self._mm.tell()
+        offset = self._offset
         try:
             yield
         finally:
-            self._mm.seek(offset)
+            self._offset = offset
+
+    def start_line_index(
+        self,
+        cache: Optional[str] = None,
+        on_update: Optional[Callable[[], None]] = None,
+    ) -> Optional[threading.Thread]:
+        """Build the line index in a background thread
+
+        If cache is given, the index is loaded from there when it still
+        matches the file, and saved there once it is complete. Returns
+        the thread building the index, or None if it was loaded.
+        """
+        self.stop_line_index()
+        self._line_index_on_update = on_update
+        if cache is not None:
+            self.line_index = LineIndex.load(self._mm, cache, self._stat)
+            if self.line_index is not None:
+                return None
+        self.line_index = LineIndex(self._mm)
+        self._line_index_thread = self._build_line_index(
+            self.line_index, cache, on_update
+        )
+        return self._line_index_thread
+
+    def stop_line_index(self) -> None:
+        """Stop building the line index in the background, if it is"""
+        self._line_index_cancel.set()
+        self._line_index_cancel = threading.Event()
+
+    def _build_line_index(
+        self,
+        line_index: LineIndex,
+        cache: Optional[str] = None,
+        on_update: Optional[Callable[[], None]] = None,
+    ) -> threading.Thread:
+        cancel = self._line_index_cancel
+
+        def run() -> None:
+            line_index.build(cancel=cancel, on_update=on_update)
+            if cache is not None and line_index.complete:
+                try:
+                    line_index.save(cache, self._stat)
+                except OSError:
+                    pass
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        return thread
+
+    def line_number(self, offset: Optional[int] = None) -> Optional[int]:
+        """Return the 1-based line number of offset, if indexed"""
+        if self.line_index is None:
+            return None
+        lineno = self.line_index.line_number(self.offset if offset is None else offset)
+        return None if lineno is None else lineno + 1
+
+    @property
+    def line_count(self) -> Optional[int]:
+        if self.line_index is None:
+            return None
+        count = self.line_index.line_count
+        if count is not None and self._text_size < self._size:
+            # The index counts the rest of the last newline as a line.
+            count -= 1
+        return count
+
+    @property
+    def _text_size(self) -> int:
+        """Size of the file without the rest of its last newline
+
+        That is the byte after the final 0x0A in UTF-16-LE, which is
+        not a row of its own.
+        """
+        tail = self.decoder.newline_tail
+        end = self._size - tail
+        if tail and end > 0 and self._mm[end - 1 : end] == b"\n":
+            return end
+        return self._size
 
     def find_prev_newline(self, offset: int) -> int:
-        start_offset = (self._size % mmap.PAGESIZE) - 2 * mmap.PAGESIZE
-        return self._mm.rfind(b"\n", max(0, start_offset), offset)
+        """Return the offset of the last newline before offset, or -1
+
+        Looks back from offset one window at a time, starting with a
+        page and doubling, so that the cost depends on the length of
+        the line and not on the position in the file.
+        """
+        end = min(offset, self._size)
+        window = mmap.PAGESIZE
+        while end > 0:
+            start = max(0, end - window)
+            newline = self._mm.rfind(b"\n", start, end)
+            if newline != -1:
+                return newline
+            end = start
+            window = min(2 * window, PREV_NEWLINE_WINDOW)
+        return -1
+
+    def row_start(self, offset: int) -> int:
+        """Return the start of the row that contains offset
+
+        Rows are the lines, or in wrap mode the row_width slices of
+        each line, the last one including the newline, or in hexdump
+        mode the hex_width slices of the file.
+        """
+        if self._hexdump:
+            offset = min(offset, self._size)
+            return offset - offset % self.hex_width
+        text_size = self._text_size
+        if text_size <= offset < self._size:
+            offset = text_size - 1
+        line_start = self.find_prev_newline(offset) + 1
+        if not self._wrap:
+            return line_start
+        width = self.row_width
+        start = line_start + (offset - line_start) // width * width
+        if start > line_start and self.get_char(start) == b"\n":
+            # The newline ends the previous row.
+            start -= width
+        return start
+
+    def row_end(self, offset: int) -> int:
+        """Return the start of the row after the one that starts at offset"""
+        if self._hexdump:
+            return min(self.row_start(offset) + self.hex_width, self._size)
+        if self._wrap:
+            width = self.row_width
+            newline = self._mm.find(b"\n", offset, offset + width + 1)
+            if newline == -1:
+                end = offset + width
+                return self._size if end >= self._text_size else end
+        else:
+            newline = self._mm.find(b"\n", offset)
+        if newline == -1 or newline + 1 >= self._text_size:
+            return self._size
+        return newline + 1
+
+    def row_bytes(self, start: int, end: int) -> bytes:
+        """Return the part of the row from start to end that is shown
+
+        At most row_width bytes are read, starting column bytes into the
+        line when not wrapping. The slice is moved to whole characters
+        of the encoding: a character cut at either edge is shown where
+        it starts. The bytes of a hexdump row are returned as they are.
+        """
+        if self._hexdump:
+            with self._timer("read"):
+                data = self._mm[start:end]
+            if self.stats is not None:
+                self.stats.count("bytes_read", len(data))
+            return data
+        if not self._wrap:
+            start = min(start + self._column, end)
+            end = min(end, start + self.row_width)
+        decoder = self.decoder
+        start = decoder.char_start(self._mm, start)
+        end = decoder.char_start(self._mm, end)
+        if self.stats is None:
+            return decoder.rstrip(self._mm[start:end])
+        with self.stats.timer("read"):
+            data = self._mm[start:end]
+        self.stats.count("bytes_read", len(data))
+        return decoder.rstrip(data)
+
+    def line_spans(
+        self, offset: Optional[int] = None, count: Optional[int] = None
+    ) -> Iterator[Tuple[int, int]]:
+        """Yield the start and next-row offsets of count rows"""
+        offset = self.offset if offset is None else offset
+        for _ in range(self._height if count is None else count):
+            if offset >= self._size:
+                break
+            end = self.row_end(offset)
+            yield offset, end
+            offset = end
 
     def get_lines(self) -> Iterator[bytes]:
-        with self.tmp_offset():
-            for _ in range(self._height):
-                line = self._mm.readline()
-                if not line:
-                    break
-                yield line.rstrip()
+        for start, end in self.line_spans():
+            yield self.row_bytes(start, end)
+
+    def style_lines(self, lines: List[bytes]) -> List[StyleAndTextTuples]:
+        """Return the styled fragments of consecutive lines"""
+        if self._hexdump:
+            return [hex_row(line, self.hex_width) for line in lines]
+        return [[("", text)] for text in self.decoder.decode_lines(lines)]
 
     def get_lines_style(self) -> List[StyleAndTextTuples]:
-        return [
-            [("", line.decode("utf-8", errors="replace"))] for line in self.get_lines()
-        ]
+        return self.style_lines(list(self.get_lines()))
+
+    def prefetch_lines(self, offset: Optional[int] = None) -> None:
+        """Style a page above, the viewport and a page below into the cache
+
+        The page below is stored before the page above, and the
+        viewport last, so that the viewport is the last to be evicted
+        when the budget is small.
+        """
+        offset = self.offset if offset is None else offset
+        start = self.offset_up(self._height, offset)
+        spans = list(self.line_spans(start, 3 * self._height))
+        rows = [self.row_bytes(a, b) for a, b in spans]
+        with self._timer("style_lines"):
+            lines = self.style_lines(rows)
+        above = sum(1 for a, _ in spans if a < offset)
+        order = list(range(above + self._height, len(spans)))
+        order += list(range(above))
+        order += list(range(above, min(above + self._height, len(spans))))
+        for i in order:
+            self.line_cache.put(spans[i][0], spans[i][1], lines[i])
+
+    def get_cached_lines(self) -> List[StyleAndTextTuples]:
+        """Return the viewport lines, styling only the ones not cached"""
+        lines: List[StyleAndTextTuples] = []
+        self._rows = []
+        offset = self.offset
+        prefetched = False
+        while len(lines) < self._height and offset < self._size:
+            entry = self.line_cache.get(offset)
+            if entry is None and not prefetched:
+                self.prefetch_lines()
+                prefetched = True
+                entry = self.line_cache.get(offset)
+            if entry is None:
+                # Budget too small for the line, style it without caching:
+                next_offset = self.row_end(offset)
+                line = self.row_bytes(offset, next_offset)
+                with self._timer("style_lines"):
+                    entry = (next_offset, self.style_lines([line])[0])
+            self._rows.append(offset)
+            offset, line_style = entry
+            lines.append(line_style)
+        return lines
 
     def update_lines(self) -> None:
-        self._lines = self.get_lines_style()
-        if self.height > len(self._lines) and self.offset < self._offset_max:
-            self.go_up(self._height - len(self._lines))
+        # Read the viewport and around it in one go, before faulting:
+        start = max(0, self._offset - VIEW_READAHEAD)
+        madvise(self._mm, "WILLNEED", start, self._offset + VIEW_READAHEAD - start)
+        with self._timer("update_lines"):
+            self._lines = self.get_cached_lines()
+            if self.height > len(self._lines) and self.offset < self._offset_max:
+                self._offset = self.offset_up(self._height - len(self._lines))
+                self._lines = self.get_cached_lines()
 
     def get_char(self, offset: Optional[int] = None) -> bytes:
-        with self.tmp_offset():
-            if offset is not None:
-                self._mm.seek(offset)
-            return self._mm.read(1)
+        offset = self._offset if offset is None else offset
+        return self._mm[offset : offset + 1]
 
     # Implement UIControl methods:
 
@@ -118,6 +659,8 @@ class HugeFileViewerUIControl(UIControl):
         return self._lines[lineno]
 
     def create_content(self, width: int, height: int) -> UIContent:
+        self.check_size()
+        self.width = width
         self.height = height
         return UIContent(
             get_line=self._get_line,
@@ -137,8 +680,24 @@ class HugeFileViewerUIControl(UIControl):
         kb.add("down")(lambda _: self.go_down())
         kb.add("pageup")(lambda _: self.go_pageup())
         kb.add("pagedown")(lambda _: self.go_pagedown())
+        kb.add("left")(lambda _: self.scroll_left())
+        kb.add("right")(lambda _: self.scroll_right())
+        kb.add("w")(lambda _: setattr(self, "wrap", not self.wrap))
+        kb.add("x")(lambda _: setattr(self, "hexdump", not self.hexdump))
+        # A number followed by % goes to that percentage, like in less:
+        for digit in "0123456789":
+            kb.add(digit)(self._percent_digit)
+        kb.add("%")(lambda _: self._go_percent_prefix())
         return kb
 
+    def _percent_digit(self, event: E) -> None:
+        self._percent_prefix = (self._percent_prefix + event.data)[-3:]
+
+    def _go_percent_prefix(self) -> None:
+        if self._percent_prefix:
+            self.go_percent(int(self._percent_prefix))
+        self._percent_prefix = ""
+
     def is_focusable(self) -> bool:
         return True
 
@@ -154,44 +713,203 @@ class HugeFileViewerUIControl(UIControl):
     # Exported utility functions:
 
     def go_line_offset(self, offset: int) -> None:
-        if offset == 0 or self.get_char(offset - 1) == b"\n":
-            self.offset = offset
-            return
-        offset = self.find_prev_newline(offset)
-        if offset != -1:
-            self.offset = offset + 1
+        self.offset = self.row_start(offset)
+
+    def go_line(self, lineno: int) -> bool:
+        """Go to the 1-based line lineno, as reported by grep -n
+
+        Past the part of the file that the line index covers, lines are
+        counted for GO_LINE_SCAN bytes at most; when lineno is farther,
+        its offset is estimated from the lines counted so far instead
+        of blocking on the rest of the file. Returns whether the line
+        gone to is lineno and not an estimate.
+        """
+        line_index = self.line_index or LineIndex(self._mm)
+        offset = line_index.line_offset(max(0, lineno - 1), GO_LINE_SCAN)
+        if offset is None:
+            self.go_line_offset(line_index.estimate_offset(max(0, lineno - 1)))
+            return False
+        if offset == -1:
+            self.go_bottom()
+        else:
+            self.go_line_offset(offset)
+        return True
+
+    def go_time(self, when: Union[datetime, str]) -> bool:
+        """Go to the first line logged at when or later
+
+        The file must be sorted by time; see Timestamps.bisect. when can
+        be text in one of timestamp_formats; a time without a date is
+        taken as the day of the first line, and the year or the date is
+        dropped when the lines don't have it. Returns whether such a
+        line was found, or goes to the bottom.
+        """
+        timestamps = Timestamps(self._mm, self.timestamp_formats)
+        if isinstance(when, str):
+            parsed = self.parse_time(when, timestamps)
+            if parsed is None:
+                return False
+            when = parsed
+        with self._timer("go_time"):
+            offset = timestamps.bisect(when)
+        if offset >= self._size:
+            self.go_bottom()
+            return False
+        self.go_line_offset(offset)
+        return True
+
+    def parse_time(
+        self, text: str, timestamps: Optional[Timestamps] = None
+    ) -> Optional[datetime]:
+        """Parse text with the first of timestamp_formats that fits it"""
+        timestamps = timestamps or Timestamps(self._mm, self.timestamp_formats)
+        for fmt in self.timestamp_formats:
+            try:
+                when = datetime.strptime(text, fmt.fmt)
+            except ValueError:
+                continue
+            return timestamps.complete(when.replace(tzinfo=None), fmt)
+        return None
+
+    def set_mark(self) -> None:
+        """Mark the row at the top of the viewport, see marked_range"""
+        self.mark = self.offset
+
+    def marked_range(self) -> Optional[Tuple[int, int]]:
+        """Return the byte range from the mark to the viewport, if marked
+
+        The range starts at the mark or at the top of the viewport,
+        whichever is first, and ends with the line of the mark or the
+        last line shown, whichever is last.
+        """
+        if self.mark is None:
+            return None
+        mark = min(self.mark, self._size)
+        last = max([mark] + [start for start, _ in self.line_spans()])
+        if self._hexdump:
+            return min(mark, self.offset), self.row_end(last)
+        newline = self._mm.find(b"\n", last)
+        end = self._size if newline == -1 else newline + 1
+        return min(mark, self.offset), end
+
+    def export_range(
+        self,
+        out: str,
+        start: int,
+        end: int,
+        progress: Optional[Callable[[int], None]] = None,
+        cancel: Optional[threading.Event] = None,
+    ) -> int:
+        """Write the bytes [start, end) of the file to the new file out
+
+        Plain files are copied by the kernel, without going through this
+        process; see copy_range. Decompressed files and stdin read into
+        memory are written from the buffer. Returns the bytes written;
+        out is removed if the export is cancelled or fails.
+        """
+        end = min(end, self._size)
+        source = self._open_plain()
+        try:
+            if source is None:
+                return export_to(
+                    out,
+                    lambda dst: write_range(
+                        self._mm, dst, start, end, progress=progress, cancel=cancel
+                    ),
+                )
+            return export_to(
+                out,
+                lambda dst: copy_range(
+                    source.fileno(),
+                    dst.fileno(),
+                    start,
+                    end,
+                    progress=progress,
+                    cancel=cancel,
+                ),
+            )
+        finally:
+            if source is not None:
+                source.close()
+
+    def _open_plain(self) -> Optional[io.BufferedReader]:
+        """Open the file again if the buffer has its bytes as they are"""
+        if self.path is None or not isinstance(
+            self._mm, (mmap.mmap, WindowedMap, PreadSource)
+        ):
+            return None
+        try:
+            fd = open(self.path, "rb")
+        except OSError:
+            return None
+        stat = os.fstat(fd.fileno())
+        if (stat.st_dev, stat.st_ino) != (self._stat.st_dev, self._stat.st_ino):
+            # Replaced since it was mapped.
+            fd.close()
+            return None
+        return fd
+
+    def go_percent(self, percent: float) -> None:
+        """Go to the line at percent of the file size"""
+        percent = min(max(percent, 0), 100)
+        self.go_line_offset(int(self._size * percent / 100))
 
     def go_top(self) -> None:
-        self.offset = 0
-        self.update_lines()
+        self.go_line_offset(0)
 
     def go_bottom(self) -> None:
         self.offset = self._offset_max
-        self.update_lines()
 
-    def go_up(self, lines: int = 1) -> None:
-        offset = self.offset
-        for i in range(lines):
+    def offset_up(self, lines: int = 1, offset: Optional[int] = None) -> int:
+        """Return the offset of the line that is lines above offset
+
+        Only the target is computed, nothing is rendered.
+        """
+        offset = self.offset if offset is None else offset
+        if self._hexdump:
+            if offset == 0 or lines <= 0:
+                return offset
+            up = self.row_start(offset - 1) - (lines - 1) * self.hex_width
+            return max(0, up)
+        for _ in range(lines):
             if offset == 0:
                 break
-            offset = self.find_prev_newline(offset - 1)
-            if offset == -1:
-                self.offset = 0
+            if (
+                self._wrap
+                and self.get_char(offset - 1) != b"\n"
+                and offset <= self._text_size
+            ):
+                # Inside a wrapped line, without looking for its start:
+                up = max(0, offset - self.row_width)
+            else:
+                up = self.row_start(offset - 1)
+            if up >= offset:
+                # No row above, all the lines before are filtered out.
                 break
-            self.offset = offset + 1  # at the start of the next line
-        self.update_lines()
+            offset = up
+        return offset
 
-    def go_down(self, lines: int = 1) -> None:
-        offset = self.offset
+    def offset_down(self, lines: int = 1, offset: Optional[int] = None) -> int:
+        """Return the offset of the line that is lines below offset
+
+        Only the target is computed, nothing is rendered.
+        """
+        offset = self.offset if offset is None else offset
+        if self._hexdump:
+            if offset >= self._offset_max or lines <= 0:
+                return offset
+            return min(offset + lines * self.hex_width, self._offset_max)
         for _ in range(lines):
-            if self.offset >= self._offset_max:
+            if offset >= self._offset_max:
                 break
-            offset = self._mm.find(b"\n", offset)
-            if offset == -1:
-                break
-            offset += 1
-            self.offset = offset
-        self.update_lines()
+            offset = self.row_end(offset)
+        return offset
+
+    def go_up(self, lines: int = 1) -> None:
+        self.offset = self.offset_up(lines)
+
+    def go_down(self, lines: int = 1) -> None:
+        self.offset = self.offset_down(lines)
 
     def go_pageup(self) -> None:
         self.go_up(self.height)
@@ -199,89 +917,504 @@ class HugeFileViewerUIControl(UIControl):
     def go_pagedown(self) -> None:
         self.go_down(self.height)
 
+    def scroll_left(self, columns: Optional[int] = None) -> None:
+        self.column -= columns or max(1, self._width // 2)
 
-OffsetEvent = Enum("OffsetEvent", ["RE_START", "RE_END", "NEWLINE", "END"])
+    def scroll_right(self, columns: Optional[int] = None) -> None:
+        self.column += columns or max(1, self._width // 2)
 
 
 class HugeFileViewerRegexUIControl(HugeFileViewerUIControl):
     def __init__(self, fd: io.BufferedReader):
         self.regex: Optional[re.Pattern[bytes]] = None
         self.regex_ok: Optional[re.Pattern[bytes]] = None
+        self.search_chunk_size = CHUNK_SIZE
+        self.search_max_span = MAX_MATCH_SPAN
+        # Processes that scan the file in parallel in re_search:
+        self.search_workers = 1
+        self.search_range_size = RANGE_SIZE
+        self.max_line_matches = MAX_LINE_MATCHES
+        self.match_index: Optional[MatchIndex] = None
+        self._match_index_cancel: Optional[threading.Event] = None
+        self._match_index_on_update: Optional[Callable[[], None]] = None
+        self.last_match: Optional[Tuple[int, int]] = None
+        self.matched_lines: Optional[MatchedLines] = None
+        # Scanned at most for each matching line looked for when filtered:
+        self.filter_max_scan = MAX_SCAN
+        self._filtered = False
+        self.highlights: List[StyledRegex] = []
+        self._highlighter: Optional[Highlighter] = None
         HugeFileViewerUIControl.__init__(self, fd)
 
+    def _switch_buffer(
+        self, buf: FileBuffer, same: bool, grew: bool, keep_bottom: bool = True
+    ) -> None:
+        # Appending doesn't change the bytes there were, so what was
+        # found in them is kept; see the grow methods.
+        index = self.match_index
+        if grew and index is not None and (index.complete or index.truncated):
+            complete = index.complete
+            index.grow(buf, self.search_max_span)
+            if complete and not index.complete:
+                self._build_match_index(index)
+        else:
+            self.drop_match_index()
+        if grew and self.matched_lines is not None:
+            self.matched_lines.grow(buf)
+        else:
+            self.matched_lines = None
+        HugeFileViewerUIControl._switch_buffer(self, buf, same, grew, keep_bottom)
+
+    @property
+    def filtered(self) -> bool:
+        """Whether only the lines that match the regex are shown, like grep
+
+        Lines are not filtered in hexdump mode. With a sparse regex, the
+        lines shown may be approximate, see MatchedLines.
+        """
+        return self._filtered and self.regex is not None and not self._hexdump
+
+    @filtered.setter
+    def filtered(self, filtered: bool) -> None:
+        if filtered == self._filtered:
+            return
+        self._filtered = filtered
+        self._layout_changed()
+
+    def _matched_lines(self) -> Optional[MatchedLines]:
+        """Return the matching lines when filtered, creating them if needed"""
+        if self.regex is None or not self.filtered:
+            return None
+        if self.matched_lines is None or self.matched_lines.regex is not self.regex:
+            self.matched_lines = MatchedLines(
+                self._mm,
+                self.regex,
+                chunk_size=self.search_chunk_size,
+                max_span=self.search_max_span,
+                max_scan=self.filter_max_scan,
+            )
+        return self.matched_lines
+
+    def row_start(self, offset: int) -> int:
+        """Return the start of the row that contains offset
+
+        When filtered, rows of lines that don't match are skipped: the
+        last row of the previous matching line is returned instead, or
+        the next matching line if there is none before, or the size if
+        there are no matching lines.
+        """
+        start = HugeFileViewerUIControl.row_start(self, offset)
+        lines = self._matched_lines()
+        if lines is None:
+            return start
+        line_start = self.find_prev_newline(start) + 1
+        if lines.matches(line_start):
+            return start
+        prev = lines.prev_line(line_start)
+        if prev == -1:
+            start = lines.next_line(line_start)
+            return self._size if start == -1 else start
+        newline = self._mm.find(b"\n", prev)
+        return HugeFileViewerUIControl.row_start(
+            self, self._size - 1 if newline == -1 else newline
+        )
+
+    def row_end(self, offset: int) -> int:
+        """Return the start of the row shown after the one at offset"""
+        end = HugeFileViewerUIControl.row_end(self, offset)
+        lines = self._matched_lines()
+        if lines is None or end >= self._size or self.get_char(end - 1) != b"\n":
+            return end
+        start = lines.next_line(end)
+        return self._size if start == -1 else start
+
+    def row_bytes(self, start: int, end: int) -> bytes:
+        if self.filtered:
+            # end is the next matching line, the row ends at the newline:
+            newline = self._mm.find(b"\n", start, end)
+            if newline != -1:
+                end = newline + 1
+        return HugeFileViewerUIControl.row_bytes(self, start, end)
+
     def re_search(
-        self, regex: re.Pattern[bytes], offset: Optional[int] = None
-    ) -> Optional[re.Match[bytes]]:
-        offset = offset or 0
-        with self.tmp_offset():
-            return regex.search(bytes(self._mm), offset)
+        self,
+        regex: re.Pattern[bytes],
+        offset: Optional[int] = None,
+        progress: Optional[Callable[[int], None]] = None,
+        cancel: Optional[threading.Event] = None,
+    ) -> Optional[Tuple[int, int]]:
+        """Return the span of the first match of regex from offset
+
+        The match index is used instead of scanning when it covers
+        offset. With search_workers > 1, a mapped plain file with a name
+        that spans several ranges after offset is scanned by that many
+        processes; compressed files and the ones read with pread are
+        scanned here, as each worker would decompress or read them
+        again.
+        """
+        with self._timer("search"):
+            offset = offset or 0
+            index = self.match_index
+            if index is not None and index.regex is regex:
+                start = index.next_start(offset)
+                if start == -1:
+                    return None
+                if start is not None:
+                    offset = start
+            if (
+                self.search_workers > 1
+                and self.path is not None
+                and isinstance(self._mm, (mmap.mmap, WindowedMap))
+                and self._size - offset > self.search_range_size
+            ):
+                return parallel_search(
+                    self.path,
+                    regex,
+                    offset,
+                    self._size,
+                    max_workers=self.search_workers,
+                    range_size=self.search_range_size,
+                    max_span=self.search_max_span,
+                    progress=progress,
+                    cancel=cancel,
+                )
+            return chunked_search(
+                self._mm,
+                regex,
+                offset,
+                chunk_size=self.search_chunk_size,
+                max_span=self.search_max_span,
+                progress=progress,
+                cancel=cancel,
+            )
+
+    def re_search_backward(
+        self,
+        regex: re.Pattern[bytes],
+        offset: Optional[int] = None,
+        progress: Optional[Callable[[int], None]] = None,
+        cancel: Optional[threading.Event] = None,
+    ) -> Optional[Tuple[int, int]]:
+        """Return the span of the last match of regex before offset"""
+        with self._timer("search"):
+            index = self.match_index
+            if offset is not None and index is not None and index.regex is regex:
+                start = index.prev_start(offset)
+                if start == -1:
+                    return None
+                if start is not None:
+                    return self.re_search(regex, start)
+            return chunked_search_backward(
+                self._mm,
+                regex,
+                offset,
+                chunk_size=self.search_chunk_size,
+                max_span=self.search_max_span,
+                progress=progress,
+                cancel=cancel,
+            )
 
     def use_regex(self, regex: Optional[re.Pattern[bytes]]) -> None:
+        if regex is not self.regex:
+            self.drop_match_index()
+            self.last_match = None
         self.regex = regex
+        if self._filtered:
+            self._layout_changed()
+            return
+        self.line_cache.clear()
         self.update_lines()
 
-    def search_down(self) -> None:
+    def export_matching_lines(
+        self,
+        out: str,
+        progress: Optional[Callable[[int], None]] = None,
+        cancel: Optional[threading.Event] = None,
+    ) -> int:
+        """Write the lines that match the regex to the new file out, like grep
+
+        Returns the number of lines written; out is removed if the
+        export is cancelled or fails. See write_matching_lines.
+        """
+        regex = self.regex
+        if regex is None:
+            raise ValueError("no regex to export the matching lines of")
+        return export_to(
+            out,
+            lambda dst: write_matching_lines(
+                self._mm,
+                regex,
+                dst,
+                progress=progress,
+                cancel=cancel,
+                chunk_size=self.search_chunk_size,
+                max_span=self.search_max_span,
+            ),
+        )
+
+    def add_highlight(self, regex: re.Pattern[bytes], style: str) -> None:
+        """Highlight the matches of regex with style, besides the regex's
+
+        The regexes are matched together, see Highlighter: where matches
+        overlap, the one that starts first is styled, even when it is a
+        highlight and the other one a match of the regex searched. Only
+        matches that start at the same position go by precedence: the
+        regex searched first, then the highlights in the order they were
+        added.
+        """
+        self.highlights.append((regex, style))
+        self.line_cache.clear()
+        self.update_lines()
+
+    def clear_highlights(self) -> None:
+        self.highlights = []
+        self.line_cache.clear()
+        self.update_lines()
+
+    def _get_highlighter(self, patterns: List[StyledRegex]) -> Highlighter:
+        highlighter = self._highlighter
+        if highlighter is None or highlighter.patterns != patterns:
+            highlighter = self._highlighter = Highlighter(patterns)
+        return highlighter
+
+    def start_match_index(
+        self, on_update: Optional[Callable[[], None]] = None
+    ) -> Optional[threading.Thread]:
+        """Index the matches of the regex in a background thread
+
+        Does nothing if there is no regex or if it is already indexed.
+        Returns the thread building the index.
+        """
         if self.regex is None:
-            return
-        with self.tmp_offset():
-            self.go_pagedown()
-            offset = self.offset
-        m = self.re_search(self.regex, offset)
-        if m:
-            self.go_line_offset(m.end())
+            return None
+        if self.match_index is not None and self.match_index.regex is self.regex:
+            return None
+        self.drop_match_index()
+        self._match_index_on_update = on_update
+        self.match_index = MatchIndex(self._mm, self.regex)
+        return self._build_match_index(self.match_index)
+
+    def _build_match_index(self, match_index: MatchIndex) -> threading.Thread:
+        """Build match_index in a background thread, until it is dropped"""
+        cancel = threading.Event()
+        self._match_index_cancel = cancel
+        thread = threading.Thread(
+            target=match_index.build,
+            kwargs=dict(
+                cancel=cancel,
+                on_update=self._match_index_on_update,
+                chunk_size=self.search_chunk_size,
+                max_span=self.search_max_span,
+            ),
+            daemon=True,
+        )
+        thread.start()
+        return thread
+
+    def drop_match_index(self) -> None:
+        if self._match_index_cancel is not None:
+            self._match_index_cancel.set()
+        self._match_index_cancel = None
+        self.match_index = None
+
+    def match_number(self) -> Tuple[Optional[int], Optional[int]]:
+        """Return the number of the last match found and the match count
+
+        Either can be None while the match index is not complete.
+        """
+        index = self.match_index
+        if index is None or index.regex is not self.regex:
+            return None, None
+        number = None
+        if self.last_match is not None:
+            number = index.number(self.last_match[0])
+        return number, index.count
+
+    def search_down_offset(self) -> int:
+        """Return the offset where search_down starts looking"""
+        return self.offset_down(self.height)
+
+    def search_up_offset(self) -> int:
+        """Return the offset where search_up stops looking
+
+        go_match leaves the line of the match just above the viewport,
+        so that line is skipped too, as well as the rest of the last
+        match when it spans several lines.
+        """
+        offset = self.offset_up(1)
+        if self.last_match is not None:
+            start, end = self.last_match
+            if start < offset <= end:
+                return start
+        return offset
+
+    def go_match(self, span: Optional[Tuple[int, int]]) -> None:
+        if span:
+            self.last_match = span
+            self.go_line_offset(span[1])
             self.go_down(1)
         else:
             self.update_lines()
 
-    def get_lines_style(self) -> List[StyleAndTextTuples]:
-        contents = b"\n".join(self.get_lines())
-        matches = []
-        if self.regex is not None:
-            matches = list(self.regex.finditer(contents))
-        if matches:
-            self.regex_ok = self.regex
-            re_style = "class:match"
-        elif not matches and self.regex_ok is not None:
-            matches = list(self.regex_ok.finditer(contents))
-            re_style = "class:oldmatch"
-        else:
-            re_style = ""
-        offsetList = []
-        for m in matches:
-            offsetList.append((m.start(), OffsetEvent.RE_START))
-            offsetList.append((m.end(), OffsetEvent.RE_END))
-        o = 0
-        while (newline := contents.find(b"\n", o)) != -1:
-            offsetList.append((newline, OffsetEvent.NEWLINE))
-            o = newline + 1
-        offsetList.append((len(contents), OffsetEvent.END))
-        offsetList.sort(key=lambda x: x[0])
-        offsets: dict[int, set[OffsetEvent]] = {}
-        for offset, what in offsetList:
-            events = offsets.setdefault(offset, set())
-            events.add(what)
-            if OffsetEvent.RE_START in events and OffsetEvent.RE_END in events:
-                events.remove(OffsetEvent.RE_START)
-                events.remove(OffsetEvent.RE_END)
-            if not events:
-                offsets.pop(offset)
-        linestyle = []
-        current: StyleAndTextTuples = []
-        styles: set[str] = set()
-        o_curr = 0
-        for o_next, events in offsets.items():
-            if o_next > o_curr:
-                current.append(
-                    (" ".join(styles), contents[o_curr:o_next].decode("utf-8"))
-                )
-            if OffsetEvent.RE_START in events:
-                styles.add(re_style)
-                o_curr = o_next
-            if OffsetEvent.RE_END in events:
-                styles.remove(re_style)
-                o_curr = o_next
-            if OffsetEvent.NEWLINE in events or OffsetEvent.END in events:
-                linestyle.append(current)
-                current = []
-                o_curr = o_next + 1
+    def search_down(self) -> None:
+        if self.regex is None:
+            return
+        self.go_match(self.re_search(self.regex, self.search_down_offset()))
+
+    def search_up(self) -> None:
+        if self.regex is None:
+            return
+        self.go_match(self.re_search_backward(self.regex, self.search_up_offset()))
+
+    def style_lines(self, lines: List[bytes]) -> List[StyleAndTextTuples]:
+        """Highlight the matches of the regex and of the highlights in lines
+
+        The matches of all the patterns are found in a single pass by a
+        Highlighter. They are sorted and don't overlap, and are walked
+        together with the lines in a single pass. Only the first
+        max_line_matches matches of each line are highlighted; the
+        search restarts at the next line after that. The highlighted
+        parts are decoded by the decoder, which moves their edges to
+        character boundaries.
+        """
+        if self._hexdump:
+            return self._style_hex_rows(lines)
+        contents = b"\n".join(lines)
+        highlighter, matches = self._page_matches(contents)
+        m = next(matches, None)
+        decoder = self.decoder
+        text = decoder.page(contents)
+        limit = self.max_line_matches
+        linestyle: List[StyleAndTextTuples] = []
+        line_start = 0
+        for line in lines:
+            line_end = line_start + len(line)
+            if m is None or m[0] >= line_end:
+                linestyle.append([("", decoder.decode(line))] if line else [])
+                line_start = line_end + 1
+                continue
+            current: StyleAndTextTuples = []
+            # Adjacent matches of the same style are merged into the
+            # pending [hl_start, hl_end), highlighted with hl_style:
+            hl_start = hl_end = line_start
+            hl_style = ""
+            count = 0
+            while m is not None:
+                start, end, style = m
+                if start >= line_end:
+                    break
+                if count == limit:
+                    assert highlighter is not None
+                    matches = highlighter.spans(contents, line_end + 1)
+                    m = next(matches, None)
+                    break
+                if start < line_start:
+                    start = line_start
+                if start < end:
+                    if start > hl_end or style != hl_style:
+                        if hl_start < hl_end:
+                            current.append(
+                                (hl_style, text(line_start, line_end, hl_start, hl_end))
+                            )
+                        if start > hl_end:
+                            current.append(
+                                ("", text(line_start, line_end, hl_end, start))
+                            )
+                        hl_start = start
+                        hl_style = style
+                    if end > line_end:
+                        # The match continues in the next line.
+                        hl_end = line_end
+                        break
+                    hl_end = end
+                    count += 1
+                m = next(matches, None)
+            if hl_start < hl_end:
+                current.append((hl_style, text(line_start, line_end, hl_start, hl_end)))
+            if hl_end < line_end:
+                current.append(("", text(line_start, line_end, hl_end, line_end)))
+            linestyle.append(current)
+            line_start = line_end + 1
         return linestyle
+
+    def _page_matches(
+        self, contents: bytes
+    ) -> Tuple[Optional[Highlighter], Iterator[Tuple[int, int, str]]]:
+        """Return the highlighter of contents, and the spans of its matches
+
+        The regex is highlighted as a match once it has been found, see
+        _regex_found, or else the last regex that was found as an old
+        match, followed by the highlights.
+        """
+        patterns = list(self.highlights)
+        pos = 0
+        first = None if self.regex is None else self.regex.search(contents)
+        if self._regex_found(first is not None):
+            assert self.regex is not None
+            patterns.insert(0, (self.regex, "class:match"))
+            if first is not None and not self.highlights:
+                pos = first.start()
+        elif self.regex_ok is not None:
+            patterns.insert(0, (self.regex_ok, "class:oldmatch"))
+        if not patterns:
+            return None, iter(())
+        highlighter = self._get_highlighter(patterns)
+        return highlighter, highlighter.spans(contents, pos)
+
+    def _regex_found(self, in_page: bool = False) -> bool:
+        """Return whether the regex has matches, making it regex_ok
+
+        The match index answers for the whole file once it has a match,
+        or is complete without any; until then, in_page tells whether
+        the page being styled has one. The regex is found for all the
+        lines at once: when it is, the lines cached with the old match
+        are dropped.
+        """
+        regex = self.regex
+        if regex is None:
+            return False
+        if regex is self.regex_ok:
+            return True
+        index = self.match_index
+        if index is not None and index.regex is regex:
+            if index.starts:
+                in_page = True
+            elif index.complete:
+                return False
+        if in_page:
+            self.regex_ok = regex
+            self.line_cache.clear()
+        return in_page
+
+    def get_cached_lines(self) -> List[StyleAndTextTuples]:
+        self._regex_found()
+        regex_ok = self.regex_ok
+        lines = HugeFileViewerUIControl.get_cached_lines(self)
+        if self.regex_ok is not regex_ok:
+            # Found while styling, after some lines came from the cache:
+            lines = HugeFileViewerUIControl.get_cached_lines(self)
+        return lines
+
+    def _style_hex_rows(self, rows: List[bytes]) -> List[StyleAndTextTuples]:
+        """Highlight the matches in consecutive rows of a hex dump
+
+        The rows are contiguous bytes of the file, so they are searched
+        together, and matches that cross rows are highlighted in each.
+        """
+        _, matches = self._page_matches(b"".join(rows))
+        m = next(matches, None)
+        styled: List[StyleAndTextTuples] = []
+        row_start = 0
+        for row in rows:
+            row_end = row_start + len(row)
+            spans = []
+            while m is not None and m[0] < row_end:
+                start, end, style = m
+                spans.append((start - row_start, end - row_start, style))
+                if end > row_end:
+                    # The match continues in the next row.
+                    break
+                m = next(matches, None)
+            styled.append(hex_row(row, self.hex_width, spans))
+            row_start = row_end
+        return styled
@@ -0,0 +1,219 @@
+"""Sparse line offset index"""
+
+import hashlib
+import mmap
+import os
+import struct
+import threading
+from array import array
+from bisect import bisect_left
+from typing import Callable, Optional, Tuple, Union
+
+from .advice import ScanAdvice
+from .bytesource import ByteSource
+
+FileBuffer = Union[bytes, mmap.mmap, ByteSource]
+
+LINE_INDEX_STEP = 1024 * 1024
+SCAN_BLOCK = 64 * 1024
+
+_MAGIC = b"HFVLIDX1"
+_HEADER = struct.Struct("<8sQQQQ")
+
+
+def cache_path(filename: str, suffix: str = "lines") -> str:
+    """Return the path of the cache file of the given kind for filename"""
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    key = hashlib.sha1(os.fsencode(os.path.abspath(filename))).hexdigest()
+    return os.path.join(cache_home, "pthugefileviewer", f"{key}.{suffix}")
+
+
+class LineIndex:
+    """Number of newlines before every step-th byte of a buffer
+
+    The checkpoints are kept in an array("Q"), so a 100 GB file takes
+    less than a megabyte with the default step. Line numbers and line
+    offsets are found by bisecting the checkpoints and then counting
+    newlines in at most one step of the buffer.
+
+    Line numbers here are 0-based.
+    """
+
+    def __init__(self, buf: FileBuffer, step: int = LINE_INDEX_STEP):
+        self._buf = buf
+        self.step = step
+        self.checkpoints = array("Q", [0])
+        self.newlines: Optional[int] = None
+        self._last: Tuple[int, int] = (0, 0)
+        self._lock = threading.Lock()
+
+    @property
+    def complete(self) -> bool:
+        return self.newlines is not None
+
+    @property
+    def scanned(self) -> int:
+        """Number of bytes already covered by checkpoints"""
+        if self.newlines is not None:
+            return len(self._buf)
+        return (len(self.checkpoints) - 1) * self.step
+
+    @property
+    def line_count(self) -> Optional[int]:
+        if self.newlines is None:
+            return None
+        size = len(self._buf)
+        if size > 0 and self._buf[size - 1 : size] != b"\n":
+            return self.newlines + 1
+        return self.newlines
+
+    def build(
+        self,
+        cancel: Optional[threading.Event] = None,
+        on_update: Optional[Callable[[], None]] = None,
+    ) -> None:
+        start = (len(self.checkpoints) - 1) * self.step
+        newlines = self.checkpoints[-1]
+        advice = ScanAdvice(self._buf)
+        while True:
+            if cancel is not None and cancel.is_set():
+                advice.done()
+                return
+            with self._lock:
+                buf = self._buf
+                if buf is not advice.buf:
+                    advice.done()
+                    advice = ScanAdvice(buf)
+                size = len(buf)
+                end = min(start + self.step, size)
+                advice.window(start, end)
+                if end == size:
+                    self.newlines = newlines + buf[start:end].count(b"\n")
+                    break
+            newlines += buf[start:end].count(b"\n")
+            self.checkpoints.append(newlines)
+            start = end
+        advice.done()
+        if on_update is not None:
+            on_update()
+
+    def grow(self, buf: FileBuffer) -> None:
+        """Switch to buf, the same file after it has grown
+
+        The index becomes incomplete again; a build that is running
+        picks up the new size, otherwise build must be called again.
+        """
+        with self._lock:
+            self._buf = buf
+            self.newlines = None
+
+    def line_number(self, offset: int) -> Optional[int]:
+        """Return the line of offset, or None if not indexed yet"""
+        if offset > self.scanned + self.step:
+            return None
+        i = min(offset // self.step, len(self.checkpoints) - 1)
+        base_offset, base_line = i * self.step, self.checkpoints[i]
+        last_offset, last_line = self._last
+        if base_offset <= last_offset <= offset:
+            base_offset, base_line = last_offset, last_line
+        lineno = base_line + self._count(base_offset, offset)
+        self._last = (offset, lineno)
+        return lineno
+
+    def line_offset(self, lineno: int, max_scan: Optional[int] = None) -> Optional[int]:
+        """Return the offset where line lineno starts, or -1
+
+        Newlines are counted from the last checkpoint before the line;
+        returns None if it is not found within max_scan bytes of it,
+        which happens only past the part that is indexed.
+        """
+        if lineno <= 0:
+            return 0
+        i = bisect_left(self.checkpoints, lineno) - 1
+        offset = i * self.step
+        remaining = lineno - self.checkpoints[i]
+        size = len(self._buf)
+        limit = size if max_scan is None else min(size, offset + max_scan)
+        while offset < limit:
+            end = min(offset + SCAN_BLOCK, limit)
+            n = self._count(offset, end)
+            if n < remaining:
+                remaining -= n
+                offset = end
+                continue
+            for _ in range(remaining):
+                offset = self._buf.find(b"\n", offset) + 1
+            return offset
+        return -1 if limit == size else None
+
+    def estimate_offset(self, lineno: int) -> int:
+        """Return where line lineno would start, from the average line length
+
+        The lines past the indexed part are taken to be as long as the
+        ones in it, or as the ones in the first SCAN_BLOCK bytes if
+        nothing is indexed yet.
+        """
+        size = len(self._buf)
+        base = (len(self.checkpoints) - 1) * self.step
+        base_line = self.checkpoints[-1]
+        sample, newlines = base, base_line
+        if newlines == 0:
+            sample = min(SCAN_BLOCK, size)
+            newlines = self._count(0, sample)
+        if newlines == 0:
+            return size
+        return min(size, base + max(0, lineno - base_line) * sample // newlines)
+
+    def _count(self, start: int, end: int) -> int:
+        count = 0
+        while start < end:
+            block_end = min(start + self.step, end)
+            count += self._buf[start:block_end].count(b"\n")
+            start = block_end
+        return count
+
+    def save(self, path: str, stat: os.stat_result) -> None:
+        if self.newlines is None:
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as fd:
+            fd.write(
+                _HEADER.pack(
+                    _MAGIC, self.step, stat.st_size, stat.st_mtime_ns, self.newlines
+                )
+            )
+            self.checkpoints.tofile(fd)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(
+        cls, buf: FileBuffer, path: str, stat: os.stat_result
+    ) -> Optional["LineIndex"]:
+        """Load the index saved at path if it still matches stat
+
+        Returns None, so that the index is built again, if the file is
+        truncated or corrupt.
+        """
+        try:
+            with open(path, "rb") as fd:
+                header = fd.read(_HEADER.size)
+                if len(header) != _HEADER.size:
+                    return None
+                magic, step, size, mtime_ns, newlines = _HEADER.unpack(header)
+                if (magic, size) != (_MAGIC, stat.st_size) or step <= 0:
+                    return None
+                if mtime_ns != stat.st_mtime_ns:
+                    return None
+                index = cls(buf, step)
+                index.checkpoints = array("Q")
+                index.checkpoints.frombytes(fd.read())
+        except (OSError, ValueError):
+            return None
+        # build leaves a checkpoint at the start of each step but the last:
+        if len(index.checkpoints) != max(1, -(-size // step)):
+            return None
+        if index.checkpoints[0] != 0 or index.checkpoints[-1] > newlines:
+            return None
+        index.newlines = newlines
+        return index
@@ -0,0 +1,69 @@
+"""Margins for the huge file viewer control"""
+
+from typing import Callable, Optional
+
+from prompt_toolkit.formatted_text import StyleAndTextTuples
+from prompt_toolkit.layout.containers import WindowRenderInfo
+from prompt_toolkit.layout.controls import UIContent
+from prompt_toolkit.layout.margins import Margin
+
+from .hugefilevieweruicontrol import HugeFileViewerUIControl
+
+
+class LineNumberMargin(Margin):
+    """Line number gutter backed by the control's line index"""
+
+    def __init__(self, control: HugeFileViewerUIControl):
+        self.control = control
+
+    def get_width(self, get_ui_content: Callable[[], UIContent]) -> int:
+        line_count = self.control.line_count
+        if line_count is None:
+            return 9
+        return len(str(line_count)) + 1
+
+    def create_margin(
+        self, window_render_info: WindowRenderInfo, width: int, height: int
+    ) -> StyleAndTextTuples:
+        lineno: Optional[int] = self.control.line_number()
+        if lineno is None:
+            return []
+        result: StyleAndTextTuples = []
+        rows = self.control.visible_rows[:height]
+        for row, offset in enumerate(rows):
+            if row > 0 and self.control.get_char(offset - 1) != b"\n":
+                # Wrapped continuation of the line above.
+                result.append(("class:line-number", " " * width))
+            else:
+                if row > 0 and self.control.filtered:
+                    # The lines in between may be hidden:
+                    lineno = self.control.line_number(offset)
+                elif row > 0 and lineno is not None:
+                    lineno += 1
+                text = "" if lineno is None else str(lineno)
+                result.append(("class:line-number", f"{text:>{width - 1}} "))
+            result.append(("", "\n"))
+        return result
+
+
+class OffsetMargin(Margin):
+    """Hex offset gutter of the rows of a hexdump, empty otherwise"""
+
+    def __init__(self, control: HugeFileViewerUIControl):
+        self.control = control
+
+    def get_width(self, get_ui_content: Callable[[], UIContent]) -> int:
+        if not self.control.hexdump:
+            return 0
+        return max(8, len(f"{self.control.size:x}")) + 2
+
+    def create_margin(
+        self, window_render_info: WindowRenderInfo, width: int, height: int
+    ) -> StyleAndTextTuples:
+        if not self.control.hexdump:
+            return []
+        result: StyleAndTextTuples = []
+        for offset in self.control.visible_rows[:height]:
+            result.append(("class:line-number", f"{offset:0{width - 2}x}  "))
+            result.append(("", "\n"))
+        return result
@@ -0,0 +1,246 @@
+"""Lazy view of the lines that match a regex"""
+
+import re
+from array import array
+from bisect import bisect_left
+from typing import List, Optional
+
+from .lineindex import FileBuffer
+from .search import CHUNK_SIZE, MAX_MATCH_SPAN, chunked_search
+
+LOOKAHEAD_LINES = 256
+LOOKBEHIND_WINDOW = 64 * 1024
+MATCHED_LINES_LIMIT = 1024 * 1024
+# Scanned at most by each call, so that a sparse regex doesn't stall the UI:
+MAX_SCAN = 32 * 1024 * 1024
+
+
+class _Range:
+    """Part of the buffer [lo, hi) where all the matching lines are known"""
+
+    def __init__(self, offset: int):
+        self.lo = offset
+        self.hi = offset
+        self.starts = array("Q")
+
+
+class MatchedLines:
+    """Start offsets of the lines of a buffer that match regex
+
+    A line matches when a match of regex starts in it. The lines are
+    found on demand, around the offsets asked for: next_line scans
+    ahead lookahead lines at a time, and prev_line scans back one
+    window at a time. What was scanned is kept in a few ranges, so that
+    paging back and forth doesn't scan again. At most limit offsets are
+    kept: the least recently used ranges are dropped first, then the
+    offsets of the current range that are farther from the last one
+    asked for.
+
+    Each call scans at most max_scan bytes. A call that stops there
+    returns -1, as if there were no more matching lines, and sets
+    approximate; the next calls go on from where it stopped, and
+    approximate is cleared once the whole buffer has been scanned.
+    When the file grows, grow keeps what was scanned.
+    """
+
+    def __init__(
+        self,
+        buf: FileBuffer,
+        regex: "re.Pattern[bytes]",
+        lookahead: int = LOOKAHEAD_LINES,
+        limit: int = MATCHED_LINES_LIMIT,
+        chunk_size: int = CHUNK_SIZE,
+        max_span: int = MAX_MATCH_SPAN,
+        max_scan: int = MAX_SCAN,
+    ):
+        self._buf = buf
+        self._size = len(buf)
+        self.regex = regex
+        self.lookahead = lookahead
+        self.limit = limit
+        self.chunk_size = chunk_size
+        self.max_span = max_span
+        self.max_scan = max_scan
+        self.approximate = False
+        # Least recently used first:
+        self._ranges: List[_Range] = []
+
+    def __len__(self) -> int:
+        """Number of offsets kept"""
+        return sum(len(r.starts) for r in self._ranges)
+
+    def next_line(self, offset: int) -> int:
+        """Return the first matching line that starts at offset or after, or -1"""
+        offset = self._line_start_after(offset)
+        r = self._range(offset)
+        scanned = 0
+        while True:
+            i = bisect_left(r.starts, offset)
+            if i < len(r.starts):
+                start = r.starts[i]
+                break
+            if r.hi >= self._size:
+                start = -1
+                break
+            if scanned >= self.max_scan:
+                self.approximate = True
+                start = -1
+                break
+            hi = r.hi
+            r = self._scan_forward(r, self.max_scan - scanned)
+            scanned += r.hi - hi
+        self._done(r, offset)
+        return start
+
+    def prev_line(self, offset: int) -> int:
+        """Return the last matching line that starts before offset, or -1"""
+        offset = self._line_start_after(offset)
+        r = self._range(offset)
+        window = LOOKBEHIND_WINDOW
+        scanned = 0
+        while True:
+            i = bisect_left(r.starts, offset)
+            if i > 0:
+                start = r.starts[i - 1]
+                break
+            if r.lo == 0:
+                start = -1
+                break
+            if scanned >= self.max_scan:
+                self.approximate = True
+                start = -1
+                break
+            lo = r.lo
+            r = self._scan_backward(r, min(window, self.max_scan - scanned))
+            scanned += lo - r.lo
+            window = min(2 * window, self.chunk_size)
+        self._done(r, offset)
+        return start
+
+    def matches(self, line_start: int) -> bool:
+        """Return whether the line that starts at line_start matches"""
+        return self.next_line(line_start) == line_start
+
+    def grow(self, buf: FileBuffer) -> None:
+        """Switch to buf, the same file after it has grown
+
+        The lines that start in the last max_span bytes of the old
+        buffer could match differently with what was appended: the
+        ranges are cut at the line start before those, and the rest of
+        what was scanned is kept.
+        """
+        old_size = self._size
+        self._buf = buf
+        self._size = len(buf)
+        if self._size == old_size:
+            return
+        newline = self._buf.rfind(b"\n", 0, max(0, old_size - self.max_span))
+        cut = newline + 1
+        for r in list(self._ranges):
+            if r.hi < old_size:
+                continue
+            if r.lo > cut:
+                self._ranges.remove(r)
+                continue
+            r.hi = cut
+            r.starts = r.starts[: bisect_left(r.starts, cut)]
+
+    def _line_start_after(self, offset: int) -> int:
+        """Return offset if a line starts there, or where the next one starts"""
+        if offset <= 0 or offset >= self._size:
+            return max(0, min(offset, self._size))
+        if self._buf[offset - 1 : offset] == b"\n":
+            return offset
+        newline = self._buf.find(b"\n", offset)
+        return self._size if newline == -1 else newline + 1
+
+    def _range(self, offset: int) -> _Range:
+        """Return the range that covers offset, marking it as used"""
+        for r in self._ranges:
+            if r.lo <= offset <= r.hi:
+                self._ranges.remove(r)
+                self._ranges.append(r)
+                return r
+        r = _Range(offset)
+        self._ranges.append(r)
+        return r
+
+    def _scan(self, start: int, end: int, count: Optional[int] = None) -> "array[int]":
+        """Return the matching lines that start in [start, end)
+
+        start must be a line start. Stops after count lines, if given.
+        """
+        starts = array("Q")
+        pos = start
+        window_end = min(end + self.max_span, self._size)
+        while pos < end and (count is None or len(starts) < count):
+            span = chunked_search(
+                self._buf,
+                self.regex,
+                pos,
+                window_end,
+                chunk_size=self.chunk_size,
+                max_span=self.max_span,
+            )
+            if span is None or span[0] >= end:
+                break
+            newline = self._buf.rfind(b"\n", pos, span[0])
+            starts.append(pos if newline == -1 else newline + 1)
+            newline = self._buf.find(b"\n", span[0])
+            pos = self._size if newline == -1 else newline + 1
+        return starts
+
+    def _done(self, r: _Range, offset: int) -> None:
+        self._trim(r, offset)
+        if r.lo == 0 and r.hi >= self._size:
+            self.approximate = False
+
+    def _scan_forward(self, r: _Range, budget: int) -> _Range:
+        # The scan ends at a line start, so that r.hi is one:
+        end = self._line_start_after(r.hi + budget)
+        starts = self._scan(r.hi, end, self.lookahead)
+        r.starts.extend(starts)
+        if len(starts) < self.lookahead:
+            r.hi = end
+        else:
+            newline = self._buf.find(b"\n", starts[-1])
+            r.hi = self._size if newline == -1 else newline + 1
+        return self._merge(r)
+
+    def _scan_backward(self, r: _Range, window: int) -> _Range:
+        newline = self._buf.rfind(b"\n", 0, max(0, r.lo - window))
+        lo = newline + 1
+        r.starts = self._scan(lo, r.lo) + r.starts
+        r.lo = lo
+        return self._merge(r)
+
+    def _merge(self, r: _Range) -> _Range:
+        """Merge the ranges that overlap r into it"""
+        for other in list(self._ranges):
+            if other is r or other.hi < r.lo or other.lo > r.hi:
+                continue
+            lo, hi = min(r.lo, other.lo), max(r.hi, other.hi)
+            first, second = (r, other) if r.lo <= other.lo else (other, r)
+            starts = first.starts
+            starts.extend(s for s in second.starts if s >= first.hi)
+            r.lo, r.hi, r.starts = lo, hi, starts
+            self._ranges.remove(other)
+        return r
+
+    def _trim(self, r: _Range, offset: int) -> None:
+        """Keep at most limit offsets, the ones of r around offset last"""
+        excess = len(self) - self.limit
+        while excess > 0 and self._ranges[0] is not r:
+            excess -= len(self._ranges.pop(0).starts)
+        if excess <= 0:
+            return
+        i = bisect_left(r.starts, offset)
+        if i >= len(r.starts) - i:
+            # Drop the lowest offsets; the range starts at the first kept.
+            r.lo = r.starts[excess]
+            r.starts = r.starts[excess:]
+        else:
+            # Drop the highest; the range ends at the first dropped.
+            keep = len(r.starts) - excess
+            r.hi = r.starts[keep]
+            r.starts = r.starts[:keep]
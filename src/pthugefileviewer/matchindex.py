@@ -0,0 +1,127 @@
+"""Index of the offsets where the matches of a regex start"""
+
+import re
+import threading
+from array import array
+from bisect import bisect_left
+from typing import Callable, Optional
+
+from .lineindex import FileBuffer
+from .search import CHUNK_SIZE, MAX_MATCH_SPAN, SearchCancelled, chunked_finditer
+
+MATCH_INDEX_LIMIT = 64 * 1024 * 1024
+
+
+class MatchIndex:
+    """Start offsets of all the matches of regex in a buffer
+
+    The offsets are kept in an array("Q") that is filled by build,
+    usually in a background thread. The build stops when the array
+    reaches limit bytes; the index is then truncated and only answers
+    for the part of the buffer it covers. When the file grows, grow
+    keeps the matches found so far and build only scans the new part.
+    """
+
+    def __init__(
+        self,
+        buf: FileBuffer,
+        regex: "re.Pattern[bytes]",
+        limit: int = MATCH_INDEX_LIMIT,
+    ):
+        self._buf = buf
+        self.regex = regex
+        self.limit = limit
+        self.starts = array("Q")
+        self.scanned = 0
+        self.complete = False
+        self.truncated = False
+        # Where build starts; the matches before are final:
+        self._resume = 0
+
+    @property
+    def count(self) -> Optional[int]:
+        """Number of matches, or None if still unknown"""
+        return len(self.starts) if self.complete else None
+
+    def build(
+        self,
+        cancel: Optional[threading.Event] = None,
+        on_update: Optional[Callable[[], None]] = None,
+        chunk_size: int = CHUNK_SIZE,
+        max_span: int = MAX_MATCH_SPAN,
+    ) -> None:
+        max_len = self.limit // self.starts.itemsize
+        size = len(self._buf)
+
+        def progress(position: int) -> None:
+            self.scanned = position
+
+        try:
+            for start, _ in chunked_finditer(
+                self._buf,
+                self.regex,
+                self._resume,
+                chunk_size=chunk_size,
+                max_span=max_span,
+                progress=progress,
+                cancel=cancel,
+            ):
+                if len(self.starts) == max_len:
+                    self.truncated = True
+                    self.scanned = start
+                    break
+                self.starts.append(start)
+            else:
+                self.scanned = size
+                self.complete = True
+        except SearchCancelled:
+            return
+        if on_update is not None:
+            on_update()
+
+    def grow(self, buf: FileBuffer, max_span: int = MAX_MATCH_SPAN) -> None:
+        """Switch to buf, the same file after it has grown
+
+        The matches that start in the last max_span bytes of the old
+        buffer could be different with what was appended; they are
+        dropped, and the next build scans again from the last match kept,
+        which it finds again. Must not be called while build runs. An
+        index that is not complete, like a truncated one, only switches
+        to buf.
+        """
+        self._buf = buf
+        # All of the old buffer, which may be buf itself:
+        old_size = self.scanned
+        if not self.complete or len(buf) == old_size:
+            return
+        i = bisect_left(self.starts, max(0, old_size - max_span))
+        if i > 0:
+            i -= 1
+            self._resume = self.starts[i]
+        else:
+            # No match before, so no match continues after:
+            self._resume = max(0, old_size - max_span)
+        del self.starts[i:]
+        self.scanned = self._resume
+        self.complete = False
+
+    def number(self, offset: int) -> Optional[int]:
+        """Return the 1-based number of the match that starts at offset"""
+        i = bisect_left(self.starts, offset)
+        if i == len(self.starts) or self.starts[i] != offset:
+            return None
+        return i + 1
+
+    def next_start(self, offset: int) -> Optional[int]:
+        """Return the first match start >= offset, -1 if none, None if unknown"""
+        i = bisect_left(self.starts, offset)
+        if i < len(self.starts):
+            return self.starts[i]
+        return -1 if self.complete else None
+
+    def prev_start(self, offset: int) -> Optional[int]:
+        """Return the last match start < offset, -1 if none, None if unknown"""
+        if offset > self.scanned:
+            return None
+        i = bisect_left(self.starts, offset)
+        return self.starts[i - 1] if i > 0 else -1
@@ -0,0 +1,153 @@
+"""Helpers to view and search several files"""
+
+import concurrent.futures
+import glob
+import logging
+import os
+import re
+import threading
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional
+
+from .hugefilevieweruicontrol import HugeFileViewerUIControl, map_file
+from .parallel import mp_context
+from .search import SearchCancelled, chunked_finditer
+
+logger = logging.getLogger(__name__)
+
+
+class FileHits(NamedTuple):
+    """Matches of a regex in a file, as counted by count_matches"""
+
+    path: str
+    matches: int
+    first: Optional[int]
+    error: Optional[str] = None
+
+
+def expand_paths(args: Iterable[str]) -> List[str]:
+    """Expand the glob patterns in args; other paths are kept as given
+
+    The matches of each pattern are sorted, and patterns without
+    matches are kept as given, so that opening them reports the error.
+    """
+    paths = []
+    for arg in args:
+        matches = sorted(glob.glob(arg)) if glob.has_magic(arg) else []
+        paths.extend(matches or [arg])
+    return paths
+
+
+def count_matches(path: str, regex: "re.Pattern[bytes]") -> FileHits:
+    """Count the matches of regex in the file at path
+
+    Runs in the worker processes of search_files, so the file is only
+    open while it is searched.
+    """
+    try:
+        with open(path, "rb") as fd:
+            buf = map_file(fd)
+    except OSError as e:
+        return FileHits(path, 0, None, e.strerror or str(e))
+    try:
+        count = 0
+        first = None
+        for start, _ in chunked_finditer(buf, regex):
+            if first is None:
+                first = start
+            count += 1
+        return FileHits(path, count, first)
+    finally:
+        if not isinstance(buf, bytes):
+            buf.close()
+
+
+def search_files(
+    paths: List[str],
+    regex: "re.Pattern[bytes]",
+    max_workers: Optional[int] = None,
+    cancel: Optional[threading.Event] = None,
+) -> Iterator[FileHits]:
+    """Count the matches of regex in each file using a process pool
+
+    The files are searched in parallel and yielded as they finish, not
+    in order. SearchCancelled is raised soon after cancel is set; the
+    files that have not started yet are not searched, and the pool is
+    not waited for.
+    """
+    executor = concurrent.futures.ProcessPoolExecutor(
+        max_workers, mp_context=mp_context()
+    )
+    try:
+        pending = {executor.submit(count_matches, path, regex) for path in paths}
+        while pending:
+            if cancel is not None and cancel.is_set():
+                raise SearchCancelled()
+            done, pending = concurrent.futures.wait(
+                pending, timeout=0.1, return_when=concurrent.futures.FIRST_COMPLETED
+            )
+            for future in done:
+                yield future.result()
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def summarize_hits(paths: List[str], hits: Dict[str, FileHits]) -> str:
+    """Return the matches of each file in hits, in the order of paths
+
+    Files without matches are left out; the ones that could not be
+    searched are listed with their error.
+    """
+    parts = []
+    for path in paths:
+        file_hits = hits.get(path)
+        if file_hits is None or not (file_hits.matches or file_hits.error):
+            continue
+        name = os.path.basename(path)
+        parts.append(f"{name}: {file_hits.error or file_hits.matches}")
+    return ", ".join(parts)
+
+
+class FileTabs:
+    """Shows several files in a control, one at a time
+
+    The control starts showing the first of paths. Only the current
+    file is mapped: switching remaps the control, and the previous map
+    is released once nothing uses it. The offset of each file is kept,
+    so that switching back returns to it.
+    """
+
+    def __init__(self, control: HugeFileViewerUIControl, paths: List[str]):
+        self.control = control
+        self.paths = paths
+        self.index = 0
+        self._offsets: Dict[int, int] = {}
+
+    @property
+    def path(self) -> str:
+        return self.paths[self.index]
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    def switch(self, index: int) -> bool:
+        """Show the file at index in paths; return if it changed"""
+        index %= len(self.paths)
+        if index == self.index:
+            return False
+        offset = self.control.offset
+        try:
+            with open(self.paths[index], "rb") as fd:
+                self.control.remap(fd)
+        except OSError as e:
+            logger.warning("cannot open %s: %s", self.paths[index], e)
+            return False
+        self._offsets[self.index] = offset
+        self.index = index
+        self.control.go_line_offset(self._offsets.get(index, 0))
+        return True
+
+    def next(self) -> bool:
+        return self.switch(self.index + 1)
+
+    def prev(self) -> bool:
+        return self.switch(self.index - 1)
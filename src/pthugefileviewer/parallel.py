@@ -0,0 +1,220 @@
+"""Regular expression search split across worker processes
+
+The pattern holds the GIL while it runs, so threads don't scan faster
+than one core; the ranges of the file are scanned by processes instead,
+each one mapping the file by itself.
+"""
+
+import concurrent.futures
+import multiprocessing
+import multiprocessing.context
+import re
+import threading
+from typing import Callable, Iterator, List, NamedTuple, Optional, Tuple
+
+from .lineindex import FileBuffer
+from .search import MAX_MATCH_SPAN, SearchCancelled, chunked_finditer, chunked_search
+
+RANGE_SIZE = 64 * 1024 * 1024
+
+
+class RangeCount(NamedTuple):
+    """Matches that start in a range, as counted by count_range"""
+
+    matches: int
+    first: Optional[int]
+    last_end: Optional[int]
+
+
+def split_ranges(
+    offset: int, end: int, range_size: int = RANGE_SIZE
+) -> List[Tuple[int, int]]:
+    """Split [offset, end) into consecutive ranges of range_size bytes"""
+    return [
+        (start, min(start + range_size, end))
+        for start in range(offset, end, range_size)
+    ]
+
+
+def mp_context() -> multiprocessing.context.BaseContext:
+    """Return the context of the worker processes
+
+    The pools are started from the searcher thread while other threads
+    of the viewer run; forking then could copy locks held by them, so
+    the workers are started by a forkserver, or spawned where there is
+    none.
+    """
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("forkserver")
+    return multiprocessing.get_context("spawn")
+
+
+def _open(path: str) -> FileBuffer:
+    from .hugefilevieweruicontrol import map_file
+
+    with open(path, "rb") as fd:
+        return map_file(fd)
+
+
+def _close(buf: FileBuffer) -> None:
+    if not isinstance(buf, bytes):
+        buf.close()
+
+
+def search_range(
+    path: str,
+    regex: "re.Pattern[bytes]",
+    start: int,
+    end: int,
+    max_span: int = MAX_MATCH_SPAN,
+) -> Optional[Tuple[int, int]]:
+    """Return the span of the first match of regex that starts in [start, end)
+
+    The match may continue up to max_span bytes after end.
+    """
+    buf = _open(path)
+    try:
+        window_end = min(end + max_span, len(buf))
+        span = chunked_search(buf, regex, start, window_end, max_span=max_span)
+        if span is None or (span[0] >= end and end < len(buf)):
+            return None
+        return span
+    finally:
+        _close(buf)
+
+
+def count_range(
+    path: str,
+    regex: "re.Pattern[bytes]",
+    start: int,
+    end: int,
+    max_span: int = MAX_MATCH_SPAN,
+) -> RangeCount:
+    """Count the matches of regex that start in [start, end)
+
+    The matches don't overlap and are looked for from start, as if the
+    scan began there.
+    """
+    buf = _open(path)
+    try:
+        count = 0
+        first = last_end = None
+        window_end = min(end + max_span, len(buf))
+        for span in chunked_finditer(buf, regex, start, window_end, max_span=max_span):
+            if span[0] >= end and end < len(buf):
+                break
+            if first is None:
+                first = span[0]
+            last_end = span[1]
+            count += 1
+        return RangeCount(count, first, last_end)
+    finally:
+        _close(buf)
+
+
+def _in_order(
+    executor: concurrent.futures.Executor,
+    fn: Callable[..., object],
+    path: str,
+    regex: "re.Pattern[bytes]",
+    ranges: List[Tuple[int, int]],
+    max_span: int,
+    cancel: Optional[threading.Event],
+) -> Iterator["concurrent.futures.Future[object]"]:
+    """Submit fn for each range and yield the futures in order, once done"""
+    futures = [executor.submit(fn, path, regex, a, b, max_span) for a, b in ranges]
+    for future in futures:
+        while True:
+            if cancel is not None and cancel.is_set():
+                raise SearchCancelled()
+            done, _ = concurrent.futures.wait([future], timeout=0.1)
+            if done:
+                break
+        yield future
+
+
+def parallel_search(
+    path: str,
+    regex: "re.Pattern[bytes]",
+    offset: int = 0,
+    end: Optional[int] = None,
+    max_workers: Optional[int] = None,
+    range_size: int = RANGE_SIZE,
+    max_span: int = MAX_MATCH_SPAN,
+    progress: Optional[Callable[[int], None]] = None,
+    cancel: Optional[threading.Event] = None,
+) -> Optional[Tuple[int, int]]:
+    """Return the span of the first match of regex in the file at path
+
+    Works like chunked_search over [offset, end), with the ranges of
+    range_size bytes scanned by a pool of max_workers processes. The
+    ranges are submitted in order and the first match is returned as
+    soon as the ranges before it are done; the ranges that have not
+    started by then are not scanned. progress is called with the end
+    of each range done, in order.
+    """
+    if end is None:
+        buf = _open(path)
+        end = len(buf)
+        _close(buf)
+    ranges = split_ranges(max(0, offset), end, range_size)
+    executor = concurrent.futures.ProcessPoolExecutor(
+        max_workers, mp_context=mp_context()
+    )
+    try:
+        futures = _in_order(
+            executor, search_range, path, regex, ranges, max_span, cancel
+        )
+        for (_, range_end), future in zip(ranges, futures):
+            span = future.result()
+            if span is not None:
+                assert isinstance(span, tuple)
+                return span
+            if progress is not None:
+                progress(range_end)
+        return None
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def parallel_count(
+    path: str,
+    regex: "re.Pattern[bytes]",
+    max_workers: Optional[int] = None,
+    range_size: int = RANGE_SIZE,
+    max_span: int = MAX_MATCH_SPAN,
+    progress: Optional[Callable[[int], None]] = None,
+    cancel: Optional[threading.Event] = None,
+) -> int:
+    """Count the matches of regex in the file at path in parallel
+
+    The count is the same as chunked_finditer's. When the last match
+    of a range continues into the next one, the next range is counted
+    again from the end of that match, in this process.
+    """
+    buf = _open(path)
+    size = len(buf)
+    _close(buf)
+    ranges = split_ranges(0, size, range_size)
+    executor = concurrent.futures.ProcessPoolExecutor(
+        max_workers, mp_context=mp_context()
+    )
+    try:
+        total = 0
+        prev_end = 0
+        futures = _in_order(
+            executor, count_range, path, regex, ranges, max_span, cancel
+        )
+        for (_, end), future in zip(ranges, futures):
+            result = future.result()
+            assert isinstance(result, RangeCount)
+            if result.first is not None and result.first < prev_end:
+                result = count_range(path, regex, prev_end, end, max_span)
+            total += result.matches
+            if result.last_end is not None:
+                prev_end = max(prev_end, result.last_end)
+            if progress is not None:
+                progress(end)
+        return total
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
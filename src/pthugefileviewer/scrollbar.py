@@ -0,0 +1,68 @@
+"""Scrollbar for the huge file viewer control"""
+
+from typing import TYPE_CHECKING
+
+from prompt_toolkit.formatted_text import StyleAndTextTuples
+from prompt_toolkit.layout.controls import UIContent, UIControl
+from prompt_toolkit.mouse_events import MouseButton, MouseEvent, MouseEventType
+
+from .hugefilevieweruicontrol import HugeFileViewerUIControl
+
+if TYPE_CHECKING:
+    from prompt_toolkit.key_binding.key_bindings import NotImplementedOrNone
+
+
+class ScrollbarControl(UIControl):
+    """Scrollbar positioned by byte offset, to put beside the control
+
+    The thumb shows the part of the file in the viewport, by bytes, so
+    no line count is needed. Clicking or dragging jumps to the same
+    fraction of the file with go_percent.
+
+    This is a control and not a Margin because prompt_toolkit sends the
+    mouse events of the margins to the control of the window.
+    """
+
+    def __init__(self, control: HugeFileViewerUIControl):
+        self.control = control
+        self._height = 0
+
+    def thumb(self, height: int) -> range:
+        """Return the rows of the thumb in a scrollbar of height rows"""
+        size = self.control.size
+        if height <= 0 or size == 0:
+            return range(0)
+        offset = self.control.offset
+        end = self.control.offset_down(self.control.height)
+        if end <= offset:
+            end = size
+        top = min(height - 1, offset * height // size)
+        bottom = max(top + 1, min(height, -(-end * height // size)))
+        return range(top, bottom)
+
+    def create_content(self, width: int, height: int) -> UIContent:
+        self._height = height
+        thumb = self.thumb(height)
+
+        def get_line(i: int) -> StyleAndTextTuples:
+            if i in thumb:
+                return [("class:scrollbar.button", " " * width)]
+            return [("class:scrollbar.background", " " * width)]
+
+        return UIContent(get_line=get_line, line_count=height)
+
+    def mouse_handler(self, mouse_event: MouseEvent) -> "NotImplementedOrNone":
+        event_type = mouse_event.event_type
+        if event_type == MouseEventType.SCROLL_UP:
+            self.control.go_up()
+        elif event_type == MouseEventType.SCROLL_DOWN:
+            self.control.go_down()
+        elif event_type == MouseEventType.MOUSE_DOWN or (
+            event_type == MouseEventType.MOUSE_MOVE
+            and mouse_event.button == MouseButton.LEFT
+        ):
+            last = max(1, self._height - 1)
+            self.control.go_percent(100 * mouse_event.position.y / last)
+        else:
+            return NotImplemented
+        return None
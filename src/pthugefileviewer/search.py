@@ -0,0 +1,279 @@
+"""Chunked regular expression search over huge buffers"""
+
+import functools
+import importlib
+import mmap
+import re
+import threading
+from typing import Any, Callable, Iterator, Optional, Tuple, Union
+
+from .advice import ScanAdvice
+from .bytesource import ByteSource
+
+ByteBuffer = Union[bytes, bytearray, memoryview, mmap.mmap, ByteSource]
+_Data = Union[bytes, bytearray, memoryview, mmap.mmap]
+
+CHUNK_SIZE = 1024 * 1024
+MAX_MATCH_SPAN = 64 * 1024
+# Shortest literal, or literal prefix, that is looked for with find; the
+# regex engine already scans for the prefix of a pattern, and only falls
+# behind find on longer ones:
+MIN_LITERAL_PREFIX = 16
+# Candidates of the prefix that may fail to match in a window before
+# the rest of it is left to regex.search:
+MAX_PREFIX_MISSES = 4
+
+try:
+    _sre_parse: Any = importlib.import_module("re._parser")
+except ImportError:  # Python < 3.11
+    _sre_parse = importlib.import_module("sre_parse")
+
+
+class SearchCancelled(Exception):
+    """Raised when a search is cancelled before it finishes"""
+
+
+@functools.lru_cache(maxsize=64)
+def literal_prefix(regex: "re.Pattern[bytes]") -> Tuple[bytes, bool]:
+    """Return the bytes that all the matches of regex start with
+
+    Also returns whether the matches are exactly those bytes, that is,
+    whether regex is a plain literal. Case insensitive patterns have no
+    prefix; zero-width assertions before the first literal are skipped.
+    """
+    if regex.flags & re.IGNORECASE:
+        return b"", False
+    try:
+        items = _sre_parse.parse(regex.pattern, regex.flags).data
+    except Exception:
+        return b"", False
+    prefix = bytearray()
+    literal = True
+    for op, av in items:
+        if op is _sre_parse.LITERAL:
+            prefix.append(av)
+            continue
+        literal = False
+        if op is not _sre_parse.AT or prefix:
+            break
+    return bytes(prefix), literal and len(prefix) > 0
+
+
+def chunked_search(
+    buf: ByteBuffer,
+    regex: "re.Pattern[bytes]",
+    offset: int = 0,
+    end: Optional[int] = None,
+    chunk_size: int = CHUNK_SIZE,
+    max_span: int = MAX_MATCH_SPAN,
+    progress: Optional[Callable[[int], None]] = None,
+    cancel: Optional[threading.Event] = None,
+) -> Optional[Tuple[int, int]]:
+    """Search regex in buf[offset:end] one bounded window at a time
+
+    Returns the span of the first match. The pattern runs directly on
+    the buffer using pos/endpos, so no copy is made; a ByteSource is
+    read one window at a time instead. Each window covers chunk_size
+    bytes plus an overlap of max_span bytes; only matches that start
+    before the overlap are accepted, the others are found again by the
+    next window. Matches longer than max_span may be truncated at the
+    window edge.
+
+    When regex is a literal of at least MIN_LITERAL_PREFIX bytes, it is
+    looked for with find, which skips ahead faster than the regex
+    engine on long needles; when it starts with such a literal, find
+    locates the candidates and the regex is only matched there, until
+    MAX_PREFIX_MISSES of them fail in a window.
+
+    progress is called with the offset reached after each window, and
+    cancel is checked before each one; SearchCancelled is raised when
+    it is set. The pattern holds the GIL while it runs, so chunk_size
+    also bounds how long other threads can be stalled by a search.
+    """
+    size = len(buf)
+    end = size if end is None else min(end, size)
+    start = max(0, offset)
+    advice = ScanAdvice(buf)
+    try:
+        while start < end:
+            if cancel is not None and cancel.is_set():
+                raise SearchCancelled()
+            core_end = min(start + chunk_size, end)
+            window_end = min(core_end + max_span, end)
+            advice.window(start, window_end)
+            span = _search_window(buf, regex, start, window_end)
+            if span is None and window_end == end:
+                return None
+            if span is not None and (span[0] < core_end or window_end == end):
+                return span
+            start = core_end
+            if progress is not None:
+                progress(start)
+        return None
+    finally:
+        advice.done()
+
+
+def chunked_search_backward(
+    buf: ByteBuffer,
+    regex: "re.Pattern[bytes]",
+    offset: Optional[int] = None,
+    start: int = 0,
+    chunk_size: int = CHUNK_SIZE,
+    max_span: int = MAX_MATCH_SPAN,
+    progress: Optional[Callable[[int], None]] = None,
+    cancel: Optional[threading.Event] = None,
+) -> Optional[Tuple[int, int]]:
+    """Search the last match of regex that starts in buf[start:offset]
+
+    The windows go backwards from offset, chunk_size bytes at a time.
+    Each one is searched forward starting max_span bytes before it, so
+    that a match that starts before the window is not also found at
+    the window start; matches may still extend max_span bytes past the
+    window end. progress and cancel work as in chunked_search, with
+    progress getting decreasing offsets.
+    """
+    size = len(buf)
+    end = size if offset is None else min(offset, size)
+    start = max(0, start)
+    advice = ScanAdvice(buf, backward=True)
+    try:
+        while end > start:
+            if cancel is not None and cancel.is_set():
+                raise SearchCancelled()
+            core_start = max(start, end - chunk_size)
+            window_start = max(start, core_start - max_span)
+            advice.window(window_start, end)
+            last = None
+            for span in _finditer_window(
+                buf, regex, window_start, min(end + max_span, size)
+            ):
+                if span[0] >= end:
+                    break
+                if span[0] >= core_start:
+                    last = span
+            if last is not None:
+                return last
+            end = core_start
+            if progress is not None and end > start:
+                progress(end)
+        return None
+    finally:
+        advice.done()
+
+
+def chunked_finditer(
+    buf: ByteBuffer,
+    regex: "re.Pattern[bytes]",
+    offset: int = 0,
+    end: Optional[int] = None,
+    chunk_size: int = CHUNK_SIZE,
+    max_span: int = MAX_MATCH_SPAN,
+    progress: Optional[Callable[[int], None]] = None,
+    cancel: Optional[threading.Event] = None,
+) -> Iterator[Tuple[int, int]]:
+    """Yield the spans of all the matches of regex in buf[offset:end]
+
+    Same windows as chunked_search; each window starts where the last
+    match of the previous one ended, so the matches don't overlap.
+    """
+    size = len(buf)
+    end = size if end is None else min(end, size)
+    start = max(0, offset)
+    advice = ScanAdvice(buf)
+    try:
+        while start < end:
+            if cancel is not None and cancel.is_set():
+                raise SearchCancelled()
+            core_end = min(start + chunk_size, end)
+            window_end = min(core_end + max_span, end)
+            advice.window(start, window_end)
+            next_start = core_end
+            for span in _finditer_window(buf, regex, start, window_end):
+                if span[0] >= core_end and window_end != end:
+                    break
+                yield span
+                next_start = max(next_start, span[1])
+            start = next_start
+            if progress is not None and start < end:
+                progress(start)
+    finally:
+        advice.done()
+
+
+def _search(
+    data: _Data, regex: "re.Pattern[bytes]", pos: int, endpos: int
+) -> Optional[Tuple[int, int]]:
+    """Like regex.search(data, pos, endpos), with find for long literals"""
+    prefix, literal = literal_prefix(regex)
+    if isinstance(data, memoryview) or len(prefix) < MIN_LITERAL_PREFIX:
+        m = regex.search(data, pos, endpos)
+        return None if m is None else m.span()
+    for _ in range(MAX_PREFIX_MISSES):
+        i = data.find(prefix, pos, endpos)
+        if i == -1:
+            return None
+        if literal:
+            return i, i + len(prefix)
+        m = regex.match(data, i, endpos)
+        if m is not None:
+            return m.span()
+        pos = i + 1
+    # The prefix is common: the candidates are not worth a call each:
+    m = regex.search(data, pos, endpos)
+    return None if m is None else m.span()
+
+
+def _finditer(
+    data: _Data, regex: "re.Pattern[bytes]", pos: int, endpos: int
+) -> Iterator[Tuple[int, int]]:
+    """Like regex.finditer(data, pos, endpos), with find for long literals"""
+    prefix, literal = literal_prefix(regex)
+    if isinstance(data, memoryview) or len(prefix) < MIN_LITERAL_PREFIX:
+        for m in regex.finditer(data, pos, endpos):
+            yield m.span()
+        return
+    misses = 0
+    while misses < MAX_PREFIX_MISSES:
+        i = data.find(prefix, pos, endpos)
+        if i == -1:
+            return
+        if literal:
+            yield i, i + len(prefix)
+            pos = i + len(prefix)
+            continue
+        match = regex.match(data, i, endpos)
+        if match is None:
+            misses += 1
+            pos = i + 1
+            continue
+        yield match.span()
+        # The prefix is not empty, so neither are the matches:
+        pos = match.end()
+    for m in regex.finditer(data, pos, endpos):
+        yield m.span()
+
+
+def _search_window(
+    buf: ByteBuffer, regex: "re.Pattern[bytes]", start: int, end: int
+) -> Optional[Tuple[int, int]]:
+    if not isinstance(buf, ByteSource):
+        return _search(buf, regex, start, end)
+    # Keep one byte before the window, so that ^ and \b see it:
+    context = min(start, 1)
+    span = _search(buf[start - context : end], regex, context, end - start + context)
+    if span is None:
+        return None
+    return start - context + span[0], start - context + span[1]
+
+
+def _finditer_window(
+    buf: ByteBuffer, regex: "re.Pattern[bytes]", start: int, end: int
+) -> Iterator[Tuple[int, int]]:
+    if not isinstance(buf, ByteSource):
+        yield from _finditer(buf, regex, start, end)
+        return
+    context = min(start, 1)
+    base = start - context
+    for span_start, span_end in _finditer(buf[base:end], regex, context, end - base):
+        yield base + span_start, base + span_end
@@ -0,0 +1,114 @@
+"""Spool a stream, like a pipe, to a temporary file that can be mapped"""
+
+import os
+import select
+import stat
+import tempfile
+import threading
+from typing import Callable, Optional
+
+READ_SIZE = 1024 * 1024
+# How often the reader checks if it was stopped while the stream is idle:
+POLL_INTERVAL = 0.1
+
+
+def is_stream(path: str) -> bool:
+    """Return whether path is a pipe, a socket or a character device
+
+    They can only be read once, and map_file rejects them; a path that
+    can't be checked is not a stream, so that opening it reports why.
+    """
+    try:
+        mode = os.stat(path).st_mode
+    except OSError:
+        return False
+    return not (stat.S_ISREG(mode) or stat.S_ISBLK(mode) or stat.S_ISDIR(mode))
+
+
+class StreamSpool:
+    """Copies the stream fd to an append-only temporary file
+
+    A worker thread reads the stream and appends it to the file at
+    path, which can be opened by the control and followed with a
+    FileFollower as it grows. Only READ_SIZE bytes are in memory at a
+    time. The reader stops at the end of the stream, or after limit
+    bytes; the stream is not read any further then, so the writer
+    blocks once the pipe is full, as it would with a paused reader.
+    """
+
+    def __init__(
+        self,
+        fd: int,
+        limit: Optional[int] = None,
+        directory: Optional[str] = None,
+        on_data: Optional[Callable[[], None]] = None,
+    ):
+        self.fd = fd
+        self.limit = limit
+        self.on_data = on_data
+        self.size = 0
+        self.done = False
+        self.full = False
+        self.error: Optional[OSError] = None
+        out, self.path = tempfile.mkstemp(prefix="hfv-stdin-", dir=directory)
+        self._out = os.fdopen(out, "wb", buffering=0)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> threading.Thread:
+        self._thread = threading.Thread(target=self.run, daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def close(self) -> None:
+        """Stop reading and remove the file"""
+        self.stop()
+        if self._thread is not None:
+            self._thread.join(2 * POLL_INTERVAL)
+        self._out.close()
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+    def run(self) -> None:
+        """Copy the stream until its end, the limit or stop"""
+        try:
+            while not self._stop.is_set():
+                size = READ_SIZE
+                if self.limit is not None:
+                    if self.size >= self.limit:
+                        self.full = True
+                        break
+                    size = min(size, self.limit - self.size)
+                readable, _, _ = select.select([self.fd], [], [], POLL_INTERVAL)
+                if not readable:
+                    continue
+                data = memoryview(os.read(self.fd, size))
+                if not data:
+                    break
+                length = len(data)
+                while data:
+                    data = data[self._out.write(data) :]
+                self.size += length
+                if self.on_data is not None:
+                    self.on_data()
+        except OSError as e:
+            self.error = e
+        finally:
+            self.done = True
+            if self.on_data is not None:
+                self.on_data()
+
+    def status(self) -> str:
+        """Return a short description of the state of the reader"""
+        if self.error is not None:
+            return f"read error: {self.error.strerror}"
+        if self.full:
+            return f"limit of {self.size >> 20} MiB reached"
+        if self.done:
+            return "complete"
+        return "reading"
@@ -0,0 +1,127 @@
+"""Latency histograms and counters of the control's hot paths"""
+
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Generator, List, Optional
+
+# Bucket i counts the samples below 2**i microseconds:
+BUCKETS = 32
+
+
+class Timing:
+    """Histogram of the durations of an operation
+
+    The buckets are powers of two in microseconds, so the memory used
+    doesn't depend on the number of samples; the percentiles are the
+    upper bounds of their buckets.
+    """
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets: List[int] = [0] * BUCKETS
+
+    def record(self, seconds: float) -> None:
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        bucket = min(int(seconds * 1e6).bit_length(), BUCKETS - 1)
+        self.buckets[bucket] += 1
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, percent: float) -> float:
+        """Return the upper bound of the samples under percent, in seconds"""
+        target = self.count * percent / 100
+        seen = 0
+        for bucket, count in enumerate(self.buckets):
+            seen += count
+            if count and seen >= target:
+                return min((1 << bucket) / 1e6, self.max)
+        return self.max
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "total_ms": self.total * 1e3,
+            "mean_ms": self.mean * 1e3,
+            "p50_ms": self.percentile(50) * 1e3,
+            "p99_ms": self.percentile(99) * 1e3,
+            "max_ms": self.max * 1e3,
+            "histogram_us": {
+                f"<{1 << bucket}": count
+                for bucket, count in enumerate(self.buckets)
+                if count
+            },
+        }
+
+
+class Stats:
+    """Timings and counters collected by a control when it has stats
+
+    Counters are incremented by the control; watched values are read
+    from a callable when the stats are reported.
+    """
+
+    def __init__(self) -> None:
+        self.timings: Dict[str, Timing] = {}
+        self.counters: Dict[str, int] = {}
+        self._watched: Dict[str, Callable[[], int]] = {}
+
+    def record(self, name: str, seconds: float) -> None:
+        timing = self.timings.get(name)
+        if timing is None:
+            timing = self.timings[name] = Timing()
+        timing.record(seconds)
+
+    @contextmanager
+    def timer(self, name: str) -> Generator[None, None, None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def count(self, name: str, n: int = 1) -> None:
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def watch(self, name: str, get: Callable[[], int]) -> None:
+        self._watched[name] = get
+
+    def values(self) -> Dict[str, int]:
+        """Return the counters and the current watched values"""
+        values = dict(self.counters)
+        for name, get in self._watched.items():
+            values[name] = get()
+        return values
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "timings": {name: t.to_dict() for name, t in self.timings.items()},
+            "counters": self.values(),
+        }
+
+    def hit_rate(self, prefix: str) -> Optional[float]:
+        """Return prefix_hits / (prefix_hits + prefix_misses), if known"""
+        values = self.values()
+        hits = values.get(f"{prefix}_hits", 0)
+        total = hits + values.get(f"{prefix}_misses", 0)
+        return hits / total if total else None
+
+    def summary(self) -> str:
+        """Return a one-line summary, for a status bar"""
+        parts = []
+        for name, timing in self.timings.items():
+            parts.append(
+                f"{name} {timing.mean * 1e3:.1f}/{timing.percentile(99) * 1e3:.1f}ms"
+            )
+        read = self.counters.get("bytes_read")
+        if read is not None:
+            parts.append(f"read {read >> 10} KiB")
+        rate = self.hit_rate("line_cache")
+        if rate is not None:
+            parts.append(f"cache {rate:.0%}")
+        return " | ".join(parts)
@@ -0,0 +1,49 @@
+"""Status bar with the stats of the control, for the scripts"""
+
+import time
+from typing import Optional
+
+from prompt_toolkit import Application
+from prompt_toolkit.filters import Condition
+from prompt_toolkit.layout.containers import ConditionalContainer, Container, Window
+from prompt_toolkit.layout.controls import FormattedTextControl
+
+from .stats import Stats
+
+
+class StatsWidget:
+    """Status bar with the stats summary, shown with F12
+
+    Also times each keypress until the screen is rendered again.
+    """
+
+    def __init__(self, stats: Stats):
+        self.stats = stats
+        self.visible = False
+        self._pressed: Optional[float] = None
+        self.window = Window(
+            FormattedTextControl(lambda: [("reverse", self.stats.summary())]),
+            height=1,
+        )
+        self.container = ConditionalContainer(
+            self.window, filter=Condition(lambda: self.visible)
+        )
+
+    def attach(self, app: "Application[None]") -> None:
+        app.key_processor.before_key_press += self._key_press
+        app.after_render += self._rendered
+
+    def toggle(self) -> None:
+        self.visible = not self.visible
+
+    def _key_press(self, _: object) -> None:
+        if self._pressed is None:
+            self._pressed = time.perf_counter()
+
+    def _rendered(self, _: object) -> None:
+        if self._pressed is not None:
+            self.stats.record("keypress", time.perf_counter() - self._pressed)
+            self._pressed = None
+
+    def __pt_container__(self) -> Container:
+        return self.container
@@ -0,0 +1,208 @@
+"""Timestamps of log lines, and the bisection of sorted logs by time"""
+
+import re
+from datetime import datetime
+from typing import List, Optional, Sequence, Tuple
+
+from .lineindex import FileBuffer
+
+# Only the start of each line is searched for its timestamp:
+TIMESTAMP_SPAN = 256
+# Lines without a timestamp skipped by a probe before it gives up:
+MAX_UNTIMED_LINES = 64
+# The bisection stops when the range is this small, and scans it:
+MIN_PROBE_RANGE = 4096
+
+_DIRECTIVES = {
+    "Y": rb"\d{4}",
+    "y": rb"\d{2}",
+    "m": rb"\d{1,2}",
+    "d": rb"[ \d]?\d",
+    "H": rb"\d{1,2}",
+    "I": rb"\d{1,2}",
+    "M": rb"\d{2}",
+    "S": rb"\d{2}",
+    "f": rb"\d{1,6}",
+    "j": rb"\d{1,3}",
+    "b": rb"[A-Za-z]{3}",
+    "a": rb"[A-Za-z]{3}",
+    "p": rb"[AaPp][Mm]",
+    "z": rb"(?:Z|[+-]\d{2}:?\d{2})",
+    "%": rb"%",
+}
+
+
+class TimestampFormat:
+    """A strptime format, and the regex that finds it in a line
+
+    The regex is derived from the format when not given; when it has
+    groups, the first one is the text parsed. Time zones are dropped:
+    the lines of a file are assumed to be in the same one.
+    """
+
+    def __init__(self, fmt: str, regex: Optional[bytes] = None):
+        self.fmt = fmt
+        self.regex = re.compile(regex or self.format_regex(fmt))
+        self.has_year = any(d in fmt for d in ("%Y", "%y"))
+        self.has_date = self.has_year or any(d in fmt for d in ("%m", "%b", "%d"))
+
+    @staticmethod
+    def format_regex(fmt: str) -> bytes:
+        """Return a regex that matches the text of the strptime format"""
+        parts: List[bytes] = []
+        i = 0
+        while i < len(fmt):
+            if fmt[i] == "%" and i + 1 < len(fmt):
+                parts.append(_DIRECTIVES.get(fmt[i + 1], rb"\S+"))
+                i += 2
+            else:
+                parts.append(re.escape(fmt[i].encode()))
+                i += 1
+        return b"".join(parts)
+
+    def parse(self, line: bytes) -> Optional[datetime]:
+        """Return the timestamp of the line, or None if it has none"""
+        m = self.regex.search(line)
+        if m is None:
+            return None
+        text = m.group(1) if self.regex.groups else m.group(0)
+        try:
+            when = datetime.strptime(text.decode("ascii", "replace"), self.fmt)
+        except ValueError:
+            return None
+        return when.replace(tzinfo=None)
+
+
+# Tried in order; the first one found in a line is used for the file:
+DEFAULT_FORMATS = [
+    TimestampFormat("%Y-%m-%dT%H:%M:%S"),
+    TimestampFormat("%Y-%m-%d %H:%M:%S"),
+    TimestampFormat("%Y/%m/%d %H:%M:%S"),
+    TimestampFormat("%d/%b/%Y:%H:%M:%S"),
+    TimestampFormat("%b %d %H:%M:%S"),
+    TimestampFormat("%H:%M:%S"),
+]
+
+
+class Timestamps:
+    """Reads the timestamps of the lines of buf
+
+    The format is detected on the first line with a timestamp, and used
+    for the rest of the file.
+    """
+
+    def __init__(
+        self,
+        buf: FileBuffer,
+        formats: Sequence[TimestampFormat] = DEFAULT_FORMATS,
+        span: int = TIMESTAMP_SPAN,
+    ):
+        self._buf = buf
+        self._size = len(buf)
+        self.formats = formats
+        self.format: Optional[TimestampFormat] = None
+        self.span = span
+        self.probes = 0
+
+    def line_end(self, start: int) -> int:
+        newline = self._buf.find(b"\n", start)
+        return self._size if newline == -1 else newline + 1
+
+    def line_start_after(self, offset: int) -> int:
+        """Return offset if a line starts there, or where the next one starts"""
+        if offset <= 0:
+            return 0
+        if offset >= self._size or self._buf[offset - 1 : offset] == b"\n":
+            return min(offset, self._size)
+        return self.line_end(offset)
+
+    def parse(self, line: bytes) -> Optional[datetime]:
+        if self.format is not None:
+            return self.format.parse(line)
+        for fmt in self.formats:
+            when = fmt.parse(line)
+            if when is not None:
+                self.format = fmt
+                return when
+        return None
+
+    def at(self, start: int) -> Optional[datetime]:
+        """Return the timestamp of the line that starts at start"""
+        self.probes += 1
+        line = self._buf[start : start + self.span]
+        return self.parse(line.split(b"\n", 1)[0])
+
+    def next_timed(
+        self, start: int, end: int, lines: Optional[int] = MAX_UNTIMED_LINES
+    ) -> Tuple[int, Optional[datetime]]:
+        """Return the start and the time of the first timed line in [start, end)
+
+        Gives up after lines lines without one, if given, returning the
+        start of the next line and None.
+        """
+        while start < end and (lines is None or lines > 0):
+            when = self.at(start)
+            if when is not None:
+                return start, when
+            start = self.line_end(start)
+            if lines is not None:
+                lines -= 1
+        return start, None
+
+    def first(self) -> Optional[datetime]:
+        """Return the first timestamp of the file"""
+        return self.next_timed(0, self._size)[1]
+
+    def complete(self, when: datetime, fmt: TimestampFormat) -> Optional[datetime]:
+        """Fill in the date of when, parsed with fmt, like the file has it
+
+        A time without a date is on the day of the first line; a date
+        without a year is in the year of the first line. The parts that
+        the lines don't have are dropped from when the same way, as
+        strptime leaves them at 1900-01-01 in the lines: a date with a
+        year is compared to syslog lines without one. Returns None if
+        the file has no timestamps, or when has no such date then.
+        """
+        first = self.first()
+        if first is None:
+            return when if fmt.has_year else None
+        assert self.format is not None
+        if fmt.has_year and self.format.has_year:
+            return when
+        if fmt.has_date and self.format.has_date:
+            try:
+                return when.replace(year=first.year)
+            except ValueError:
+                # February 29th, in a year that is not a leap year.
+                return None
+        return datetime.combine(first.date(), when.time())
+
+    def bisect(self, when: datetime, min_range: int = MIN_PROBE_RANGE) -> int:
+        """Return the first line whose timestamp is when or later
+
+        Bisects over the byte offsets, assuming that the timestamps are
+        sorted: each probe is realigned to the next line start, and
+        lines without a timestamp are skipped. Only a few lines are
+        read per probe; a range that looks untimed is treated as later
+        than when. The range left is scanned line by line. If the file
+        is not sorted, the result is one of the places where the time
+        crosses when. Returns the size of the file if there is no such
+        line.
+        """
+        lo, hi = 0, self._size
+        while hi - lo > min_range:
+            mid = self.line_start_after((lo + hi) // 2)
+            if mid >= hi:
+                # A single line is left in the range.
+                break
+            start, found = self.next_timed(mid, hi)
+            if found is not None and found < when:
+                lo = self.line_end(start)
+            else:
+                hi = mid
+        while lo < self._size:
+            start, found = self.next_timed(lo, self._size, None)
+            if found is None or found >= when:
+                return start
+            lo = self.line_end(start)
+        return self._size
@@ -0,0 +1,56 @@
+"""Cache of styled lines for the huge file viewer control"""
+
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from prompt_toolkit.formatted_text import StyleAndTextTuples
+
+LINE_CACHE_BUDGET = 16 * 1024 * 1024
+
+# Rough per-entry overhead of the tuples, list and dict slot, in bytes:
+ENTRY_OVERHEAD = 200
+
+
+class LineCache:
+    """LRU cache of styled lines keyed by the offset where they start
+
+    Each entry also records the offset of the next line, so that a
+    fully cached viewport can be walked without touching the file. The
+    total size of the entries is kept under budget bytes.
+    """
+
+    def __init__(self, budget: int = LINE_CACHE_BUDGET):
+        self.budget = budget
+        self.used = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[int, Tuple[int, StyleAndTextTuples, int]]" = (
+            OrderedDict()
+        )
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, offset: int) -> Optional[Tuple[int, StyleAndTextTuples]]:
+        entry = self._entries.get(offset)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(offset)
+        return entry[0], entry[1]
+
+    def put(self, offset: int, next_offset: int, line: StyleAndTextTuples) -> None:
+        cost = ENTRY_OVERHEAD + sum(len(text) for _, text, *_ in line)
+        old = self._entries.pop(offset, None)
+        if old is not None:
+            self.used -= old[2]
+        self._entries[offset] = (next_offset, line, cost)
+        self.used += cost
+        while self.used > self.budget and self._entries:
+            _, (_, _, evicted) = self._entries.popitem(last=False)
+            self.used -= evicted
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.used = 0
@@ -0,0 +1,86 @@
+"""madvise helpers tests"""
+
+import mmap
+import tempfile
+import unittest
+from typing import List, Optional, Tuple
+from unittest import mock
+
+from pthugefileviewer import advice
+from pthugefileviewer.advice import ScanAdvice, madvise
+
+Call = Tuple[str, int, Optional[int]]
+
+
+class TestMadvise(unittest.TestCase):
+    def setUp(self) -> None:
+        fd = tempfile.TemporaryFile()
+        self.addCleanup(fd.close)
+        fd.write(b"x" * 3 * mmap.PAGESIZE)
+        fd.flush()
+        self.mm = mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ)
+        self.addCleanup(self.mm.close)
+
+    def test_madvise(self) -> None:
+        self.assertTrue(madvise(self.mm, "RANDOM"))
+        self.assertTrue(madvise(self.mm, "WILLNEED", 10, mmap.PAGESIZE))
+        self.assertTrue(madvise(self.mm, "DONTNEED", 2 * mmap.PAGESIZE + 1, 10**9))
+
+    def test_nothing(self) -> None:
+        self.assertFalse(madvise(b"abc", "RANDOM"))
+        self.assertFalse(madvise(self.mm, "NOSUCHADVICE"))
+        self.assertFalse(madvise(self.mm, "WILLNEED", len(self.mm)))
+        self.assertFalse(madvise(self.mm, "WILLNEED", 0, 0))
+
+    def record(self, backward: bool, windows: List[Tuple[int, int]]) -> List[Call]:
+        calls: List[Call] = []
+
+        def fake(
+            buf: object, name: str, start: int = 0, length: Optional[int] = None
+        ) -> bool:
+            calls.append((name, start, length))
+            return True
+
+        with mock.patch.object(advice, "madvise", fake):
+            scan = ScanAdvice(self.mm, backward=backward)
+            for start, end in windows:
+                scan.window(start, end)
+            scan.done()
+        return calls
+
+    def test_scan(self) -> None:
+        calls = self.record(False, [(0, 12), (10, 22)])
+        self.assertEqual(
+            calls,
+            [
+                ("SEQUENTIAL", 0, 12),
+                ("WILLNEED", 12, 12),
+                ("SEQUENTIAL", 10, 12),
+                ("WILLNEED", 22, 12),
+                ("DONTNEED", 0, 10),
+                ("RANDOM", 0, 10),
+                ("RANDOM", 10, 12),
+            ],
+        )
+
+    def test_scan_backward(self) -> None:
+        calls = self.record(True, [(20, 30), (8, 22)])
+        self.assertEqual(
+            calls,
+            [
+                ("SEQUENTIAL", 20, 10),
+                ("WILLNEED", 10, 10),
+                ("SEQUENTIAL", 8, 14),
+                ("WILLNEED", 0, 8),
+                ("DONTNEED", 22, 8),
+                ("RANDOM", 22, 8),
+                ("RANDOM", 8, 14),
+            ],
+        )
+
+    def test_scan_bytes(self) -> None:
+        with mock.patch.object(advice, "madvise") as fake:
+            scan = ScanAdvice(b"abc")
+            scan.window(0, 3)
+            scan.done()
+        fake.assert_not_called()
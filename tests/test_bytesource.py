@@ -0,0 +1,153 @@
+"""ByteSource tests"""
+
+import mmap
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from pthugefileviewer import hugefilevieweruicontrol
+from pthugefileviewer.bytesource import ByteSource, PreadSource, WindowedMap
+from pthugefileviewer.hugefilevieweruicontrol import map_file
+
+CONTENTS = b"".join(b"%d\n" % i for i in range(100))
+
+
+class BytesSource(ByteSource):
+    def __init__(self, contents: bytes, block_size: int):
+        ByteSource.__init__(self, len(contents), block_size, cache_blocks=2)
+        self.contents = contents
+        self.reads = 0
+
+    def read_range(self, start: int, end: int) -> bytes:
+        self.reads += 1
+        return self.contents[start:end]
+
+
+class TestByteSource(unittest.TestCase):
+    def setUp(self) -> None:
+        self.source = BytesSource(CONTENTS, 7)
+
+    def test_abstract(self) -> None:
+        with self.assertRaises(TypeError):
+            ByteSource(10)  # type: ignore[abstract]
+
+    def test_slice(self) -> None:
+        for start, stop in [(0, 1), (5, 9), (6, 7), (7, 14), (3, 40), (0, 10000)]:
+            self.assertEqual(self.source[start:stop], CONTENTS[start:stop])
+        self.assertEqual(self.source[-3:], CONTENTS[-3:])
+        self.assertEqual(self.source[50:40], b"")
+        self.assertEqual(len(self.source), len(CONTENTS))
+
+    def test_find(self) -> None:
+        for sub in [b"\n", b"9\n", b"45\n46", b"x"]:
+            for start in [0, 6, 7, 100]:
+                self.assertEqual(
+                    self.source.find(sub, start), CONTENTS.find(sub, start)
+                )
+                self.assertEqual(
+                    self.source.find(sub, start, 150), CONTENTS.find(sub, start, 150)
+                )
+
+    def test_rfind(self) -> None:
+        for sub in [b"\n", b"9\n", b"45\n46", b"x"]:
+            for end in [0, 6, 7, 150, len(CONTENTS)]:
+                self.assertEqual(
+                    self.source.rfind(sub, 0, end), CONTENTS.rfind(sub, 0, end)
+                )
+                self.assertEqual(
+                    self.source.rfind(sub, 20, end), CONTENTS.rfind(sub, 20, end)
+                )
+
+    def test_cache(self) -> None:
+        self.source[0:7]
+        self.source[0:7]
+        self.assertEqual(self.source.reads, 1)
+        self.source[7:21]
+        self.source[0:7]
+        self.assertEqual(self.source.reads, 4)
+
+
+class TestFileSources(unittest.TestCase):
+    def setUp(self) -> None:
+        self.contents = b"".join(
+            b"%d\n" % i for i in range(3 * mmap.ALLOCATIONGRANULARITY // 4)
+        )
+        self.tmp = tempfile.NamedTemporaryFile()
+        self.tmp.write(self.contents)
+        self.tmp.flush()
+        self.fd = open(self.tmp.name, "rb")
+
+    def tearDown(self) -> None:
+        self.fd.close()
+        self.tmp.close()
+
+    def check(self, source: ByteSource) -> None:
+        size = len(self.contents)
+        self.assertEqual(len(source), size)
+        for start in [0, 5, mmap.ALLOCATIONGRANULARITY - 3, size - 10]:
+            self.assertEqual(
+                source[start : start + 10000], self.contents[start : start + 10000]
+            )
+        self.assertEqual(source[:], self.contents)
+        sub = b"\n%d\n" % (size // 5)
+        self.assertEqual(source.find(sub), self.contents.find(sub))
+        self.assertEqual(source.rfind(b"\n1"), self.contents.rfind(b"\n1"))
+
+    def test_windowed_map(self) -> None:
+        source = WindowedMap(
+            self.fd,
+            len(self.contents),
+            segment_size=mmap.ALLOCATIONGRANULARITY,
+            segments=2,
+        )
+        self.assertGreater(len(self.contents), 3 * mmap.ALLOCATIONGRANULARITY)
+        self.check(source)
+        self.assertLessEqual(source.mapped, 2)
+        source.close()
+        self.assertEqual(source.mapped, 0)
+
+    def test_pread(self) -> None:
+        source = PreadSource(self.fd, len(self.contents))
+        self.check(source)
+        source.close()
+
+    def test_map_file_windowed(self) -> None:
+        with mock.patch.object(hugefilevieweruicontrol, "FULL_MAP_LIMIT", 0):
+            source = map_file(self.fd)
+        self.assertIsInstance(source, WindowedMap)
+        assert isinstance(source, WindowedMap)
+        self.check(source)
+        source.close()
+
+    def test_map_file_pread(self) -> None:
+        with mock.patch.object(mmap, "mmap", side_effect=OSError("no mmap")):
+            with mock.patch.object(hugefilevieweruicontrol, "FULL_MAP_LIMIT", 0):
+                source = map_file(self.fd)
+        self.assertIsInstance(source, PreadSource)
+        assert isinstance(source, PreadSource)
+        self.check(source)
+        source.close()
+
+
+class TestMapSpecialFiles(unittest.TestCase):
+    def test_empty(self) -> None:
+        with tempfile.NamedTemporaryFile() as tmp:
+            with open(tmp.name, "rb") as fd:
+                self.assertEqual(map_file(fd), b"")
+
+    def test_pipe(self) -> None:
+        r, w = os.pipe()
+        with os.fdopen(w, "wb") as wfd:
+            wfd.write(b"a\nb\n")
+        # A pipe could be endless; it is not read into memory:
+        with os.fdopen(r, "rb") as fd:
+            with self.assertRaises(OSError):
+                map_file(fd)
+
+    @unittest.skipUnless(os.path.exists("/proc/self/status"), "no /proc")
+    def test_proc(self) -> None:
+        with open("/proc/self/status", "rb") as fd:
+            contents = map_file(fd)
+        assert isinstance(contents, bytes)
+        self.assertIn(b"Name:", contents)
@@ -0,0 +1,225 @@
+"""Compressed file tests"""
+
+import gzip
+import io
+import lzma
+import os
+import struct
+import sys
+import tempfile
+import unittest
+from typing import Optional
+from unittest import mock
+
+from pthugefileviewer.compressed import (
+    CompressedSource,
+    GzipSource,
+    XzSource,
+    ZstdSource,
+    open_compressed,
+)
+from pthugefileviewer.hugefilevieweruicontrol import HugeFileViewerUIControl
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None  # type: ignore[assignment, unused-ignore]
+
+CONTENTS = b"".join(b"%d\n" % i for i in range(20000))
+HALF = len(CONTENTS) // 2
+
+
+class CompressedTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.index_path = os.path.join(self.tmpdir.name, "index")
+
+    def tearDown(self) -> None:
+        self.tmpdir.cleanup()
+
+    def open(self, compressed: bytes) -> io.BufferedReader:
+        path = os.path.join(self.tmpdir.name, "file")
+        with open(path, "wb") as out:
+            out.write(compressed)
+        fd = open(path, "rb")
+        self.addCleanup(fd.close)
+        return fd
+
+    def source(
+        self, compressed: bytes, index_path: Optional[str] = None
+    ) -> Optional[CompressedSource]:
+        source = open_compressed(self.open(compressed), index_path)
+        if source is not None:
+            self.addCleanup(source.close)
+            source.block_size = 1000
+        return source
+
+    def check(self, source: Optional[CompressedSource]) -> None:
+        assert source is not None
+        self.assertEqual(len(source), len(CONTENTS))
+        for start, stop in [(HALF, HALF + 3000), (0, 10), (50000, 60000), (10, 20)]:
+            self.assertEqual(source[start:stop], CONTENTS[start:stop])
+        self.assertEqual(source[-5:], CONTENTS[-5:])
+        offset = CONTENTS.index(b"\n12345\n")
+        self.assertEqual(source.rfind(b"\n", 0, offset + 1), offset)
+
+
+class TestGzip(CompressedTestCase):
+    def test_single(self) -> None:
+        self.check(self.source(gzip.compress(CONTENTS)))
+
+    def test_members(self) -> None:
+        compressed = gzip.compress(CONTENTS[:HALF]) + gzip.compress(CONTENTS[HALF:])
+        source = self.source(compressed + b"\0" * 16)
+        self.check(source)
+        assert isinstance(source, GzipSource)
+        self.assertEqual(len(source.frame_starts()), 2)
+
+    def test_checkpoints(self) -> None:
+        with self.open(gzip.compress(CONTENTS * 8)) as fd:
+            source = GzipSource(fd, spacing=len(CONTENTS))
+        self.addCleanup(source.close)
+        self.assertGreater(len(source.checkpoints), 2)
+        source._size = len(CONTENTS)
+        self.check(source)
+
+    def test_max_checkpoints(self) -> None:
+        with self.open(gzip.compress(CONTENTS * 8)) as fd:
+            source = GzipSource(fd, spacing=len(CONTENTS) // 4, max_checkpoints=5)
+        self.addCleanup(source.close)
+        self.assertLessEqual(len(source.checkpoints), 5)
+        self.assertGreater(source.spacing, len(CONTENTS) // 4)
+        keys = [upos for upos, _ in source.checkpoints]
+        self.assertEqual(list(source._keys), keys)
+        self.assertEqual(keys[0], 0)
+        source._size = len(CONTENTS)
+        self.check(source)
+
+    def test_index(self) -> None:
+        compressed = gzip.compress(CONTENTS[:HALF]) + gzip.compress(CONTENTS[HALF:])
+        fd = self.open(compressed)
+        GzipSource(fd, self.index_path).close()
+        self.assertTrue(os.path.exists(self.index_path))
+        source = GzipSource(fd, self.index_path)
+        self.addCleanup(source.close)
+        self.assertEqual(len(source.checkpoints), 2)
+        self.check(source)
+
+    def test_background(self) -> None:
+        updates = []
+        fd = self.open(gzip.compress(CONTENTS * 8))
+        source = GzipSource(fd, self.index_path, spacing=HALF, background=True)
+        self.addCleanup(source.close)
+        source.on_update = lambda: updates.append(len(source))
+        source.join()
+        self.assertTrue(source.complete)
+        self.assertEqual(len(source), 8 * len(CONTENTS))
+        self.assertEqual(updates[-1], 8 * len(CONTENTS))
+        checkpoints = len(source.checkpoints)
+        self.assertGreater(checkpoints, 2)
+        self.assertEqual(source[-6:], CONTENTS[-6:])
+        # Reopened, the size is known at once and the checkpoints are
+        # recreated in the background:
+        source = GzipSource(fd, self.index_path, spacing=HALF, background=True)
+        self.addCleanup(source.close)
+        self.assertTrue(source.complete)
+        self.assertEqual(len(source), 8 * len(CONTENTS))
+        source.join()
+        self.assertEqual(len(source.checkpoints), checkpoints)
+        keys = [upos for upos, _ in source.checkpoints]
+        self.assertEqual(list(source._keys), sorted(keys))
+
+
+class TestXz(CompressedTestCase):
+    def test_streams(self) -> None:
+        compressed = lzma.compress(CONTENTS[:HALF]) + lzma.compress(CONTENTS[HALF:])
+        source = self.source(compressed)
+        self.check(source)
+        assert isinstance(source, XzSource)
+        self.assertEqual(len(source.frames), 2)
+
+    def test_padding(self) -> None:
+        self.check(self.source(lzma.compress(CONTENTS) + b"\0" * 8))
+
+
+@unittest.skipIf(zstandard is None, "zstandard is not installed")
+class TestZstd(CompressedTestCase):
+    def test_frame(self) -> None:
+        fd = self.open(zstandard.ZstdCompressor().compress(CONTENTS))
+        ZstdSource(fd, self.index_path).close()
+        self.assertTrue(os.path.exists(self.index_path))
+        source = ZstdSource(fd, self.index_path)
+        self.addCleanup(source.close)
+        self.check(source)
+
+    def test_background(self) -> None:
+        fd = self.open(zstandard.ZstdCompressor().compress(CONTENTS))
+        source = ZstdSource(fd, self.index_path, background=True)
+        self.addCleanup(source.close)
+        source.join()
+        self.assertTrue(source.complete)
+        self.assertTrue(os.path.exists(self.index_path))
+        self.check(source)
+
+    def test_invalid(self) -> None:
+        fd = self.open(b"\x28\xb5\x2f\xfd" + b"not zstd\n" * 10)
+        with self.assertRaises(ValueError):
+            ZstdSource(fd, background=True)
+
+    def test_seekable(self) -> None:
+        compressor = zstandard.ZstdCompressor()
+        frames = []
+        table = b""
+        for start in range(0, len(CONTENTS), 10000):
+            frame = compressor.compress(CONTENTS[start : start + 10000])
+            frames.append(frame)
+            table += struct.pack("<II", len(frame), len(CONTENTS[start:][:10000]))
+        table += struct.pack("<IBI", len(frames), 0, 0x8F92EAB1)
+        skippable = struct.pack("<II", 0x184D2A5E, len(table)) + table
+        source = self.source(b"".join(frames) + skippable)
+        self.check(source)
+        assert isinstance(source, ZstdSource)
+        self.assertEqual(len(source.frames), len(frames))
+
+
+class TestControl(CompressedTestCase):
+    def test_plain(self) -> None:
+        self.assertEqual(self.source(CONTENTS), None)
+
+    def test_view(self) -> None:
+        with self.open(gzip.compress(CONTENTS)) as fd:
+            control = HugeFileViewerUIControl(fd)
+        self.addCleanup(control.close)
+        assert isinstance(control._mm, GzipSource)
+        control._mm.join()
+        control.check_size()
+        self.assertEqual(control.size, len(CONTENTS))
+        control.height = 3
+        control.go_line(12346)
+        self.assertEqual(list(control.get_lines()), [b"12345", b"12346", b"12347"])
+        control.go_bottom()
+        self.assertEqual(list(control.get_lines()), [b"19997", b"19998", b"19999"])
+
+    def test_not_gzip(self) -> None:
+        contents = b"\x1f\x8b" + b"not gzip\n" * 10
+        with self.assertLogs("pthugefileviewer", "WARNING"):
+            with self.open(contents) as fd:
+                control = HugeFileViewerUIControl(fd)
+        self.addCleanup(control.close)
+        self.assertEqual(control.size, len(contents))
+
+    def test_zstd_missing(self) -> None:
+        # A seekable zstd file, with made up frames and its seek table:
+        frames = b"\x28\xb5\x2f\xfd" + b"frame\n" * 10
+        table = struct.pack("<II", len(frames), 1000)
+        table += struct.pack("<IBI", 1, 0, 0x8F92EAB1)
+        contents = frames + struct.pack("<II", 0x184D2A5E, len(table)) + table
+        with mock.patch.dict(sys.modules, {"zstandard": None}):
+            with self.assertLogs("pthugefileviewer", "WARNING"):
+                with self.open(contents) as fd:
+                    control = HugeFileViewerUIControl(fd)
+        self.addCleanup(control.close)
+        # Shown as is:
+        self.assertEqual(control.size, len(contents))
+        control.height = 2
+        self.assertEqual(list(control.get_lines())[1], b"frame")
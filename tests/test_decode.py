@@ -0,0 +1,80 @@
+"""Decoder tests"""
+
+import codecs
+import unittest
+
+from pthugefileviewer.decode import Decoder, detect_encoding
+
+
+class TestDetect(unittest.TestCase):
+    def test_bom(self) -> None:
+        self.assertEqual(detect_encoding(codecs.BOM_UTF16_LE + b"a\0"), "utf-16-le")
+        self.assertEqual(detect_encoding(codecs.BOM_UTF16_BE + b"\0a"), "utf-16-be")
+        self.assertEqual(detect_encoding(codecs.BOM_UTF8 + b"a"), "utf-8")
+        self.assertEqual(detect_encoding(b"abc"), "utf-8")
+        self.assertEqual(detect_encoding(b"", "latin-1"), "latin-1")
+
+
+class TestDecodeLines(unittest.TestCase):
+    def test_ascii(self) -> None:
+        decoder = Decoder()
+        self.assertEqual(decoder.decode_lines([b"abc", b"", b"d"]), ["abc", "", "d"])
+        self.assertEqual(decoder.decode_lines([]), [])
+
+    def test_invalid(self) -> None:
+        decoder = Decoder()
+        self.assertEqual(decoder.decode_lines([b"a\xe9", b"b"]), ["a�", "b"])
+
+    def test_latin1(self) -> None:
+        decoder = Decoder("latin-1")
+        self.assertEqual(decoder.decode_lines([b"a\xe9", b"b"]), ["aé", "b"])
+
+    def test_utf16(self) -> None:
+        decoder = Decoder("utf-16")
+        self.assertEqual(decoder.encoding, "utf-16-le")
+        line = codecs.BOM_UTF16_LE + "aé\r\n".encode("utf-16-le")
+        self.assertEqual(decoder.decode_lines([line]), ["aé"])
+        self.assertEqual(Decoder("utf-16-be").decode(b"\0a\0"), "a")
+
+
+class TestCharStart(unittest.TestCase):
+    def test_utf8(self) -> None:
+        data = "aé€".encode("utf-8")
+        decoder = Decoder()
+        self.assertEqual(
+            [decoder.char_start(data, i) for i in range(7)], [0, 1, 3, 3, 6, 6, 6]
+        )
+
+    def test_utf16(self) -> None:
+        data = "a\U0001f600b".encode("utf-16-le")
+        decoder = Decoder("utf-16-le")
+        self.assertEqual(
+            [decoder.char_start(data, i) for i in range(8)], [0, 2, 2, 6, 6, 6, 6, 8]
+        )
+
+    def test_latin1(self) -> None:
+        decoder = Decoder("latin-1")
+        self.assertEqual(decoder.char_start(b"\xe9\xe9", 1), 1)
+
+
+class TestPage(unittest.TestCase):
+    def test_ascii(self) -> None:
+        text = Decoder().page(b"abc\ndef")
+        self.assertEqual(text(4, 7, 5, 7), "ef")
+
+    def test_utf8(self) -> None:
+        contents = "aé\n€b".encode("utf-8")
+        text = Decoder().page(contents)
+        # A character cut by an edge goes to the part where it starts:
+        self.assertEqual(text(0, 3, 0, 2), "aé")
+        self.assertEqual(text(0, 3, 2, 3), "")
+        self.assertEqual(text(4, 8, 4, 5), "€")
+        self.assertEqual(text(4, 8, 5, 8), "b")
+
+    def test_utf16(self) -> None:
+        contents = "ab\r".encode("utf-16-be")
+        text = Decoder("utf-16-be").page(contents)
+        self.assertEqual(text(0, 6, 0, 1), "a")
+        self.assertEqual(text(0, 6, 1, 3), "b")
+        # The newline is stripped from the end of the line:
+        self.assertEqual(text(0, 6, 3, 6), "")
@@ -0,0 +1,151 @@
+"""Export tests"""
+
+import errno
+import io
+import os
+import re
+import tempfile
+import threading
+import unittest
+from typing import List
+from unittest import mock
+
+from pthugefileviewer import export
+from pthugefileviewer.export import copy_range, unused_path, write_matching_lines
+from pthugefileviewer.hugefilevieweruicontrol import (
+    HugeFileViewerRegexUIControl,
+    HugeFileViewerUIControl,
+)
+from pthugefileviewer.search import SearchCancelled
+
+CONTENTS = b"".join(b"line %d\n" % i for i in range(1000))
+
+
+class TestCopyRange(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.src = os.path.join(self.tmpdir.name, "src")
+        self.dst = os.path.join(self.tmpdir.name, "dst")
+        with open(self.src, "wb") as fd:
+            fd.write(CONTENTS)
+
+    def tearDown(self) -> None:
+        self.tmpdir.cleanup()
+
+    def copy(self, start: int, end: int, chunk: int = 1000) -> bytes:
+        positions: List[int] = []
+        with open(self.src, "rb") as src, open(self.dst, "wb") as dst:
+            dst.write(b">")
+            dst.flush()
+            copied = copy_range(
+                src.fileno(), dst.fileno(), start, end, positions.append, chunk=chunk
+            )
+        self.assertEqual(positions[-1:], [start + copied] if copied else [])
+        with open(self.dst, "rb") as fd:
+            contents = fd.read()
+        self.assertEqual(contents[:1], b">")
+        self.assertEqual(len(contents), copied + 1)
+        return contents[1:]
+
+    def test_copy(self) -> None:
+        self.assertEqual(self.copy(10, 5000), CONTENTS[10:5000])
+        self.assertEqual(self.copy(len(CONTENTS) - 5, 10**9), CONTENTS[-5:])
+
+    def test_fallbacks(self) -> None:
+        unsupported = OSError(errno.EXDEV, "cross-device")
+        with mock.patch.object(export, "_copy_file_range", side_effect=unsupported):
+            self.assertEqual(self.copy(3, 3000), CONTENTS[3:3000])
+            with mock.patch.object(export, "_sendfile", side_effect=unsupported):
+                self.assertEqual(self.copy(3, 3000), CONTENTS[3:3000])
+
+    def test_cancel(self) -> None:
+        cancel = threading.Event()
+        cancel.set()
+        with open(self.src, "rb") as src, open(self.dst, "wb") as dst:
+            with self.assertRaises(SearchCancelled):
+                copy_range(src.fileno(), dst.fileno(), 0, 100, cancel=cancel)
+
+    def test_unused_path(self) -> None:
+        self.assertEqual(unused_path(self.dst), self.dst)
+        self.assertEqual(unused_path(self.src), self.src + ".1")
+
+
+class TestMatchingLines(unittest.TestCase):
+    def test_lines(self) -> None:
+        out = io.BytesIO()
+        lines = write_matching_lines(
+            CONTENTS + b"line 7 last", re.compile(rb"7\b|9"), out, chunk_size=100
+        )
+        expected = [
+            line
+            for line in (CONTENTS + b"line 7 last\n").splitlines(keepends=True)
+            if re.search(rb"7\b|9", line)
+        ]
+        self.assertEqual(out.getvalue(), b"".join(expected))
+        self.assertEqual(lines, len(expected))
+
+
+class TestControlExport(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "log")
+        self.out = os.path.join(self.tmpdir.name, "out")
+        with open(self.path, "wb") as fd:
+            fd.write(CONTENTS)
+        with open(self.path, "rb") as fd:
+            self.control = HugeFileViewerRegexUIControl(fd)
+        self.control.height = 3
+
+    def tearDown(self) -> None:
+        self.tmpdir.cleanup()
+
+    def read_out(self) -> bytes:
+        with open(self.out, "rb") as fd:
+            return fd.read()
+
+    def test_marked_range(self) -> None:
+        self.assertIsNone(self.control.marked_range())
+        self.control.go_down(10)
+        self.control.set_mark()
+        self.control.go_down(5)
+        marked = self.control.marked_range()
+        assert marked is not None
+        self.assertEqual(
+            CONTENTS[marked[0] : marked[1]],
+            b"".join(b"line %d\n" % i for i in range(10, 18)),
+        )
+        self.control.go_up(15)
+        marked = self.control.marked_range()
+        assert marked is not None
+        self.assertEqual(CONTENTS[marked[0] : marked[1]], CONTENTS[: marked[1]])
+        self.assertTrue(CONTENTS[: marked[1]].endswith(b"line 10\n"))
+
+    def test_export_range(self) -> None:
+        self.assertEqual(self.control.export_range(self.out, 7, 5000), 4993)
+        self.assertEqual(self.read_out(), CONTENTS[7:5000])
+
+    def test_export_range_buffer(self) -> None:
+        with tempfile.TemporaryFile() as fd:
+            fd.write(CONTENTS)
+            fd.flush()
+            control = HugeFileViewerUIControl(fd)
+        self.assertIsNone(control.path)
+        self.assertEqual(control.export_range(self.out, 7, 5000), 4993)
+        self.assertEqual(self.read_out(), CONTENTS[7:5000])
+
+    def test_export_matching_lines(self) -> None:
+        with self.assertRaises(ValueError):
+            self.control.export_matching_lines(self.out)
+        self.control.use_regex(re.compile(rb"99"))
+        self.assertEqual(self.control.export_matching_lines(self.out), 19)
+        self.assertTrue(self.read_out().startswith(b"line 99\nline 199\n"))
+
+    def test_cancel(self) -> None:
+        self.control.use_regex(re.compile(rb"99"))
+        cancel = threading.Event()
+        cancel.set()
+        with self.assertRaises(SearchCancelled):
+            self.control.export_matching_lines(self.out, cancel=cancel)
+        with self.assertRaises(SearchCancelled):
+            self.control.export_range(self.out, 0, 100, cancel=cancel)
+        self.assertFalse(os.path.exists(self.out))
@@ -0,0 +1,140 @@
+"""FileFollower and remap tests"""
+
+import os
+import re
+import tempfile
+import threading
+import unittest
+from typing import List
+from unittest import mock
+
+from pthugefileviewer import hugefilevieweruicontrol
+from pthugefileviewer.follow import FileFollower, inotify_watch
+from pthugefileviewer.hugefilevieweruicontrol import (
+    HugeFileViewerRegexUIControl,
+    HugeFileViewerUIControl,
+)
+
+
+def lines(start: int, end: int) -> bytes:
+    return b"".join(b"%d\n" % i for i in range(start, end))
+
+
+class TestFollow(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "log")
+        self.write(lines(0, 10))
+        with open(self.path, "rb") as fd:
+            self.control = HugeFileViewerUIControl(fd)
+        self.control.height = 3
+        self.follower = FileFollower(self.control, self.path)
+
+    def tearDown(self) -> None:
+        self.tmpdir.cleanup()
+
+    def write(self, contents: bytes, mode: str = "wb") -> None:
+        with open(self.path, mode) as fd:
+            fd.write(contents)
+
+    def get_lines(self) -> List[bytes]:
+        return list(self.control.get_lines())
+
+    def test_unchanged(self) -> None:
+        self.assertFalse(self.follower.check())
+
+    def test_grow_at_bottom(self) -> None:
+        self.control.go_bottom()
+        self.write(lines(10, 20), "ab")
+        self.assertTrue(self.follower.check())
+        self.assertEqual(self.get_lines(), [b"17", b"18", b"19"])
+
+    def test_grow_not_at_bottom(self) -> None:
+        self.control.go_down(2)
+        self.write(lines(10, 20), "ab")
+        self.assertTrue(self.follower.check())
+        self.assertEqual(self.get_lines(), [b"2", b"3", b"4"])
+        self.control.go_bottom()
+        self.assertEqual(self.get_lines(), [b"17", b"18", b"19"])
+
+    def test_grow_partial_line(self) -> None:
+        self.control.go_bottom()
+        self.write(b"10", "ab")
+        self.follower.check()
+        self.assertEqual(self.get_lines(), [b"8", b"9", b"10"])
+        self.write(b"0\n", "ab")
+        self.follower.check()
+        self.assertEqual(self.get_lines(), [b"8", b"9", b"100"])
+
+    def test_truncate(self) -> None:
+        self.control.go_bottom()
+        self.write(lines(0, 5))
+        self.assertTrue(self.follower.check())
+        self.assertEqual(self.get_lines(), [b"2", b"3", b"4"])
+        self.write(b"")
+        self.assertTrue(self.follower.check())
+        self.assertEqual(self.get_lines(), [])
+
+    def test_rotate(self) -> None:
+        self.control.go_down(2)
+        os.rename(self.path, self.path + ".1")
+        self.assertFalse(self.follower.check())
+        self.write(lines(100, 120))
+        self.assertTrue(self.follower.check())
+        self.assertEqual(self.get_lines(), [b"100", b"101", b"102"])
+
+    def test_line_index(self) -> None:
+        thread = self.control.start_line_index()
+        assert thread is not None
+        thread.join()
+        self.write(lines(10, 20), "ab")
+        self.follower.check()
+        assert self.control._line_index_thread is not None
+        self.control._line_index_thread.join()
+        self.assertEqual(self.control.line_count, 20)
+
+    def test_matches(self) -> None:
+        with open(self.path, "rb") as fd:
+            control = HugeFileViewerRegexUIControl(fd)
+        control.height = 3
+        follower = FileFollower(control, self.path)
+        control.use_regex(re.compile(b"1"))
+        control.filtered = True
+        updated = threading.Event()
+        thread = control.start_match_index(on_update=updated.set)
+        assert thread is not None
+        thread.join()
+        index = control.match_index
+        matched_lines = control.matched_lines
+        self.write(lines(10, 20), "ab")
+        updated.clear()
+        self.assertTrue(follower.check())
+        # Kept, and extended to the new size:
+        self.assertIs(control.match_index, index)
+        self.assertIs(control.matched_lines, matched_lines)
+        self.assertTrue(updated.wait(5))
+        self.assertEqual(control.match_number(), (None, 12))
+        control.go_top()
+        self.assertEqual(list(control.get_lines()), [b"1", b"10", b"11"])
+
+    @unittest.skipUnless(os.path.isdir("/proc/self/fd"), "needs /proc/self/fd")
+    def test_remap_fds(self) -> None:
+        # Mapped in segments, with a descriptor of its own:
+        with mock.patch.object(hugefilevieweruicontrol, "FULL_MAP_LIMIT", 1):
+            with open(self.path, "rb") as fd:
+                control = HugeFileViewerUIControl(fd)
+            follower = FileFollower(control, self.path)
+            fds = len(os.listdir("/proc/self/fd"))
+            for i in range(20):
+                self.write(b"%d\n" % i, "ab")
+                self.assertTrue(follower.check())
+            self.assertEqual(len(os.listdir("/proc/self/fd")), fds)
+        control.close()
+
+    def test_inotify(self) -> None:
+        fd = inotify_watch(self.path)
+        if fd is None:
+            self.skipTest("inotify not available")
+        self.write(b"10\n", "ab")
+        self.assertTrue(os.read(fd, 4096))
+        os.close(fd)
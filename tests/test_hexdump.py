@@ -0,0 +1,42 @@
+"""hex_row tests"""
+
+import unittest
+
+from prompt_toolkit.formatted_text import StyleAndTextTuples
+from pthugefileviewer.hexdump import hex_row
+
+
+def text(row: StyleAndTextTuples) -> str:
+    return "".join(fragment[1] for fragment in row)
+
+
+class TestHexRow(unittest.TestCase):
+    def test_row(self) -> None:
+        row = hex_row(b"ab\x00\xff", 4)
+        self.assertEqual(text(row), "61 62 00 ff  ab..")
+
+    def test_short_row(self) -> None:
+        row = hex_row(b"a", 3)
+        self.assertEqual(text(row), "61        a")
+        self.assertEqual(len(text(hex_row(b"abc", 3))), len(text(row)) + 2)
+
+    def test_spans(self) -> None:
+        row = hex_row(b"abcd", 4, [(1, 3, "class:match")])
+        self.assertEqual(
+            row,
+            [
+                ("", "61 "),
+                ("class:match", "62 63"),
+                ("", " 64  "),
+                ("", "a"),
+                ("class:match", "bc"),
+                ("", "d"),
+            ],
+        )
+
+    def test_spans_clipped(self) -> None:
+        # Spans of a match that starts before the row and ends after it:
+        row = hex_row(b"ab", 2, [(-1, 3, "class:match")])
+        self.assertEqual(
+            row, [("class:match", "61 62"), ("", "  "), ("class:match", "ab")]
+        )
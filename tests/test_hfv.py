@@ -1,10 +1,18 @@
 """HugeFileViewerUIControl tests"""
 
+import mmap
 import tempfile
 import unittest
 from typing import List
+from unittest import mock
 
+from prompt_toolkit.data_structures import Point
+from prompt_toolkit.formatted_text import StyleAndTextTuples
+from prompt_toolkit.mouse_events import MouseButton, MouseEvent, MouseEventType
+from pthugefileviewer import hugefilevieweruicontrol
 from pthugefileviewer.hugefilevieweruicontrol import HugeFileViewerUIControl
+from pthugefileviewer.margins import LineNumberMargin, OffsetMargin
+from pthugefileviewer.scrollbar import ScrollbarControl
 
 
 def tobytes(lines: List[str]) -> List[bytes]:
@@ -197,3 +205,249 @@ class TestNewlineTopBottom(unittest.TestCase, Base):
         self.assertEqual(get_lines(control), [b"3", b"4", b"5"])
         control.go_bottom()
         self.assertEqual(get_lines(control), [b"6", b"", b""])
+
+
+class TestLines(unittest.TestCase, Base):
+    def test_go_line(self) -> None:
+        control = self.controlNums(3, 12)
+        control.go_line(5)
+        self.assertEqual(get_lines(control), [b"4", b"5", b"6"])
+        control.go_line(12)
+        self.assertEqual(get_lines(control), [b"9", b"10", b"11"])
+        control.go_line(1)
+        self.assertEqual(get_lines(control), [b"0", b"1", b"2"])
+
+    def test_go_line_estimate(self) -> None:
+        control = self.controlNums(3, 1000)
+        with mock.patch.object(hugefilevieweruicontrol, "GO_LINE_SCAN", 16):
+            self.assertFalse(control.go_line(501))
+        # Lines of 2 to 4 bytes, estimated from the first ones:
+        self.assertLess(abs(int(get_lines(control)[0]) - 500), 200)
+        self.assertTrue(control.go_line(5))
+        self.assertEqual(get_lines(control), [b"4", b"5", b"6"])
+
+    def test_line_number(self) -> None:
+        control = self.controlNums(3, 12)
+        self.assertEqual(control.line_number(), None)
+        thread = control.start_line_index()
+        assert thread is not None
+        thread.join()
+        self.assertEqual(control.line_count, 12)
+        control.go_down(3)
+        self.assertEqual(control.line_number(), 4)
+
+
+class TestPercent(unittest.TestCase, Base):
+    def test_go_percent(self) -> None:
+        control = self.controlNums(3, 100, 1)
+        control.go_percent(50)
+        self.assertEqual(get_lines(control), [b"51", b"52", b"53"])
+        control.go_percent(0)
+        self.assertEqual(get_lines(control), [b"0", b"1", b"2"])
+        control.go_percent(100)
+        self.assertEqual(get_lines(control), [b"97", b"98", b"99"])
+
+    def test_long_lines(self) -> None:
+        long_line = b"x" * (3 * mmap.PAGESIZE + 5)
+        contents = b"a\n" + long_line + b"\nb\n" + long_line + b"\n"
+        control = self.controlFor(2, contents)
+        control.go_percent(30)
+        self.assertEqual(get_lines(control), [long_line[: control.row_width], b"b"])
+        self.assertEqual(
+            control.find_prev_newline(len(contents) - 1), 4 + len(long_line)
+        )
+        self.assertEqual(control.find_prev_newline(1), -1)
+
+    def test_scrollbar(self) -> None:
+        control = self.controlNums(10, 100, 1)
+        scrollbar = ScrollbarControl(control)
+        self.assertEqual(scrollbar.thumb(10), range(0, 1))
+        scrollbar.create_content(1, 10)
+        scrollbar.mouse_handler(
+            MouseEvent(
+                Point(0, 9),
+                MouseEventType.MOUSE_DOWN,
+                MouseButton.LEFT,
+                frozenset(),
+            )
+        )
+        self.assertEqual(get_lines(control)[-1], b"99")
+        self.assertEqual(scrollbar.thumb(10), range(8, 10))
+
+
+class TestLongLines(unittest.TestCase, Base):
+    def control(self) -> HugeFileViewerUIControl:
+        control = self.controlLines(3, ["a", "0123456789" * 3, "b", "c"], 1)
+        control.width = 8
+        return control
+
+    def test_clip(self) -> None:
+        control = self.control()
+        self.assertEqual(get_lines(control), [b"a", b"01234567", b"b"])
+        control.scroll_right()
+        self.assertEqual(get_lines(control), [b"", b"45678901", b""])
+        control.column = 28
+        self.assertEqual(get_lines(control), [b"", b"89", b""])
+        control.scroll_left(100)
+        self.assertEqual(control.column, 0)
+
+    def test_wrap(self) -> None:
+        control = self.control()
+        control.wrap = True
+        self.assertEqual(get_lines(control), [b"a", b"01234567", b"89012345"])
+        control.go_down(2)
+        self.assertEqual(get_lines(control), [b"89012345", b"67890123", b"456789"])
+        control.go_bottom()
+        self.assertEqual(get_lines(control), [b"456789", b"b", b"c"])
+        control.go_up()
+        self.assertEqual(get_lines(control), [b"67890123", b"456789", b"b"])
+        control.go_line_offset(20)
+        self.assertEqual(get_lines(control)[0], b"67890123")
+        control.wrap = False
+        self.assertEqual(get_lines(control), [b"01234567", b"b", b"c"])
+
+    def test_wrap_exact(self) -> None:
+        control = self.controlLines(2, ["01234567", "b", "c"], 1)
+        control.width = 8
+        control.wrap = True
+        control.go_bottom()
+        self.assertEqual(get_lines(control), [b"b", b"c"])
+        control.go_up()
+        self.assertEqual(get_lines(control), [b"01234567", b"b"])
+        self.assertEqual(control.row_start(8), 0)
+
+    def test_utf8(self) -> None:
+        control = self.controlFor(2, "aé€b\n".encode("utf-8"))
+        control.width = 2
+        self.assertEqual(get_lines(control), ["aé".encode("utf-8")])
+        control.column = 2
+        self.assertEqual(get_lines(control), ["€".encode("utf-8")])
+        control.wrap = True
+        self.assertEqual(
+            [line.decode("utf-8") for line in get_lines(control)], ["aé", "€"]
+        )
+
+    def test_margin(self) -> None:
+        control = self.control()
+        control.start_line_index()
+        assert control.line_index is not None
+        control.line_index.build()
+        control.wrap = True
+        control.go_down()
+        margin = LineNumberMargin(control)
+        fragments = margin.create_margin(None, 3, 3)  # type: ignore
+        self.assertEqual([f[1] for f in fragments[::2]], [" 2 ", "   ", "   "])
+
+
+class TestHexdump(unittest.TestCase, Base):
+    def control(self) -> HugeFileViewerUIControl:
+        control = self.controlFor(2, bytes(range(0x30, 0x30 + 40)))
+        control.hex_width = 8
+        control.hexdump = True
+        return control
+
+    def test_rows(self) -> None:
+        control = self.control()
+        self.assertEqual(get_lines(control), [b"01234567", b"89:;<=>?"])
+        self.assertEqual(control.row_start(13), 8)
+        self.assertEqual(control.row_end(13), 16)
+        control.go_bottom()
+        self.assertEqual(control.offset, 24)
+        self.assertEqual(get_lines(control), [b"HIJKLMNO", b"PQRSTUVW"])
+        control.go_up(2)
+        self.assertEqual(control.offset, 8)
+        control.go_line_offset(35)
+        self.assertEqual(control.offset, 24)
+
+    def test_newlines(self) -> None:
+        # Newlines don't end the rows of a hexdump:
+        control = self.controlLines(2, ["ab", "cd", "ef"])
+        control.hex_width = 4
+        control.hexdump = True
+        self.assertEqual(get_lines(control), [b"ab\nc", b"d\nef"])
+        control.hexdump = False
+        self.assertEqual(get_lines(control), [b"ab", b"cd"])
+
+    def test_style(self) -> None:
+        control = self.control()
+        text = "".join(f[1] for f in control.get_lines_style()[0])
+        self.assertEqual(text, "30 31 32 33 34 35 36 37  01234567")
+
+    def test_margin(self) -> None:
+        control = self.control()
+        control.go_down()
+        control.get_cached_lines()
+        margin = OffsetMargin(control)
+        self.assertEqual(margin.get_width(lambda: None), 10)  # type: ignore
+        fragments = margin.create_margin(None, 10, 2)  # type: ignore
+        self.assertEqual([f[1] for f in fragments[::2]], ["00000008  ", "00000010  "])
+        control.hexdump = False
+        self.assertEqual(margin.get_width(lambda: None), 0)  # type: ignore
+
+
+class CountingControl(HugeFileViewerUIControl):
+    renders = 0
+    styled = 0
+
+    def update_lines(self) -> None:
+        self.renders += 1
+        super().update_lines()
+
+    def style_lines(self, lines: List[bytes]) -> List[StyleAndTextTuples]:
+        self.styled += len(lines)
+        return super().style_lines(lines)
+
+
+class CountingBase:
+    def control(self, height: int) -> CountingControl:
+        with tempfile.TemporaryFile() as fd:
+            fd.write(b"".join(b"%d\n" % i for i in range(1000)))
+            fd.flush()
+            control = CountingControl(fd)
+            control.height = height
+            control.renders = 0
+            control.styled = 0
+            return control
+
+
+class TestRenderOnce(unittest.TestCase, CountingBase):
+    def test_pagedown(self) -> None:
+        control = self.control(200)
+        control.go_pagedown()
+        self.assertEqual(control.renders, 1)
+        self.assertEqual(next(control.get_lines()), b"200")
+
+    def test_pageup(self) -> None:
+        control = self.control(200)
+        control.go_bottom()
+        control.go_pageup()
+        self.assertEqual(control.renders, 2)
+        self.assertEqual(next(control.get_lines()), b"600")
+
+
+class TestLineCache(unittest.TestCase, CountingBase):
+    def test_scroll_cached(self) -> None:
+        control = self.control(10)
+        for _ in range(10):
+            control.go_down()
+        self.assertEqual(control.styled, 0)
+        self.assertEqual(next(control.get_lines()), b"10")
+
+    def test_scroll_prefetch(self) -> None:
+        control = self.control(10)
+        for _ in range(21):
+            control.go_down()
+        # One prefetch of a page above, the viewport and a page below:
+        self.assertEqual(control.styled, 30)
+        for _ in range(21):
+            control.go_up()
+        self.assertEqual(control.styled, 30)
+        self.assertEqual(control.get_lines_style()[0], [("", "0")])
+
+    def test_budget(self) -> None:
+        control = self.control(10)
+        control.line_cache.budget = 0
+        control.line_cache.clear()
+        control.go_down()
+        self.assertEqual(len(control.line_cache), 0)
+        self.assertEqual(control.visible_lines, 10)
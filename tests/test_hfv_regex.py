@@ -6,6 +6,7 @@ import unittest
 from typing import List
 
 from pthugefileviewer.hugefilevieweruicontrol import HugeFileViewerRegexUIControl
+from pthugefileviewer.margins import LineNumberMargin
 
 
 def tobytes(lines: List[str]) -> List[bytes]:
@@ -150,3 +151,340 @@ class TestBasic(unittest.TestCase, Base):
                 [("class:match", "de"), ("", "f")],
             ],
         )
+
+    def test_match_limit(self) -> None:
+        control = self.controlLines(2, ["abababab", "abab"], 0)
+        control.max_line_matches = 2
+        control.use_regex(re.compile(b"a"))
+        self.assertEqual(
+            control.get_lines_style(),
+            [
+                [
+                    ("class:match", "a"),
+                    ("", "b"),
+                    ("class:match", "a"),
+                    ("", "babab"),
+                ],
+                [("class:match", "a"), ("", "b"), ("class:match", "a"), ("", "b")],
+            ],
+        )
+
+    def test_oldmatch(self) -> None:
+        control = self.controlLines(2, ["abc", "def", "ghi"], 0)
+        control.use_regex(re.compile(b"b"))
+        control.use_regex(re.compile(b"bx"))
+        self.assertEqual(
+            control.get_lines_style(),
+            [[("", "a"), ("class:oldmatch", "b"), ("", "c")], [("", "def")]],
+        )
+
+    def test_oldmatch_index(self) -> None:
+        control = self.controlLines(2, [f"old {i}" for i in range(100)] + ["new"])
+        control.use_regex(re.compile(b"old"))
+        control.use_regex(re.compile(b"new"))
+        self.assertEqual(
+            control.get_lines_style()[0], [("class:oldmatch", "old"), ("", " 0")]
+        )
+        thread = control.start_match_index()
+        assert thread is not None
+        thread.join()
+        # The index found the regex, even if not in the lines shown:
+        self.assertEqual(control.get_lines_style()[0], [("", "old 0")])
+
+    def test_oldmatch_cached(self) -> None:
+        control = self.controlLines(2, [f"old {i}" for i in range(100)] + ["new"])
+        control.use_regex(re.compile(b"old"))
+        control.use_regex(re.compile(b"new"))
+        self.assertEqual(control._lines[0], [("class:oldmatch", "old"), ("", " 0")])
+        control.go_bottom()
+        self.assertEqual(control._lines[1], [("class:match", "new")])
+        # The lines styled before the regex was found are styled again:
+        control.go_top()
+        self.assertEqual(control._lines[0], [("", "old 0")])
+
+
+class TestHighlights(unittest.TestCase, Base):
+    def test_highlights(self) -> None:
+        control = self.controlLines(2, ["abc", "dbe", "ghi"], 0)
+        control.add_highlight(re.compile(b"b"), "class:b")
+        control.add_highlight(re.compile(b"[ce]"), "class:ce")
+        self.assertEqual(
+            control.get_lines_style(),
+            [
+                [("", "a"), ("class:b", "b"), ("class:ce", "c")],
+                [("", "d"), ("class:b", "b"), ("class:ce", "e")],
+            ],
+        )
+        control.use_regex(re.compile(b"ab"))
+        self.assertEqual(
+            control.get_lines_style(),
+            [
+                [("class:match", "ab"), ("class:ce", "c")],
+                [("", "d"), ("class:b", "b"), ("class:ce", "e")],
+            ],
+        )
+        control.clear_highlights()
+        self.assertEqual(
+            control.get_lines_style(),
+            [[("class:match", "ab"), ("", "c")], [("", "dbe")]],
+        )
+
+
+class TestEncoding(unittest.TestCase, Base):
+    def test_invalid_utf8(self) -> None:
+        control = self.controlFor(2, b"a\xe9b\nc\xffd\n")
+        control.use_regex(re.compile(b"b"))
+        self.assertEqual(
+            control.get_lines_style(),
+            [[("", "a\ufffd"), ("class:match", "b")], [("", "c\ufffdd")]],
+        )
+
+    def test_latin1(self) -> None:
+        control = self.controlFor(2, "aéb\n".encode("latin-1"))
+        control.encoding = "latin-1"
+        control.use_regex(re.compile(b"\xe9"))
+        self.assertEqual(
+            control.get_lines_style(),
+            [[("", "a"), ("class:match", "é"), ("", "b")]],
+        )
+
+    def test_match_in_character(self) -> None:
+        control = self.controlFor(2, "aéb\n".encode("utf-8"))
+        # The match starts in the é, which is shown where it starts:
+        control.use_regex(re.compile(b"\xa9b"))
+        self.assertEqual(
+            control.get_lines_style(), [[("", "aé"), ("class:match", "b")]]
+        )
+
+    def test_utf16(self) -> None:
+        contents = "ab\ncd\n".encode("utf-16")
+        control = self.controlFor(2, contents)
+        self.assertEqual(control.encoding, "utf-16-le")
+        control.use_regex(re.compile(b"c"))
+        self.assertEqual(
+            control.get_lines_style(),
+            [[("", "ab")], [("class:match", "c"), ("", "d")]],
+        )
+
+    def test_utf16_rows(self) -> None:
+        contents = "ab\ncd\n".encode("utf-16-le")
+        control = self.controlFor(3, contents)
+        control.encoding = "utf-16-le"
+        # The byte after the last 0x0A is not a row of its own:
+        self.assertEqual(control.get_lines_style(), [[("", "ab")], [("", "cd")]])
+        control.go_bottom()
+        self.assertEqual(control.offset, 0)
+        control.height = 1
+        control.go_bottom()
+        self.assertEqual(control.get_lines_style(), [[("", "cd")]])
+        thread = control.start_line_index()
+        assert thread is not None
+        thread.join()
+        self.assertEqual(control.line_count, 2)
+
+    def test_utf16_search(self) -> None:
+        control = self.controlFor(2, "ab\ncd\n".encode("utf-16"))
+        with self.assertRaises(ValueError):
+            control.decoder.encode_pattern("c")
+        regex = re.compile("cd".encode("utf-16-le"))
+        self.assertEqual(control.re_search(regex), (8, 12))
+
+    def test_latin1_search(self) -> None:
+        control = self.controlFor(2, "ab\naéb\n".encode("latin-1"))
+        control.encoding = "latin-1"
+        regex = re.compile(control.decoder.encode_pattern("é+"))
+        self.assertEqual(control.re_search(regex), (4, 5))
+        with self.assertRaises(ValueError):
+            control.decoder.encode_pattern("€")
+
+
+class TestHexdump(unittest.TestCase, Base):
+    def test_match_across_rows(self) -> None:
+        control = self.controlFor(2, b"abcdefgh")
+        control.hex_width = 4
+        control.hexdump = True
+        control.use_regex(re.compile(b"d.f"))
+        self.assertEqual(
+            control.get_lines_style(),
+            [
+                [("", "61 62 63 "), ("class:match", "64"), ("", "  "), ("", "abc")]
+                + [("class:match", "d")],
+                [("class:match", "65 66"), ("", " 67 68  "), ("class:match", "ef")]
+                + [("", "gh")],
+            ],
+        )
+
+    def test_search(self) -> None:
+        control = self.controlFor(2, b"\x00" * 64 + b"\xde\xad" + b"\x00" * 64)
+        control.hex_width = 16
+        control.hexdump = True
+        control.use_regex(re.compile(re.escape(b"\xde\xad")))
+        control.search_down()
+        self.assertEqual(control.last_match, (64, 66))
+        self.assertEqual(control.offset % 16, 0)
+
+    def test_no_filter(self) -> None:
+        control = self.controlLines(2, ["abc", "def", "ghi"])
+        control.use_regex(re.compile(b"h"))
+        control.filtered = True
+        control.hex_width = 4
+        control.hexdump = True
+        self.assertFalse(control.filtered)
+        control.go_top()
+        self.assertEqual(list(control.get_lines()), [b"abc\n", b"def\n"])
+
+
+class TestCache(unittest.TestCase, Base):
+    def test_use_regex_invalidates(self) -> None:
+        control = self.controlLines(2, ["abc", "def", "ghi"], 0)
+        self.assertEqual(control.get_cached_lines(), [[("", "abc")], [("", "def")]])
+        control.use_regex(re.compile(b"e"))
+        self.assertEqual(
+            control.get_cached_lines(),
+            [[("", "abc")], [("", "d"), ("class:match", "e"), ("", "f")]],
+        )
+        control.go_down()
+        self.assertEqual(
+            control.get_cached_lines(),
+            [[("", "d"), ("class:match", "e"), ("", "f")], [("", "ghi")]],
+        )
+
+
+class TestSearch(unittest.TestCase, Base):
+    def test_search_down(self) -> None:
+        control = self.controlNums(3, 20, 0)
+        control.search_chunk_size = 8
+        control.search_max_span = 4
+        control.use_regex(re.compile(b"15"))
+        control.search_down()
+        self.assertEqual(
+            control.get_lines_style(),
+            [[("", "16")], [("", "17")], [("", "18")]],
+        )
+
+    def test_re_search_chunked(self) -> None:
+        control = self.controlNums(3, 20, 0)
+        control.search_chunk_size = 8
+        control.search_max_span = 4
+        span = control.re_search(re.compile(b"13\n14"), 5)
+        self.assertEqual(span, (29, 34))
+
+    def test_search_up(self) -> None:
+        control = self.controlNums(3, 20, 0)
+        control.search_chunk_size = 8
+        control.search_max_span = 4
+        control.use_regex(re.compile(b"1[05]"))
+        control.go_bottom()
+        control.search_up()
+        self.assertEqual(
+            control.get_lines_style(),
+            [[("", "16")], [("", "17")], [("", "18")]],
+        )
+        control.search_up()
+        self.assertEqual(
+            control.get_lines_style(),
+            [[("", "11")], [("", "12")], [("", "13")]],
+        )
+        control.search_up()
+        self.assertEqual(control.last_match, (20, 22))
+
+    def test_match_index(self) -> None:
+        control = self.controlNums(3, 20, 0)
+        control.use_regex(re.compile(b"1"))
+        self.assertEqual(control.match_number(), (None, None))
+        thread = control.start_match_index()
+        assert thread is not None
+        thread.join()
+        control.search_down()
+        self.assertEqual(control.last_match, (20, 21))
+        self.assertEqual(control.match_number(), (2, 12))
+        control.search_down()
+        self.assertEqual(control.match_number(), (7, 12))
+        control.use_regex(re.compile(b"2"))
+        self.assertEqual(control.match_index, None)
+        self.assertEqual(control.match_number(), (None, None))
+
+
+class TestFilter(unittest.TestCase, Base):
+    def filtered(self, height: int, regex: bytes) -> HugeFileViewerRegexUIControl:
+        control = self.controlNums(height, 40, 1)
+        control.use_regex(re.compile(regex))
+        control.filtered = True
+        return control
+
+    def test_filter(self) -> None:
+        control = self.filtered(3, b"3")
+        self.assertEqual(list(control.get_lines()), [b"3", b"13", b"23"])
+        control.go_down()
+        self.assertEqual(list(control.get_lines()), [b"13", b"23", b"30"])
+        control.go_pagedown()
+        self.assertEqual(list(control.get_lines()), [b"31", b"32", b"33"])
+        control.go_bottom()
+        self.assertEqual(list(control.get_lines()), [b"37", b"38", b"39"])
+        control.go_pageup()
+        self.assertEqual(list(control.get_lines()), [b"34", b"35", b"36"])
+        control.go_top()
+        self.assertEqual(list(control.get_lines()), [b"3", b"13", b"23"])
+
+    def test_filter_off(self) -> None:
+        control = self.filtered(3, b"3")
+        control.go_down()
+        control.filtered = False
+        self.assertEqual(list(control.get_lines()), [b"13", b"14", b"15"])
+
+    def test_filter_style(self) -> None:
+        control = self.filtered(2, b"3")
+        self.assertEqual(
+            control.get_lines_style(),
+            [[("class:match", "3")], [("", "1"), ("class:match", "3")]],
+        )
+
+    def test_filter_realign(self) -> None:
+        control = self.controlNums(3, 40, 1)
+        control.use_regex(re.compile(b"5"))
+        control.go_line_offset(control.size // 2)
+        control.filtered = True
+        self.assertEqual(list(control.get_lines()), [b"15", b"25", b"35"])
+
+    def test_filter_nomatch(self) -> None:
+        control = self.filtered(3, b"x")
+        self.assertEqual(list(control.get_lines()), [])
+        control.go_top()
+        control.go_down()
+        self.assertEqual(list(control.get_lines()), [])
+
+    def test_filter_max_scan(self) -> None:
+        control = self.controlNums(3, 40, 1)
+        control.filter_max_scan = 8
+        control.use_regex(re.compile(b"20"))
+        control.filtered = True
+        assert control.matched_lines is not None
+        # Nothing was found near the start or the end:
+        self.assertTrue(control.matched_lines.approximate)
+        self.assertEqual(list(control.get_lines()), [])
+        # Each move goes on scanning:
+        for _ in range(20):
+            control.go_up()
+        self.assertEqual(list(control.get_lines()), [b"20"])
+        self.assertFalse(control.matched_lines.approximate)
+
+    def test_filter_wrap(self) -> None:
+        control = self.controlLines(3, ["a", "bxbb", "c", "dddx"])
+        control.width = 2
+        control.wrap = True
+        control.use_regex(re.compile(b"x"))
+        control.filtered = True
+        self.assertEqual(list(control.get_lines()), [b"bx", b"bb", b"dd"])
+        control.go_down(2)
+        self.assertEqual(list(control.get_lines()), [b"bb", b"dd", b"dx"])
+        control.go_up()
+        self.assertEqual(list(control.get_lines()), [b"bx", b"bb", b"dd"])
+
+    def test_filter_margin(self) -> None:
+        control = self.filtered(3, b"3")
+        thread = control.start_line_index()
+        assert thread is not None
+        thread.join()
+        margin = LineNumberMargin(control)
+        fragments = margin.create_margin(None, 3, 3)  # type: ignore
+        self.assertEqual([f[1] for f in fragments[::2]], [" 4 ", "14 ", "24 "])
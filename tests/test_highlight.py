@@ -0,0 +1,50 @@
+"""Highlighter tests"""
+
+import re
+import unittest
+from typing import List, Tuple
+
+from pthugefileviewer.highlight import Highlighter, combine
+
+TEXT = b"GET /a 200\nPOST /b 500\nGET /c 404 ERROR\n"
+
+
+def spans(highlighter: Highlighter, pos: int = 0) -> List[Tuple[bytes, str]]:
+    return [(TEXT[a:b], style) for a, b, style in highlighter.spans(TEXT, pos)]
+
+
+class TestHighlighter(unittest.TestCase):
+    def test_single(self) -> None:
+        highlighter = Highlighter([(re.compile(rb"GET"), "get")])
+        self.assertIsNone(highlighter.combined)
+        self.assertEqual(spans(highlighter), [(b"GET", "get"), (b"GET", "get")])
+
+    def test_combined(self) -> None:
+        highlighter = Highlighter(
+            [
+                (re.compile(rb"[45]\d\d"), "error"),
+                (re.compile(rb"get|post", re.I), "method"),
+                (re.compile(rb"\d+"), "number"),
+            ]
+        )
+        self.assertIsNotNone(highlighter.combined)
+        self.assertEqual(
+            spans(highlighter),
+            [
+                (b"GET", "method"),
+                (b"200", "number"),
+                (b"POST", "method"),
+                (b"500", "error"),
+                (b"GET", "method"),
+                (b"404", "error"),
+            ],
+        )
+        self.assertEqual(spans(highlighter, 30)[0], (b"404", "error"))
+
+    def test_backreference(self) -> None:
+        patterns = [(re.compile(rb"(\d)0\1"), "same"), (re.compile(rb"/\w"), "path")]
+        self.assertIsNone(combine(tuple(regex for regex, _ in patterns)))
+        self.assertEqual(
+            spans(Highlighter(patterns)),
+            [(b"/a", "path"), (b"/b", "path"), (b"/c", "path"), (b"404", "same")],
+        )
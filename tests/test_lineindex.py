@@ -0,0 +1,82 @@
+"""LineIndex tests"""
+
+import os
+import tempfile
+import unittest
+
+from pthugefileviewer.lineindex import LineIndex
+
+CONTENTS = b"".join(b"%d\n" % i for i in range(100))
+
+
+class TestLineIndex(unittest.TestCase):
+    def index(self, contents: bytes = CONTENTS) -> LineIndex:
+        index = LineIndex(contents, step=16)
+        index.build()
+        return index
+
+    def test_line_count(self) -> None:
+        self.assertEqual(self.index().line_count, 100)
+        self.assertEqual(self.index(CONTENTS + b"100").line_count, 101)
+        self.assertEqual(self.index(b"").line_count, 0)
+
+    def test_line_offset(self) -> None:
+        index = self.index()
+        for i in [0, 1, 9, 10, 11, 55, 99]:
+            self.assertEqual(index.line_offset(i), CONTENTS.index(b"%d\n" % i))
+        self.assertEqual(index.line_offset(100), len(CONTENTS))
+        self.assertEqual(index.line_offset(101), -1)
+
+    def test_line_number(self) -> None:
+        index = self.index()
+        for i in [99, 0, 1, 9, 10, 11, 55, 56, 57]:
+            offset = CONTENTS.index(b"%d\n" % i)
+            self.assertEqual(index.line_number(offset), i)
+            self.assertEqual(index.line_number(offset + 1), i)
+
+    def test_unbuilt(self) -> None:
+        index = LineIndex(CONTENTS, step=16)
+        self.assertEqual(index.line_count, None)
+        self.assertEqual(index.line_number(0), 0)
+        self.assertEqual(index.line_number(len(CONTENTS)), None)
+        self.assertEqual(index.line_offset(55), CONTENTS.index(b"55\n"))
+
+    def test_max_scan(self) -> None:
+        index = LineIndex(CONTENTS, step=16)
+        self.assertEqual(index.line_offset(5, max_scan=16), CONTENTS.index(b"5\n"))
+        self.assertEqual(index.line_offset(55, max_scan=16), None)
+        # The lines sampled are 2 or 3 bytes long:
+        estimate = index.estimate_offset(55)
+        self.assertLess(abs(estimate - CONTENTS.index(b"55\n")), 60)
+        index.build()
+        self.assertEqual(index.line_offset(55, max_scan=16), CONTENTS.index(b"55\n"))
+
+    def test_save_load(self) -> None:
+        index = self.index()
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "cache", "index")
+            with open(os.path.join(tmpdir, "file"), "wb") as fd:
+                fd.write(CONTENTS)
+            stat = os.stat(os.path.join(tmpdir, "file"))
+            index.save(path, stat)
+            loaded = LineIndex.load(CONTENTS, path, stat)
+            assert loaded is not None
+            self.assertEqual(loaded.checkpoints, index.checkpoints)
+            self.assertEqual(loaded.line_count, 100)
+            stale = os.stat_result((0,) * 6 + (1,) + (0,) * 3)
+            self.assertEqual(LineIndex.load(CONTENTS, path, stale), None)
+
+    def test_load_corrupt(self) -> None:
+        index = self.index()
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "index")
+            with open(os.path.join(tmpdir, "file"), "wb") as fd:
+                fd.write(CONTENTS)
+            stat = os.stat(os.path.join(tmpdir, "file"))
+            index.save(path, stat)
+            size = os.path.getsize(path)
+            # Cut in a checkpoint, and then at a checkpoint:
+            for cut in (3, 8):
+                with open(path, "r+b") as fd:
+                    fd.truncate(size - cut)
+                self.assertEqual(LineIndex.load(CONTENTS, path, stat), None)
@@ -0,0 +1,111 @@
+"""MatchedLines tests"""
+
+import re
+import unittest
+from typing import List
+
+from pthugefileviewer.matchedlines import MatchedLines
+
+CONTENTS = b"".join(b"%d\n" % i for i in range(100))
+REGEX = re.compile(b"5")
+
+
+def expected() -> List[int]:
+    numbers = [i for i in range(1, 100) if b"5" in b"%d" % i]
+    return [CONTENTS.index(b"\n%d\n" % i) + 1 for i in numbers]
+
+
+class TestMatchedLines(unittest.TestCase):
+    def lines(self, limit: int = 1024, max_scan: int = 1024) -> MatchedLines:
+        return MatchedLines(
+            CONTENTS, REGEX, lookahead=2, limit=limit, chunk_size=16, max_scan=max_scan
+        )
+
+    def test_next_line(self) -> None:
+        lines = self.lines()
+        found = []
+        offset = 0
+        while True:
+            offset = lines.next_line(offset)
+            if offset == -1:
+                break
+            found.append(offset)
+            offset += 1
+        self.assertEqual(found, expected())
+
+    def test_prev_line(self) -> None:
+        lines = self.lines()
+        found = []
+        offset = len(CONTENTS)
+        while True:
+            offset = lines.prev_line(offset)
+            if offset == -1:
+                break
+            found.append(offset)
+        self.assertEqual(found, expected()[::-1])
+
+    def test_matches(self) -> None:
+        lines = self.lines()
+        self.assertTrue(lines.matches(CONTENTS.index(b"\n15\n") + 1))
+        self.assertFalse(lines.matches(CONTENTS.index(b"\n16\n") + 1))
+
+    def test_mid_line(self) -> None:
+        lines = self.lines()
+        offset = CONTENTS.index(b"\n15\n") + 2
+        self.assertEqual(lines.next_line(offset), CONTENTS.index(b"\n25\n") + 1)
+        self.assertEqual(lines.prev_line(offset), CONTENTS.index(b"\n15\n") + 1)
+
+    def test_merge(self) -> None:
+        lines = self.lines()
+        lines.prev_line(len(CONTENTS))
+        lines.next_line(0)
+        lines.next_line(CONTENTS.index(b"\n50\n"))
+        self.assertEqual(lines.prev_line(len(CONTENTS)), expected()[-1])
+        # No offset is kept twice:
+        self.assertLessEqual(len(lines), len(expected()))
+
+    def test_limit(self) -> None:
+        lines = self.lines(limit=4)
+        offset = 0
+        for _ in range(10):
+            offset = lines.next_line(offset) + 1
+        self.assertLessEqual(len(lines), 4)
+        self.assertEqual(lines.prev_line(offset), expected()[9])
+        self.assertEqual(lines.next_line(0), expected()[0])
+        self.assertLessEqual(len(lines), 4)
+
+    def test_max_scan(self) -> None:
+        lines = self.lines(max_scan=10)
+        last = expected()[-1]
+        # 95 starts 15 bytes before the end:
+        self.assertEqual(lines.prev_line(len(CONTENTS)), -1)
+        self.assertTrue(lines.approximate)
+        found = -1
+        for _ in range(10):
+            found = lines.prev_line(len(CONTENTS))
+            if found != -1:
+                break
+        self.assertEqual(found, last)
+        # Going on after each call that stopped finds them all:
+        starts = []
+        offset = 0
+        while True:
+            start = lines.next_line(offset)
+            if start != -1:
+                starts.append(start)
+                offset = start + 1
+            elif not lines.approximate:
+                break
+        self.assertEqual(starts, expected())
+
+    def test_grow(self) -> None:
+        lines = MatchedLines(CONTENTS, REGEX, lookahead=2, chunk_size=16, max_span=4)
+        lines.prev_line(len(CONTENTS))
+        lines.next_line(0)
+        kept = len(lines)
+        more = CONTENTS + b"105\n"
+        lines.grow(more)
+        self.assertGreater(len(lines), 0)
+        self.assertLessEqual(len(lines), kept)
+        self.assertEqual(lines.prev_line(len(more)), len(CONTENTS))
+        self.assertEqual(lines.prev_line(len(CONTENTS)), expected()[-1])
@@ -0,0 +1,70 @@
+"""MatchIndex tests"""
+
+import re
+import threading
+import unittest
+
+from pthugefileviewer.matchindex import MatchIndex
+
+CONTENTS = b"".join(b"%d\n" % i for i in range(100))
+REGEX = re.compile(b"5")
+
+
+class TestMatchIndex(unittest.TestCase):
+    def index(self, limit: int = 1024) -> MatchIndex:
+        index = MatchIndex(CONTENTS, REGEX, limit=limit)
+        index.build(chunk_size=16, max_span=4)
+        return index
+
+    def test_count(self) -> None:
+        index = self.index()
+        self.assertTrue(index.complete)
+        self.assertEqual(index.count, CONTENTS.count(b"5"))
+
+    def test_number(self) -> None:
+        index = self.index()
+        self.assertEqual(index.number(CONTENTS.index(b"5")), 1)
+        self.assertEqual(index.number(CONTENTS.index(b"15\n") + 1), 2)
+        self.assertEqual(index.number(0), None)
+
+    def test_next_prev(self) -> None:
+        index = self.index()
+        offset = CONTENTS.index(b"15\n")
+        self.assertEqual(index.next_start(offset), offset + 1)
+        self.assertEqual(index.prev_start(offset + 1), CONTENTS.index(b"5"))
+        self.assertEqual(index.prev_start(5), -1)
+        self.assertEqual(index.next_start(len(CONTENTS) - 2), -1)
+
+    def test_limit(self) -> None:
+        index = self.index(limit=8 * 3)
+        self.assertTrue(index.truncated)
+        self.assertEqual(index.count, None)
+        self.assertEqual(len(index.starts), 3)
+        self.assertEqual(index.next_start(index.starts[-1] + 1), None)
+        self.assertEqual(index.prev_start(index.starts[-1]), index.starts[1])
+        self.assertEqual(index.prev_start(len(CONTENTS)), None)
+
+    def test_cancel(self) -> None:
+        cancel = threading.Event()
+        cancel.set()
+        index = MatchIndex(CONTENTS, REGEX)
+        index.build(cancel=cancel)
+        self.assertFalse(index.complete)
+        self.assertEqual(index.count, None)
+
+    def test_grow(self) -> None:
+        index = self.index()
+        count = len(index.starts)
+        more = CONTENTS + b"55\n"
+        index.grow(more, max_span=4)
+        self.assertFalse(index.complete)
+        # Only the matches near the old end are dropped:
+        self.assertGreater(len(index.starts), count - 3)
+        index.build(chunk_size=16, max_span=4)
+        self.assertEqual(list(index.starts), [i for i, c in enumerate(more) if c == 53])
+
+    def test_grow_truncated(self) -> None:
+        index = self.index(limit=8 * 3)
+        index.grow(CONTENTS + b"5\n")
+        self.assertTrue(index.truncated)
+        self.assertEqual(len(index.starts), 3)
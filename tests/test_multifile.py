@@ -0,0 +1,110 @@
+"""Multiple file helpers tests"""
+
+import concurrent.futures
+import gzip
+import os
+import re
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from pthugefileviewer.hugefilevieweruicontrol import HugeFileViewerUIControl
+from pthugefileviewer.multifile import (
+    FileHits,
+    FileTabs,
+    count_matches,
+    expand_paths,
+    search_files,
+    summarize_hits,
+)
+from pthugefileviewer.search import SearchCancelled
+
+
+class TestMultiFile(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.paths = []
+        for i in range(3):
+            path = os.path.join(self.tmpdir.name, f"log.{i}")
+            with open(path, "wb") as fd:
+                fd.write(b"".join(b"%d\n" % j for j in range(i * 10)))
+            self.paths.append(path)
+
+    def test_expand_paths(self) -> None:
+        pattern = os.path.join(self.tmpdir.name, "log.*")
+        missing = os.path.join(self.tmpdir.name, "x.*")
+        self.assertEqual(
+            expand_paths([pattern, "plain", missing]), self.paths + ["plain", missing]
+        )
+
+    def test_count_matches(self) -> None:
+        hits = count_matches(self.paths[2], re.compile(b"1"))
+        self.assertEqual((hits.matches, hits.first), (12, 2))
+        hits = count_matches(self.paths[0], re.compile(b"1"))
+        self.assertEqual((hits.matches, hits.first), (0, None))
+
+    def test_count_compressed(self) -> None:
+        path = os.path.join(self.tmpdir.name, "log.gz")
+        with open(path, "wb") as fd:
+            fd.write(gzip.compress(b"a\nb\na\n"))
+        self.assertEqual(count_matches(path, re.compile(b"a")).matches, 2)
+
+    def test_count_error(self) -> None:
+        hits = count_matches(
+            os.path.join(self.tmpdir.name, "missing"), re.compile(b"1")
+        )
+        self.assertIsNotNone(hits.error)
+
+    def test_search_files(self) -> None:
+        hits = search_files(self.paths, re.compile(b"1"), max_workers=2)
+        counts = {h.path: h.matches for h in hits}
+        self.assertEqual(counts, dict(zip(self.paths, [0, 1, 12])))
+
+    def test_cancel(self) -> None:
+        cancel = threading.Event()
+        cancel.set()
+        shutdown = concurrent.futures.ProcessPoolExecutor.shutdown
+        with mock.patch.object(
+            concurrent.futures.ProcessPoolExecutor,
+            "shutdown",
+            autospec=True,
+            side_effect=shutdown,
+        ) as mocked:
+            with self.assertRaises(SearchCancelled):
+                list(search_files(self.paths, re.compile(b"1"), 1, cancel))
+        # The workers that are counting are not waited for:
+        self.assertEqual(mocked.call_args.kwargs, dict(wait=False, cancel_futures=True))
+
+    def test_summarize_hits(self) -> None:
+        hits = {
+            self.paths[0]: FileHits(self.paths[0], 0, None),
+            self.paths[1]: FileHits(self.paths[1], 3, 0),
+            self.paths[2]: FileHits(self.paths[2], 0, None, "Permission denied"),
+        }
+        self.assertEqual(
+            summarize_hits(self.paths, hits), "log.1: 3, log.2: Permission denied"
+        )
+
+    def test_tabs(self) -> None:
+        with open(self.paths[2], "rb") as fd:
+            control = HugeFileViewerUIControl(fd)
+        control.height = 3
+        tabs = FileTabs(control, self.paths[2:] + self.paths[1:2])
+        control.go_down(5)
+        self.assertTrue(tabs.next())
+        self.assertEqual(tabs.path, self.paths[1])
+        self.assertEqual(list(control.get_lines()), [b"0", b"1", b"2"])
+        self.assertTrue(tabs.prev())
+        self.assertEqual(list(control.get_lines()), [b"5", b"6", b"7"])
+        self.assertFalse(tabs.switch(2))
+
+    def test_tabs_missing(self) -> None:
+        with open(self.paths[1], "rb") as fd:
+            control = HugeFileViewerUIControl(fd)
+        missing = os.path.join(self.tmpdir.name, "missing")
+        tabs = FileTabs(control, [self.paths[1], missing])
+        with self.assertLogs("pthugefileviewer.multifile", "WARNING"):
+            self.assertFalse(tabs.next())
+        self.assertEqual(tabs.path, self.paths[1])
@@ -0,0 +1,95 @@
+"""Parallel search tests"""
+
+import gzip
+import os
+import re
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from pthugefileviewer import hugefilevieweruicontrol
+from pthugefileviewer.hugefilevieweruicontrol import HugeFileViewerRegexUIControl
+from pthugefileviewer.parallel import (
+    count_range,
+    mp_context,
+    parallel_count,
+    parallel_search,
+    split_ranges,
+)
+from pthugefileviewer.search import SearchCancelled, chunked_finditer
+
+CONTENTS = b"abcdefghijklmn" * 3
+
+
+class TestParallel(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.path = os.path.join(self.tmpdir.name, "file")
+        with open(self.path, "wb") as fd:
+            fd.write(CONTENTS)
+
+    def search(self, regex: bytes, offset: int = 0) -> object:
+        return parallel_search(
+            self.path, re.compile(regex), offset, max_workers=2, range_size=4
+        )
+
+    def count(self, regex: bytes) -> int:
+        return parallel_count(self.path, re.compile(regex), 2, range_size=4)
+
+    def test_split_ranges(self) -> None:
+        self.assertEqual(split_ranges(1, 10, 4), [(1, 5), (5, 9), (9, 10)])
+        self.assertEqual(split_ranges(0, 0, 4), [])
+
+    def test_search(self) -> None:
+        self.assertEqual(self.search(b"x"), None)
+        self.assertEqual(self.search(b"b"), (1, 2))
+        self.assertEqual(self.search(b"g"), (6, 7))
+        self.assertEqual(self.search(b"b", 2), (15, 16))
+        self.assertEqual(self.search(b"n$"), (41, 42))
+
+    def test_search_across_ranges(self) -> None:
+        self.assertEqual(self.search(b"cdefg"), (2, 7))
+
+    def test_count(self) -> None:
+        for regex in [b"x", b"a", b"[a-z]", b"cdefg", b"ja|abcdefghijk", b"n$"]:
+            with self.subTest(regex=regex):
+                spans = chunked_finditer(CONTENTS, re.compile(regex))
+                expected = sum(1 for _ in spans)
+                self.assertEqual(self.count(regex), expected)
+
+    def test_count_range(self) -> None:
+        result = count_range(self.path, re.compile(b"[a-c]"), 0, 4)
+        self.assertEqual(result, (3, 0, 3))
+
+    def test_cancel(self) -> None:
+        cancel = threading.Event()
+        cancel.set()
+        with self.assertRaises(SearchCancelled):
+            parallel_search(self.path, re.compile(b"x"), cancel=cancel)
+
+    def test_control(self) -> None:
+        with open(self.path, "rb") as fd:
+            control = HugeFileViewerRegexUIControl(fd)
+        control.search_workers = 2
+        control.search_range_size = 4
+        self.assertEqual(control.re_search(re.compile(b"m"), 20), (26, 27))
+
+    def test_control_gzip(self) -> None:
+        # Each worker would decompress the file again, so it is
+        # searched in this process:
+        path = self.path + ".gz"
+        with open(path, "wb") as fd:
+            fd.write(gzip.compress(CONTENTS))
+        with open(path, "rb") as fd:
+            control = HugeFileViewerRegexUIControl(fd)
+        self.addCleanup(control.close)
+        control.search_workers = 2
+        control.search_range_size = 4
+        with mock.patch.object(hugefilevieweruicontrol, "parallel_search") as search:
+            self.assertEqual(control.re_search(re.compile(b"m"), 20), (26, 27))
+        search.assert_not_called()
+
+    def test_mp_context(self) -> None:
+        self.assertIn(mp_context().get_start_method(), ("forkserver", "spawn"))
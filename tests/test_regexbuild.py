@@ -0,0 +1,107 @@
+"""hfv-regexbuild RegexWidget tests"""
+
+import asyncio
+import importlib.machinery
+import importlib.util
+import os
+import re
+import tempfile
+import unittest
+from typing import Any, List, Optional
+from unittest import mock
+
+PATH = os.path.join(os.path.dirname(__file__), "..", "src", "bin", "hfv-regexbuild")
+
+
+def load_script() -> Any:
+    """Import the script, which has no .py extension, as a module"""
+    loader = importlib.machinery.SourceFileLoader("hfv_regexbuild", PATH)
+    spec = importlib.util.spec_from_loader(loader.name, loader)
+    assert spec is not None
+    module = importlib.util.module_from_spec(spec)
+    loader.exec_module(module)
+    return module
+
+
+hfv_regexbuild = load_script()
+
+
+class TestRegexWidget(unittest.TestCase):
+    def setUp(self) -> None:
+        fd, self.path = tempfile.mkstemp()
+        os.write(fd, b"".join(b"line %d\n" % i for i in range(100)))
+        os.close(fd)
+        self.addCleanup(os.unlink, self.path)
+        hfv_regexbuild.compile_regex.cache_clear()
+
+    def widget(self, regex_str: str = "") -> Any:
+        fileview = hfv_regexbuild.FileviewWidget([self.path])
+        self.addCleanup(fileview.control.close)
+        statuswidget = hfv_regexbuild.StatusWidget()
+        searcher = hfv_regexbuild.Searcher(fileview, statuswidget)
+        return hfv_regexbuild.RegexWidget(fileview, statuswidget, searcher, regex_str)
+
+    def test_compile_cache(self) -> None:
+        widget = self.widget("line 1")
+        regex = widget.fileview.control.regex
+        self.assertEqual(regex.pattern, b"line 1")
+        widget.buffer.text = "line 2"
+        widget.buffer.text = "line 1"
+        info = hfv_regexbuild.compile_regex.cache_info()
+        self.assertEqual((info.misses, info.hits), (2, 1))
+        # The same pattern object, so the match index is kept:
+        self.assertIs(widget.fileview.control.regex, regex)
+
+    def test_compile_error(self) -> None:
+        widget = self.widget("line (")
+        self.assertIsNone(widget.fileview.control.regex)
+        self.assertEqual(widget.statuswidget.window.style, "class:status.error")
+
+    def test_encoding(self) -> None:
+        regex = hfv_regexbuild.compile_regex("é", "latin-1")
+        self.assertEqual(regex.pattern, b"\xe9")
+        error = hfv_regexbuild.compile_regex("a", "utf-16-le")
+        self.assertIsInstance(error, re.error)
+        self.assertIn("not ASCII compatible", error.msg)
+        with open(self.path, "wb") as fd:
+            fd.write("ab\ncd\n".encode("utf-16"))
+        widget = self.widget("c")
+        self.assertIsNone(widget.fileview.control.regex)
+        self.assertEqual(widget.statuswidget.window.style, "class:status.error")
+
+    def test_debounce(self) -> None:
+        widget = self.widget()
+        widget.debounce = 0.01
+        control = widget.fileview.control
+        used: List[Optional[bytes]] = []
+        use_regex = control.use_regex
+
+        def spy(regex: Any) -> None:
+            used.append(None if regex is None else regex.pattern)
+            use_regex(regex)
+
+        async def typing() -> None:
+            for i in range(1, 5):
+                widget.buffer.text = "line 1"[:i]
+            self.assertEqual(used, [])
+            await asyncio.sleep(0.1)
+
+        with mock.patch.object(control, "use_regex", side_effect=spy):
+            with mock.patch.object(widget.searcher, "cancel") as cancel:
+                asyncio.run(typing())
+        self.assertEqual(used, [b"line"])
+        self.assertEqual(control.regex.pattern, b"line")
+        self.assertEqual(cancel.call_count, 4)
+
+    def test_flush(self) -> None:
+        widget = self.widget()
+        widget.debounce = 60
+
+        async def typing() -> None:
+            widget.buffer.text = "line 9"
+            self.assertEqual(widget.fileview.control.regex.pattern, b"")
+            widget.flush()
+            self.assertIsNone(widget._pending)
+
+        asyncio.run(typing())
+        self.assertEqual(widget.fileview.control.regex.pattern, b"line 9")
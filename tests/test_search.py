@@ -0,0 +1,209 @@
+"""Chunked search tests"""
+
+import re
+import threading
+import unittest
+from unittest import mock
+from typing import List, Optional, Tuple
+
+from pthugefileviewer import search
+from pthugefileviewer.bytesource import ByteSource
+from pthugefileviewer.search import (
+    ByteBuffer,
+    SearchCancelled,
+    chunked_finditer,
+    chunked_search,
+    chunked_search_backward,
+    literal_prefix,
+)
+
+CONTENTS = b"abcdefghijklmn"
+
+
+class BytesSource(ByteSource):
+    def __init__(self, contents: bytes):
+        ByteSource.__init__(self, len(contents), block_size=3)
+        self.contents = contents
+
+    def read_range(self, start: int, end: int) -> bytes:
+        return self.contents[start:end]
+
+
+class TestChunkedSearch(unittest.TestCase):
+    def search(
+        self, regex: bytes, contents: bytes, offset: int = 0
+    ) -> Optional[Tuple[int, int]]:
+        return chunked_search(
+            contents, re.compile(regex, re.S), offset, chunk_size=4, max_span=3
+        )
+
+    def test_nomatch(self) -> None:
+        self.assertEqual(self.search(b"x", b"abcdefghijklmn"), None)
+
+    def test_first_chunk(self) -> None:
+        self.assertEqual(self.search(b"b", b"abcdefghijklmn"), (1, 2))
+
+    def test_later_chunk(self) -> None:
+        self.assertEqual(self.search(b"m", b"abcdefghijklmn"), (12, 13))
+
+    def test_across_chunks(self) -> None:
+        self.assertEqual(self.search(b"def", b"abcdefghijklmn"), (3, 6))
+
+    def test_earliest(self) -> None:
+        self.assertEqual(self.search(b"g|c", b"abcdefghijklmn"), (2, 3))
+
+    def test_offset(self) -> None:
+        self.assertEqual(self.search(b"a", b"abcdabcdabcd", 1), (4, 5))
+
+    def test_bol(self) -> None:
+        regex = re.compile(b"^c", re.M)
+        span = chunked_search(b"abc\ncd", regex, 2, chunk_size=2, max_span=1)
+        self.assertEqual(span, (4, 5))
+
+    def test_span_limit(self) -> None:
+        self.assertEqual(self.search(b"c[a-z]+", b"abcdefghijklmn"), (2, 7))
+
+    def test_at_end(self) -> None:
+        self.assertEqual(self.search(b"[a-z]+", b"abcdefghijklmn", 12), (12, 14))
+
+    def test_progress(self) -> None:
+        positions: List[int] = []
+        regex = re.compile(b"x")
+        m = chunked_search(
+            b"a" * 10, regex, chunk_size=4, max_span=1, progress=positions.append
+        )
+        self.assertEqual(m, None)
+        self.assertEqual(positions, [4, 8])
+
+    def test_cancel(self) -> None:
+        cancel = threading.Event()
+        regex = re.compile(b"x")
+        chunked_search(b"a" * 10, regex, chunk_size=4, cancel=cancel)
+        cancel.set()
+        with self.assertRaises(SearchCancelled):
+            chunked_search(b"a" * 10, regex, chunk_size=4, cancel=cancel)
+
+    def test_bytesource(self) -> None:
+        source = BytesSource(b"abc\ncd")
+        regex = re.compile(b"^c", re.M)
+        span = chunked_search(source, regex, 2, chunk_size=2, max_span=1)
+        self.assertEqual(span, (4, 5))
+
+
+class TestChunkedSearchBackward(unittest.TestCase):
+    def search(
+        self, regex: bytes, contents: bytes, offset: Optional[int] = None
+    ) -> Optional[Tuple[int, int]]:
+        return chunked_search_backward(
+            contents, re.compile(regex, re.S), offset, chunk_size=4, max_span=3
+        )
+
+    def test_nomatch(self) -> None:
+        self.assertEqual(self.search(b"x", CONTENTS), None)
+
+    def test_last_chunk(self) -> None:
+        self.assertEqual(self.search(b"m", CONTENTS), (12, 13))
+
+    def test_first_chunk(self) -> None:
+        self.assertEqual(self.search(b"b", CONTENTS), (1, 2))
+
+    def test_latest(self) -> None:
+        self.assertEqual(self.search(b"a", b"abcdabcdabcd"), (8, 9))
+        self.assertEqual(self.search(b"a", b"abcdabcdabcd", 8), (4, 5))
+
+    def test_across_offset(self) -> None:
+        self.assertEqual(self.search(b"def", CONTENTS, 4), (3, 6))
+
+    def test_not_suffix(self) -> None:
+        self.assertEqual(self.search(b"[a-z]+", b"abcdef 12345678"), (0, 6))
+
+    def test_bytesource(self) -> None:
+        source = BytesSource(b"abc\ncd\nc")
+        regex = re.compile(b"^c", re.M)
+        span = chunked_search_backward(source, regex, 7, chunk_size=2, max_span=1)
+        self.assertEqual(span, (4, 5))
+
+    def test_progress(self) -> None:
+        positions: List[int] = []
+        regex = re.compile(b"x")
+        span = chunked_search_backward(
+            b"a" * 10, regex, chunk_size=4, max_span=1, progress=positions.append
+        )
+        self.assertEqual(span, None)
+        self.assertEqual(positions, [6, 2])
+
+
+class TestChunkedFinditer(unittest.TestCase):
+    def finditer(self, regex: bytes, contents: bytes) -> List[Tuple[int, int]]:
+        return list(
+            chunked_finditer(
+                contents, re.compile(regex, re.S), chunk_size=4, max_span=3
+            )
+        )
+
+    def test_all(self) -> None:
+        self.assertEqual(self.finditer(b"a", b"abcdabcdabcd"), [(0, 1), (4, 5), (8, 9)])
+
+    def test_across_chunks(self) -> None:
+        self.assertEqual(
+            self.finditer(b"[a-z]{3}", CONTENTS), [(0, 3), (3, 6), (6, 9), (9, 12)]
+        )
+
+    def test_same_as_finditer(self) -> None:
+        contents = b"ab abc abcd abcde " * 3
+        regex = re.compile(b"[a-z]+")
+        self.assertEqual(
+            self.finditer(b"[a-z]+", contents),
+            [m.span() for m in regex.finditer(contents)],
+        )
+
+    def test_bytesource(self) -> None:
+        spans = chunked_finditer(BytesSource(b"abcdabcdabcd"), re.compile(b"a"))
+        self.assertEqual(list(spans), [(0, 1), (4, 5), (8, 9)])
+
+
+class TestLiteral(unittest.TestCase):
+    def test_prefix(self) -> None:
+        for regex, expected in [
+            (rb"abc", (b"abc", True)),
+            (rb"req\-42\.x", (b"req-42.x", True)),
+            (rb"abc\d+", (b"abc", False)),
+            (rb"^abc", (b"abc", False)),
+            (rb"ab*", (b"a", False)),
+            (rb"a|b", (b"", False)),
+            (rb"(?i)abc", (b"", False)),
+            (rb"(abc)", (b"", False)),
+            (rb"", (b"", False)),
+        ]:
+            self.assertEqual(literal_prefix(re.compile(regex)), expected, regex)
+
+    def test_same_as_re(self) -> None:
+        contents = b"id=42 id=420 ID=42\nid=4 xid=42 id=42" * 5
+        regexes = [rb"id=42", rb"id=42\b", rb"^id=\d+", rb"id=4+", rb"zzz"]
+        # With short prefixes looked for with find too; ^id=\d+ has
+        # enough misses to fall back to the regex in a window:
+        for min_prefix in [3, search.MIN_LITERAL_PREFIX]:
+            with mock.patch.object(search, "MIN_LITERAL_PREFIX", min_prefix):
+                for regex in regexes:
+                    self.check_same_as_re(contents, re.compile(regex, re.M))
+
+    def check_same_as_re(
+        self, contents: bytes, pattern: "re.Pattern[bytes]", max_span: int = 8
+    ) -> None:
+        expected = [m.span() for m in pattern.finditer(contents)]
+        bufs: List[ByteBuffer] = [contents, BytesSource(contents)]
+        for buf in bufs:
+            spans = chunked_finditer(buf, pattern, chunk_size=7, max_span=max_span)
+            self.assertEqual(list(spans), expected, pattern)
+            first = chunked_search(buf, pattern, 3, chunk_size=7, max_span=max_span)
+            m = pattern.search(contents, 3)
+            self.assertEqual(first, m and m.span(), pattern)
+
+    def test_long_prefix(self) -> None:
+        contents = b"request with id 42 ok\nrequest with id 420 failed\n" * 20
+        for regex in [rb"request with id 420 failed", rb"request with id \d+ failed"]:
+            pattern = re.compile(regex)
+            self.assertGreaterEqual(
+                len(literal_prefix(pattern)[0]), search.MIN_LITERAL_PREFIX
+            )
+            self.check_same_as_re(contents, pattern, max_span=32)
@@ -0,0 +1,84 @@
+"""StreamSpool tests"""
+
+import os
+import tempfile
+import unittest
+
+from pthugefileviewer.follow import FileFollower
+from pthugefileviewer.hugefilevieweruicontrol import HugeFileViewerUIControl
+from pthugefileviewer.spool import StreamSpool, is_stream
+
+
+class TestStreamSpool(unittest.TestCase):
+    def setUp(self) -> None:
+        self.read_fd, self.write_fd = os.pipe()
+
+    def tearDown(self) -> None:
+        os.close(self.read_fd)
+        if self.write_fd != -1:
+            os.close(self.write_fd)
+
+    def close_writer(self) -> None:
+        os.close(self.write_fd)
+        self.write_fd = -1
+
+    def contents(self, spool: StreamSpool) -> bytes:
+        with open(spool.path, "rb") as fd:
+            return fd.read()
+
+    def test_stream(self) -> None:
+        spool = StreamSpool(self.read_fd)
+        thread = spool.start()
+        os.write(self.write_fd, b"0\n1\n")
+        self.close_writer()
+        thread.join(5)
+        self.assertTrue(spool.done)
+        self.assertFalse(spool.full)
+        self.assertEqual(spool.status(), "complete")
+        self.assertEqual(self.contents(spool), b"0\n1\n")
+        spool.close()
+        self.assertFalse(os.path.exists(spool.path))
+
+    def test_limit(self) -> None:
+        spool = StreamSpool(self.read_fd, limit=5)
+        os.write(self.write_fd, b"0\n1\n2\n3\n")
+        spool.run()
+        self.assertTrue(spool.full)
+        self.assertEqual(self.contents(spool), b"0\n1\n2")
+        # The rest stays in the pipe, unread:
+        self.assertEqual(os.read(self.read_fd, 100), b"\n3\n")
+        spool.close()
+
+    def test_stop(self) -> None:
+        spool = StreamSpool(self.read_fd)
+        thread = spool.start()
+        spool.close()
+        thread.join(5)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(spool.status(), "complete")
+
+    def test_follow(self) -> None:
+        spool = StreamSpool(self.read_fd)
+        with open(spool.path, "rb") as fd:
+            control = HugeFileViewerUIControl(fd)
+        control.height = 2
+        follower = FileFollower(control, spool.path)
+        thread = spool.start()
+        os.write(self.write_fd, b"0\n1\n2\n")
+        self.close_writer()
+        thread.join(5)
+        self.assertTrue(follower.check())
+        control.go_bottom()
+        self.assertEqual(list(control.get_lines()), [b"1", b"2"])
+        spool.close()
+
+    def test_is_stream(self) -> None:
+        self.assertTrue(is_stream(f"/dev/fd/{self.read_fd}"))
+        with tempfile.TemporaryDirectory() as tmpdir:
+            fifo = os.path.join(tmpdir, "fifo")
+            os.mkfifo(fifo)
+            self.assertTrue(is_stream(fifo))
+            self.assertFalse(is_stream(tmpdir))
+            self.assertFalse(is_stream(os.path.join(tmpdir, "missing")))
+        with tempfile.NamedTemporaryFile() as tmp:
+            self.assertFalse(is_stream(tmp.name))
@@ -0,0 +1,89 @@
+"""Stats tests"""
+
+import json
+import re
+import tempfile
+import unittest
+
+from pthugefileviewer.hugefilevieweruicontrol import (
+    HugeFileViewerRegexUIControl,
+    HugeFileViewerUIControl,
+)
+from pthugefileviewer.stats import Stats, Timing
+from pthugefileviewer.statswidget import StatsWidget
+
+
+class TestTiming(unittest.TestCase):
+    def test_percentile(self) -> None:
+        timing = Timing()
+        for us in [1, 2, 3, 100, 5000]:
+            timing.record(us / 1e6)
+        self.assertEqual(timing.count, 5)
+        self.assertAlmostEqual(timing.max, 5000 / 1e6)
+        self.assertAlmostEqual(timing.percentile(50), 4 / 1e6)
+        self.assertAlmostEqual(timing.percentile(99), 5000 / 1e6)
+        self.assertEqual(
+            timing.to_dict()["histogram_us"],
+            {"<2": 1, "<4": 2, "<128": 1, "<8192": 1},
+        )
+
+    def test_empty(self) -> None:
+        timing = Timing()
+        self.assertEqual(timing.mean, 0)
+        self.assertEqual(timing.percentile(99), 0)
+
+
+class TestStats(unittest.TestCase):
+    def test_stats(self) -> None:
+        stats = Stats()
+        with stats.timer("op"):
+            pass
+        stats.count("bytes_read", 2048)
+        stats.watch("line_cache_hits", lambda: 3)
+        stats.watch("line_cache_misses", lambda: 1)
+        self.assertEqual(stats.hit_rate("line_cache"), 0.75)
+        report = json.loads(json.dumps(stats.to_dict()))
+        self.assertEqual(report["timings"]["op"]["count"], 1)
+        self.assertEqual(report["counters"]["bytes_read"], 2048)
+        self.assertIn("read 2 KiB", stats.summary())
+        self.assertIn("cache 75%", stats.summary())
+
+    def test_control(self) -> None:
+        with tempfile.TemporaryFile() as fd:
+            fd.write(b"".join(b"%d\n" % i for i in range(100)))
+            fd.flush()
+            control = HugeFileViewerUIControl(fd)
+        stats = control.enable_stats()
+        self.assertIs(control.enable_stats(), stats)
+        control.height = 10
+        control.go_down()
+        values = stats.values()
+        self.assertEqual(stats.timings["update_lines"].count, 2)
+        self.assertIn("style_lines", stats.timings)
+        self.assertGreater(values["bytes_read"], 0)
+        self.assertGreater(values["line_cache_hits"], 0)
+
+    def test_search(self) -> None:
+        with tempfile.TemporaryFile() as fd:
+            fd.write(b"".join(b"%d\n" % i for i in range(100)))
+            fd.flush()
+            control = HugeFileViewerRegexUIControl(fd)
+        stats = control.enable_stats()
+        regex = re.compile(b"^5", re.MULTILINE)
+        self.assertEqual(control.re_search(regex), (10, 11))
+        self.assertEqual(control.re_search_backward(regex, 100), (10, 11))
+        self.assertEqual(stats.timings["search"].count, 2)
+        self.assertIn("search", stats.to_dict()["timings"])
+
+
+class TestStatsWidget(unittest.TestCase):
+    def test_keypress(self) -> None:
+        widget = StatsWidget(Stats())
+        widget._rendered(None)
+        self.assertNotIn("keypress", widget.stats.timings)
+        widget._key_press(None)
+        widget._key_press(None)
+        widget._rendered(None)
+        self.assertEqual(widget.stats.timings["keypress"].count, 1)
+        widget.toggle()
+        self.assertTrue(widget.visible)
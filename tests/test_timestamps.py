@@ -0,0 +1,122 @@
+"""Timestamps and go_time tests"""
+
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from typing import List
+
+from pthugefileviewer.hugefilevieweruicontrol import HugeFileViewerUIControl
+from pthugefileviewer.timestamps import Timestamps, TimestampFormat
+
+START = datetime(2024, 3, 1, 14, 0, 0)
+
+
+def log(seconds: List[int], fmt: str = "%Y-%m-%dT%H:%M:%S") -> bytes:
+    """Return a log line for each of seconds after START, and a trace line"""
+    lines = []
+    for i, second in enumerate(seconds):
+        when = (START + timedelta(seconds=second)).strftime(fmt)
+        lines.append(b"%s INFO line %d\n" % (when.encode(), i))
+        if i % 7 == 3:
+            lines.append(b"    at some.trace.Without(timestamp)\n")
+    return b"".join(lines)
+
+
+def linear(buf: bytes, when: datetime) -> int:
+    timestamps = Timestamps(buf)
+    offset = 0
+    for line in buf.splitlines(keepends=True):
+        found = timestamps.parse(line)
+        if found is not None and found >= when:
+            return offset
+        offset += len(line)
+    return len(buf)
+
+
+class TestTimestampFormat(unittest.TestCase):
+    def test_formats(self) -> None:
+        timestamps = Timestamps(b"")
+        for line, expected in [
+            (b"2024-03-01T14:00:05.123Z x", datetime(2024, 3, 1, 14, 0, 5)),
+            (b"I 2024-03-01 14:00:05,123 x", datetime(2024, 3, 1, 14, 0, 5)),
+            (b"1.2.3.4 - - [01/Mar/2024:14:00:05 +0000]", START.replace(second=5)),
+            (b"Mar  1 14:00:05 host sshd", datetime(1900, 3, 1, 14, 0, 5)),
+            (b"[14:00:05] x", datetime(1900, 1, 1, 14, 0, 5)),
+        ]:
+            timestamps.format = None
+            self.assertEqual(timestamps.parse(line), expected)
+        self.assertIsNone(timestamps.parse(b"no time here"))
+
+    def test_custom(self) -> None:
+        fmt = TimestampFormat("%Y%m%d%H%M%S", rb"^ts=(\d{14})")
+        self.assertEqual(fmt.parse(b"ts=20240301140005 x"), START.replace(second=5))
+        self.assertIsNone(fmt.parse(b"x ts=20240301140005"))
+
+
+class TestBisect(unittest.TestCase):
+    def test_sorted(self) -> None:
+        buf = log([i // 3 for i in range(3000)])
+        for second in [-5, 0, 1, 17, 500, 998, 999, 1000, 2000]:
+            when = START + timedelta(seconds=second)
+            timestamps = Timestamps(buf)
+            self.assertEqual(
+                timestamps.bisect(when, min_range=64), linear(buf, when), second
+            )
+            # About log2 of the number of lines, with the untimed ones:
+            self.assertLess(timestamps.probes, 60)
+
+    def test_untimed(self) -> None:
+        buf = log([0, 1]) + b"untimed\n" * 1000 + log([5, 6])
+        when = START + timedelta(seconds=4)
+        self.assertEqual(Timestamps(buf).bisect(when, min_range=64), linear(buf, when))
+
+    def test_unsorted(self) -> None:
+        buf = log([0, 10, 5, 20, 3, 30])
+        offset = Timestamps(buf).bisect(START + timedelta(seconds=8), min_range=16)
+        self.assertIn(b"INFO", buf[offset : offset + 40])
+
+    def test_empty(self) -> None:
+        self.assertEqual(Timestamps(b"").bisect(START), 0)
+        self.assertEqual(Timestamps(b"x\ny\n").bisect(START), 4)
+
+
+class TestGoTime(unittest.TestCase):
+    def control(self, contents: bytes) -> HugeFileViewerUIControl:
+        with tempfile.TemporaryFile() as fd:
+            fd.write(contents)
+            fd.flush()
+            control = HugeFileViewerUIControl(fd)
+        control.height = 1
+        return control
+
+    def test_go_time(self) -> None:
+        control = self.control(log(list(range(0, 600, 2))))
+        self.assertTrue(control.go_time("2024-03-01 14:05:01"))
+        self.assertEqual(
+            list(control.get_lines()), [b"2024-03-01T14:05:02 INFO line 151"]
+        )
+        self.assertTrue(control.go_time("14:00:10"))
+        self.assertEqual(
+            list(control.get_lines()), [b"2024-03-01T14:00:10 INFO line 5"]
+        )
+        self.assertTrue(control.go_time(START))
+        self.assertEqual(control.offset, 0)
+        self.assertFalse(control.go_time("15:00:00"))
+        self.assertFalse(control.go_time("not a time"))
+
+    def test_syslog(self) -> None:
+        control = self.control(log(list(range(100)), "%b %d %H:%M:%S"))
+        self.assertTrue(control.go_time("Mar 01 14:01:00"))
+        self.assertEqual(list(control.get_lines()), [b"Mar 01 14:01:00 INFO line 60"])
+        # The year of the query is dropped, the lines have none:
+        self.assertTrue(control.go_time("2024-03-01 14:01:30"))
+        self.assertEqual(list(control.get_lines()), [b"Mar 01 14:01:30 INFO line 90"])
+        self.assertTrue(control.go_time("14:00:05"))
+        self.assertEqual(list(control.get_lines()), [b"Mar 01 14:00:05 INFO line 5"])
+        self.assertFalse(control.go_time("2024-03-02 00:00:00"))
+
+    def test_time_only(self) -> None:
+        control = self.control(log(list(range(100)), "%H:%M:%S"))
+        # The date of the query is dropped, the lines have none:
+        self.assertTrue(control.go_time("2024-03-01 14:01:00"))
+        self.assertEqual(list(control.get_lines()), [b"14:01:00 INFO line 60"])